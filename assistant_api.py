@@ -0,0 +1,383 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Hashable, Optional, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from journal import note_upstream
+from llm_scheduler import LLMScheduler, UpstreamThrottled, PRIORITY_LOW
+from metrics import LATENCY_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+ASSISTANT_API_LATENCY = Histogram("assistant_api_duration_seconds", "Время вызова Assistant API", ["method"],
+                                  buckets=LATENCY_BUCKETS)
+ASSISTANT_API_ERRORS = Counter("assistant_api_errors_total", "Ошибки вызовов Assistant API", ["method", "code"])
+ASSISTANT_API_IN_FLIGHT = Gauge("assistant_api_in_flight", "Вызовы Assistant API, ожидающие ответа")
+
+DEFAULT_ENDPOINT = "assistant.api.cloud.yandex.net:443"
+# Кэш ID ассистентов по умолчанию; это состояние бота, а не файл проекта, поэтому он не в git
+ASSISTANT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "assistants.json")
+# Метка, по которой бот находит своих ассистентов среди ассистентов каталога
+ROLE_LABEL = "bot-role"
+
+
+class AssistantAPIError(Exception):
+    """Запуск ассистента завершился ошибкой"""
+
+
+# Сгенерированные клиенты и grpc загружаются при первом обращении, как в yc_client
+
+def _assistant_api():
+    from yandex.cloud.ai.assistants.v1 import assistant_service_pb2, common_pb2
+    from yandex.cloud.ai.assistants.v1.assistant_service_pb2_grpc import AssistantServiceStub
+    return AssistantServiceStub, assistant_service_pb2, common_pb2
+
+
+def _thread_api():
+    from yandex.cloud.ai.assistants.v1.threads import thread_service_pb2
+    from yandex.cloud.ai.assistants.v1.threads.thread_service_pb2_grpc import ThreadServiceStub
+    from yandex.cloud.ai.common import common_pb2
+    return ThreadServiceStub, thread_service_pb2, common_pb2
+
+
+def _run_api():
+    from yandex.cloud.ai.assistants.v1.runs import run_service_pb2
+    from yandex.cloud.ai.assistants.v1.runs.run_service_pb2_grpc import RunServiceStub
+    from yandex.cloud.ai.assistants.v1.threads import message_pb2
+    return RunServiceStub, run_service_pb2, message_pb2
+
+
+def instruction_hash(instruction: str, model_uri: str) -> str:
+    """Отпечаток настроек ассистента: при его изменении ассистент обновляется на сервере"""
+    return hashlib.sha256(f"{model_uri}\n{instruction}".encode("utf-8")).hexdigest()[:16]
+
+
+class AssistantAPI:
+    def __init__(self, api_key: str, folder_id: str, instructions: Dict[str, str], model_uri: str = None,
+                 endpoint: str = DEFAULT_ENDPOINT, secure: bool = True, timeout: float = 60,
+                 cache_path: str = None, scheduler: LLMScheduler = None, max_threads: int = 10000,
+                 thread_ttl_days: int = 1, name_prefix: str = "cloud-bot"):
+        """
+        Клиент Assistant API с серверными ассистентами по ролям
+
+        Для каждой роли (examples, optimization, diagnostics) на сервере
+        создается ассистент с ее системным промптом, поэтому в запросах
+        передается только текст пользователя. ID ассистентов кэшируются
+        в памяти и в файле; у каждого чата свой тред на роль. Все вызовы
+        идут через один постоянный gRPC канал.
+
+        :param api_key: API ключ
+        :param folder_id: ID каталога
+        :param instructions: Системные промпты по ролям
+        :param model_uri: URI модели (по умолчанию yandexgpt-lite каталога)
+        :param endpoint: Адрес Assistant API (host:port)
+        :param secure: Использовать TLS; без него - только для локальной заглушки
+        :param timeout: Дедлайн вызова, сек
+        :param cache_path: Файл кэша ID ассистентов (None - только в памяти)
+        :param scheduler: Планировщик запросов к модели
+        :param max_threads: Сколько тредов чатов помнить
+        :param thread_ttl_days: Через сколько дней без активности сервер удаляет тред
+        :param name_prefix: Префикс имен ассистентов
+        """
+        self.api_key = api_key
+        self.folder_id = folder_id
+        self.instructions = instructions
+        self.model_uri = model_uri or f"gpt://{folder_id}/yandexgpt-lite"
+        self.endpoint = endpoint
+        self.secure = secure
+        self.timeout = timeout
+        self.cache_path = cache_path
+        self.scheduler = scheduler or LLMScheduler()
+        self.max_threads = max_threads
+        self.thread_ttl_days = thread_ttl_days
+        self.name_prefix = name_prefix
+        self.metadata = (("authorization", f"Api-Key {api_key}"), ("x-folder-id", folder_id))
+
+        self._channel = None
+        self._stubs = {}
+        self._assistants: Dict[str, Tuple[str, str]] = self._load_cache()  # роль -> (ID, отпечаток)
+        self._sync_lock = asyncio.Lock()
+        self._threads: "OrderedDict[Tuple[Hashable, str], str]" = OrderedDict()
+
+        self.created = 0
+        self.updated = 0
+        self.runs = 0
+
+    @property
+    def channel(self):
+        """gRPC канал; создается при первом обращении и переиспользуется всеми вызовами"""
+        if self._channel is None:
+            import grpc
+
+            options = [("grpc.keepalive_time_ms", 30000), ("grpc.keepalive_permit_without_calls", 1)]
+            if self.secure:
+                self._channel = grpc.aio.secure_channel(self.endpoint, grpc.ssl_channel_credentials(), options)
+            else:
+                self._channel = grpc.aio.insecure_channel(self.endpoint, options)
+        return self._channel
+
+    def _stub(self, stub_ctor):
+        stub = self._stubs.get(stub_ctor)
+        if stub is None:
+            stub = self._stubs[stub_ctor] = stub_ctor(self.channel)
+        return stub
+
+    async def _call(self, method: str, rpc, request):
+        """Унарный вызов с дедлайном, авторизацией и учетом метрик"""
+        import grpc
+
+        started = time.perf_counter()
+        with ASSISTANT_API_IN_FLIGHT.track_inprogress(), ASSISTANT_API_LATENCY.labels(method).time():
+            try:
+                return await rpc(request, timeout=self.timeout, metadata=self.metadata)
+            except grpc.aio.AioRpcError as e:
+                ASSISTANT_API_ERRORS.labels(method, e.code().name).inc()
+                if e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED:
+                    raise UpstreamThrottled(429) from e
+                if e.code() == grpc.StatusCode.UNAVAILABLE:
+                    raise UpstreamThrottled(503) from e
+                raise
+            finally:
+                note_upstream(time.perf_counter() - started)
+
+    def _load_cache(self) -> Dict[str, Tuple[str, str]]:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return {role: tuple(value) for role, value in json.load(f).items()}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать кэш ассистентов {self.cache_path}: {e}")
+            return {}
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        # Воркеры supervisor могут сохранять кэш одновременно, у каждого свой временный файл
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._assistants, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить кэш ассистентов {self.cache_path}: {e}")
+
+    async def iter_assistants(self, page_size: int = 50) -> AsyncIterator:
+        """
+        Ассистенты каталога; следующая страница запрашивается, только когда
+        разобрана предыдущая
+
+        :param page_size: Размер страницы
+        """
+        stub_ctor, service, _ = _assistant_api()
+        page_token = ""
+        while True:
+            response = await self._call("AssistantService.List", self._stub(stub_ctor).List, service.ListAssistantsRequest(
+                folder_id=self.folder_id, page_size=page_size, page_token=page_token
+            ))
+            for assistant in response.assistants:
+                yield assistant
+            page_token = response.next_page_token
+            if not page_token:
+                return
+
+    async def iter_versions(self, assistant_id: str, page_size: int = 50) -> AsyncIterator:
+        """
+        Версии ассистента, постранично по мере чтения
+
+        :param assistant_id: ID ассистента
+        :param page_size: Размер страницы
+        """
+        stub_ctor, service, _ = _assistant_api()
+        page_token = ""
+        while True:
+            response = await self._call(
+                "AssistantService.ListVersions", self._stub(stub_ctor).ListVersions,
+                service.ListAssistantVersionsRequest(assistant_id=assistant_id, page_size=page_size, page_token=page_token)
+            )
+            for version in response.versions:
+                yield version
+            page_token = response.next_page_token
+            if not page_token:
+                return
+
+    def _settings(self, role: str) -> dict:
+        _, _, common = _assistant_api()
+        return {
+            "name": f"{self.name_prefix}-{role}",
+            "labels": {ROLE_LABEL: role},
+            "model_uri": self.model_uri,
+            "instruction": self.instructions[role],
+            "completion_options": common.CompletionOptions(max_tokens={"value": 2000}, temperature={"value": 0.6}),
+        }
+
+    async def sync(self):
+        """
+        Приведение серверных ассистентов к текущим промптам
+
+        Ассистенты ищутся по метке роли; устаревшие обновляются, недостающие
+        создаются. Список каталога читается только до тех пор, пока не найдены
+        все роли.
+        """
+        stub_ctor, service, _ = _assistant_api()
+        stub = self._stub(stub_ctor)
+        found = {}
+        async for assistant in self.iter_assistants():
+            role = assistant.labels.get(ROLE_LABEL)
+            if role in self.instructions and role not in found:
+                found[role] = assistant
+                if len(found) == len(self.instructions):
+                    break
+
+        for role, instruction in self.instructions.items():
+            fingerprint = instruction_hash(instruction, self.model_uri)
+            assistant = found.get(role)
+            if assistant is None:
+                assistant = await self._call("AssistantService.Create", stub.Create, service.CreateAssistantRequest(
+                    folder_id=self.folder_id, **self._settings(role)
+                ))
+                self.created += 1
+                logger.info(f"Создан ассистент {assistant.id} для роли {role}")
+            elif assistant.instruction != instruction or assistant.model_uri != self.model_uri:
+                assistant = await self._call("AssistantService.Update", stub.Update, service.UpdateAssistantRequest(
+                    assistant_id=assistant.id,
+                    update_mask={"paths": ["instruction", "model_uri", "completion_options"]},
+                    **{k: v for k, v in self._settings(role).items() if k not in ("name", "labels")}
+                ))
+                self.updated += 1
+                logger.info(f"Ассистент {assistant.id} роли {role} обновлен")
+            self._assistants[role] = (assistant.id, fingerprint)
+        self._save_cache()
+
+    async def assistant_id(self, role: str) -> str:
+        """
+        ID серверного ассистента роли; при первом обращении или после
+        изменения промптов выполняется sync
+
+        :param role: Роль из instructions
+        """
+        fingerprint = instruction_hash(self.instructions[role], self.model_uri)
+        cached = self._assistants.get(role)
+        if cached is None or cached[1] != fingerprint:
+            async with self._sync_lock:
+                cached = self._assistants.get(role)
+                if cached is None or cached[1] != fingerprint:
+                    await self.sync()
+                    cached = self._assistants[role]
+        return cached[0]
+
+    async def _thread_id(self, chat_id: Optional[Hashable], role: str) -> str:
+        """Тред чата для роли; без chat_id создается одноразовый тред"""
+        key = (chat_id, role)
+        if chat_id is not None and key in self._threads:
+            self._threads.move_to_end(key)
+            return self._threads[key]
+        stub_ctor, service, common = _thread_api()
+        thread = await self._call("ThreadService.Create", self._stub(stub_ctor).Create, service.CreateThreadRequest(
+            folder_id=self.folder_id,
+            name=f"{self.name_prefix}-{role}",
+            expiration_config=common.ExpirationConfig(
+                expiration_policy=common.ExpirationConfig.SINCE_LAST_ACTIVE, ttl_days=self.thread_ttl_days
+            )
+        ))
+        if chat_id is not None:
+            self._threads[key] = thread.id
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+        return thread.id
+
+    async def _run(self, role: str, prompt: str, chat_id: Optional[Hashable]) -> str:
+        stub_ctor, service, message = _run_api()
+        stub = self._stub(stub_ctor)
+        run = await self._call("RunService.Create", stub.Create, service.CreateRunRequest(
+            assistant_id=await self.assistant_id(role),
+            thread_id=await self._thread_id(chat_id, role),
+            additional_messages=[message.MessageData(content=message.MessageContent(
+                content=[message.ContentPart(text=message.Text(content=prompt))]
+            ))]
+        ))
+        self.runs += 1
+
+        started = time.perf_counter()
+        try:
+            with ASSISTANT_API_LATENCY.labels("RunService.Listen").time():
+                events = stub.Listen(service.ListenRunRequest(run_id=run.id), timeout=self.timeout, metadata=self.metadata)
+                async for event in events:
+                    if event.event_type == service.StreamEvent.DONE:
+                        return "".join(part.text.content for part in event.completed_message.content.content)
+                    if event.event_type == service.StreamEvent.ERROR:
+                        ASSISTANT_API_ERRORS.labels("RunService.Listen", "RUN_FAILED").inc()
+                        raise AssistantAPIError(event.error.message or "run failed")
+        finally:
+            note_upstream(time.perf_counter() - started)
+        raise AssistantAPIError(f"Запуск {run.id} завершился без ответа")
+
+    async def complete(self, role: str, prompt: str, chat_id: Hashable = None, priority: int = PRIORITY_LOW) -> str:
+        """
+        Ответ серверного ассистента роли
+
+        :param role: Роль из instructions
+        :param prompt: Текст запроса (без системного промпта)
+        :param chat_id: ID чата; ответы одного чата идут в его тред
+        :param priority: Приоритет в очереди планировщика
+        :return: Текст ответа
+        :raises AssistantAPIError: Если запуск завершился ошибкой
+        """
+        import grpc
+
+        try:
+            return await self.scheduler.run(lambda: self._run(role, prompt, chat_id), chat_id, priority)
+        except grpc.aio.AioRpcError as e:
+            if e.code() != grpc.StatusCode.NOT_FOUND:
+                raise
+            # Ассистент или тред удалили на сервере: забываем ID и повторяем один раз
+            logger.warning(f"Ассистент роли {role} или тред не найден, повторная синхронизация")
+            self._assistants.pop(role, None)
+            self._threads.pop((chat_id, role), None)
+            return await self.scheduler.run(lambda: self._run(role, prompt, chat_id), chat_id, priority)
+
+    async def aclose(self):
+        """Закрывает gRPC канал"""
+        if self._channel is not None:
+            await self._channel.close()
+            self._channel = None
+            self._stubs.clear()
+
+    def stats(self) -> Dict:
+        """Ассистенты, треды и число запусков"""
+        return {
+            "assistants": {role: value[0] for role, value in self._assistants.items()},
+            "threads": len(self._threads),
+            "created": self.created,
+            "updated": self.updated,
+            "runs": self.runs
+        }
+
+
+def create_assistant_api(api_key: str, folder_id: str, instructions: Dict[str, str],
+                         scheduler: LLMScheduler = None) -> Optional[AssistantAPI]:
+    """
+    Создание клиента Assistant API по настройкам из переменных окружения
+
+    ASSISTANT_API (по умолчанию выключен), YANDEX_ASSISTANT_ENDPOINT,
+    YANDEX_ASSISTANT_INSECURE, ASSISTANT_CACHE_PATH и ASSISTANT_TIMEOUT.
+    """
+    if os.getenv("ASSISTANT_API", "false").lower() not in ("1", "true", "yes"):
+        return None
+    return AssistantAPI(
+        api_key,
+        folder_id,
+        instructions,
+        endpoint=os.getenv("YANDEX_ASSISTANT_ENDPOINT", DEFAULT_ENDPOINT),
+        secure=os.getenv("YANDEX_ASSISTANT_INSECURE", "false").lower() not in ("1", "true", "yes"),
+        timeout=float(os.getenv("ASSISTANT_TIMEOUT", "60")),
+        cache_path=os.getenv("ASSISTANT_CACHE_PATH", ASSISTANT_CACHE_PATH) or None,
+        scheduler=scheduler
+    )
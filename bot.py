@@ -1,72 +1,238 @@
 import logging
-import httpx
 from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, ExtBot
+from telegram.request import HTTPXRequest
 import sys
-import signal
 import os
 from dotenv import load_dotenv
 from cloud_assistant import CloudAssistant
 from cloud_pricing import CloudPricing
 from yc_client import YandexCloudClient
+from http_pool import create_http_client
+from completion_cache import create_completion_cache
+from llm_scheduler import create_llm_scheduler
 import asyncio
 import atexit
 import psutil
 import os.path
+import time
+import secrets
+import re
+from message_utils import split_message, pack_blocks, TELEGRAM_MESSAGE_LIMIT
+from cloud_inventory import create_cloud_inventory
+from startup_profile import Lazy, init_timings, measure_import, format_report
+from service_catalog import create_service_catalog, format_service
+from docs_index import create_docs_index
+from logging_setup import setup_logging, redact_secret
+from metrics import create_metrics_server, instrument_handler
+from journal import create_request_journal, note_response
+from conversation import create_conversation_store
+from deferred import create_deferred_completions
+from assistant_api import create_assistant_api
+from model_router import create_model_router
+from resilience import create_hedger, create_circuit_breakers
+from cost_report import create_cost_reporter, format_cost_report, report_folders
+from outbox import create_outbox, is_plain_message
 
 # Загружаем переменные окружения из .env файла
 load_dotenv()
 
-# Настраиваем логирование в файл и консоль
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot_debug.log', encoding='utf-8', mode='w'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Настраиваем логирование в файл и консоль: запись идет в фоновом потоке
+setup_logging()
 
 logger = logging.getLogger(__name__)
 
-# Инициализация клиента Yandex Cloud
-yc_client = YandexCloudClient()
-
 # Конфигурация YandexGPT API
 YANDEX_API_KEY = os.getenv("YANDEX_API_KEY")
 YANDEX_FOLDER_ID = os.getenv("YANDEX_FOLDER_ID")
-API_URL = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
 
-# Инициализация облачного ассистента и калькулятора цен
-cloud_assistant = CloudAssistant(YANDEX_API_KEY, YANDEX_FOLDER_ID)
-pricing = CloudPricing()
+# Потоковая выдача ответов: сообщение-заглушка редактируется по мере генерации,
+# но не чаще раза в STREAM_EDIT_INTERVAL секунд, чтобы не упираться в лимиты Telegram
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() in ("1", "true", "yes")
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+# Ответ на текстовое сообщение, если модель не ответила
+PROCESSING_ERROR_TEXT = "Извините, произошла ошибка при обработке вашего запроса. Попробуйте позже."
+
+# Максимум конфигураций в одной команде /calculate_vm
+MAX_VM_CONFIGS = 100
+
+# Режим получения обновлений: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+# Сколько обновлений обрабатывается одновременно
+BOT_CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", "1"))
+# Адрес Bot API; переопределяется для локального стенда
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL")
+# Адрес foundationModels API; переопределяется для локальной заглушки
+YANDEX_LLM_BASE_URL = os.getenv("YANDEX_LLM_BASE_URL")
+# Адрес Operation API для отложенных запросов
+YANDEX_OPERATION_BASE_URL = os.getenv("YANDEX_OPERATION_BASE_URL")
+# Длинные запросы /optimize и /diagnose выполняются отложенно, ответ приходит отдельным сообщением
+DEFERRED_COMPLETIONS = os.getenv("DEFERRED_COMPLETIONS", "true").lower() in ("1", "true", "yes")
+# Число процессов-воркеров; больше 1 - режим supervisor с шардированием по chat_id
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+# Сколько ждать завершения начатой работы (в том числе отложенных запросов) при остановке, сек
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "30"))
+
+# Общий HTTP клиент для YandexGPT, открывается в post_init
+http_client = None
+# Эндпоинт метрик Prometheus, запускается в post_init
+metrics_server = None
+# Журнал запросов; создается в build_application, фоновая запись запускается в post_init
+request_journal = None
+# Очередь исходящих сообщений; создается в build_application
+outbox = None
+
+def _create_cloud_assistant() -> CloudAssistant:
+    return CloudAssistant(
+        YANDEX_API_KEY, YANDEX_FOLDER_ID,
+        http_client=http_client,
+        cache=create_completion_cache(),
+        scheduler=create_llm_scheduler(),
+        docs_index=docs_index.get(),
+        base_url=YANDEX_LLM_BASE_URL,
+        conversations=create_conversation_store(),
+        operation_url=YANDEX_OPERATION_BASE_URL,
+        router=create_model_router(),
+        hedger=create_hedger(),
+        breakers=create_circuit_breakers()
+    )
 
-async def get_yandex_response(prompt: str) -> str:
-    headers = {
-        "Authorization": f"Api-Key {YANDEX_API_KEY}",
-        "Content-Type": "application/json"
-    }
+def _create_inventory():
+    cloud_inventory = create_cloud_inventory(yc_client.get())
+    cloud_inventory.start()
+    return cloud_inventory
+
+# Компоненты создаются при первом обращении, чтобы не замедлять запуск
+yc_client = Lazy("yc_client", YandexCloudClient)
+inventory = Lazy("inventory", _create_inventory)
+cloud_assistant = Lazy("cloud_assistant", _create_cloud_assistant)
+pricing = Lazy("pricing", CloudPricing)
+service_catalog = Lazy("service_catalog", create_service_catalog)
+# Индекс документации; загружается (или строится) в post_init вне цикла событий
+docs_index = Lazy("docs_index", create_docs_index)
+cost_reporter = Lazy("cost_reporter", lambda: create_cost_reporter(yc_client.get(), pricing.get()))
+deferred = Lazy("deferred", lambda: create_deferred_completions(cloud_assistant.get()))
+# Серверные ассистенты по ролям; None, если ASSISTANT_API не включен
+assistant_api = Lazy("assistant_api", lambda: create_assistant_api(
+    YANDEX_API_KEY, YANDEX_FOLDER_ID, cloud_assistant.get().system_prompts, cloud_assistant.get().scheduler
+))
+
+async def get_yandex_response(prompt: str, chat_id: int = None) -> str:
+    # Запрос идет через ассистента: общий пул соединений, кэш ответов и история диалога
+    assistant = cloud_assistant.get()
+    data = assistant.build_chat_request(prompt, chat_id=chat_id)
+    text, answered = await assistant.request_completion(data, chat_id=chat_id)
+    if answered:
+        assistant.remember(chat_id, prompt, text)
+    return text
+
+async def send_editable(update: Update, text: str):
+    """Отправляет сообщение, которое потом будет редактироваться: его нельзя склеивать с соседними"""
+    return await update.get_bot().send_message(update.effective_chat.id, text, coalesce=False)
+
+async def stream_reply(update: Update, prompt: str):
+    """Отправляет ответ модели по мере генерации, редактируя сообщение-заглушку"""
+    placeholder = await send_editable(update, "⏳ Готовлю ответ...")
+    last_edit = time.monotonic()
+    shown = ""
+    text = ""
     
-    data = {
-        "modelUri": "gpt://b1girnbllj1ftb09con0/yandexgpt-lite",
-        "completionOptions": {
-            "stream": False,
-            "temperature": 0.6,
-            "maxTokens": 2000
-        },
-        "messages": [
-            {
-                "role": "user",
-                "text": prompt
-            }
-        ]
-    }
+    try:
+        async for text in cloud_assistant.get().stream_completion(prompt, chat_id=update.effective_chat.id):
+            preview = text[:TELEGRAM_MESSAGE_LIMIT]
+            now = time.monotonic()
+            if preview and preview != shown and now - last_edit >= STREAM_EDIT_INTERVAL:
+                await placeholder.edit_text(preview)
+                shown = preview
+                last_edit = now
+    except Exception as e:
+        # Недописанный ответ заменяем тем же сообщением об ошибке, что и без потока
+        logger.error(f"Ошибка при потоковом ответе: {str(e)}")
+        await placeholder.edit_text(PROCESSING_ERROR_TEXT)
+        return
     
-    async with httpx.AsyncClient() as client:
-        response = await client.post(API_URL, headers=headers, json=data)
-        response.raise_for_status()
-        result = response.json()
-        return result["result"]["alternatives"][0]["message"]["text"]
+    if not text:
+        await placeholder.edit_text("Извините, не удалось получить ответ. Попробуйте позже.")
+        return
+    
+    # Финальный текст может не влезть в одно сообщение - остаток досылаем отдельно
+    parts = split_message(text)
+    if parts[0] != shown:
+        await placeholder.edit_text(parts[0])
+    for part in parts[1:]:
+        await update.message.reply_text(part)
+
+async def post_init(application: Application):
+    """Открывает общий HTTP клиент для запросов к YandexGPT"""
+    global http_client
+    http_client = create_http_client()
+    if cloud_assistant.initialized:
+        cloud_assistant.get().http_client = http_client
+    logger.info("Общий HTTP клиент для YandexGPT создан")
+    # Каталог сервисов небольшой, загружаем его сразу, а не на первом вопросе
+    service_catalog.get()
+    # Построение индекса BM25 при его отсутствии занимает секунды - выполняем в пуле потоков,
+    # чтобы не блокировать цикл событий; к первому вопросу индекс уже готов
+    await asyncio.get_running_loop().run_in_executor(None, docs_index.get)
+    
+    global metrics_server
+    metrics_server = create_metrics_server()
+    if metrics_server is not None:
+        try:
+            await metrics_server.start()
+        except OSError as e:
+            logger.error(f"Не удалось запустить эндпоинт метрик: {e}")
+            metrics_server = None
+    if request_journal is not None:
+        request_journal.start()
+
+async def post_stop(application: Application):
+    """
+    Досылает начатую работу после остановки обработки обновлений
+
+    Вызывается до Application.shutdown(): бот еще может отправлять сообщения.
+    """
+    if deferred.initialized:
+        await deferred.get().drain(DRAIN_TIMEOUT)
+        await deferred.get().stop()
+        logger.info(f"Статистика отложенных запросов: {deferred.get().stats()}")
+    if outbox is not None:
+        await outbox.drain(DRAIN_TIMEOUT)
+        await outbox.stop()
+        logger.info(f"Статистика исходящих сообщений: {outbox.stats()}")
+
+async def post_shutdown(application: Application):
+    """Закрывает общий HTTP клиент и созданные компоненты при остановке приложения"""
+    if assistant_api.initialized and assistant_api.get() is not None:
+        logger.info(f"Статистика Assistant API: {assistant_api.get().stats()}")
+        await assistant_api.get().aclose()
+    if cloud_assistant.initialized:
+        assistant = cloud_assistant.get()
+        await assistant.aclose()
+        if assistant.cache is not None:
+            logger.info(f"Статистика кэша ответов: {assistant.cache.stats()}")
+            assistant.cache.close()
+        logger.info(f"Статистика очереди запросов к YandexGPT: {assistant.scheduler.stats()}")
+        if assistant.hedger is not None:
+            logger.info(f"Статистика дублирующих запросов: {assistant.hedger.stats()}")
+        if assistant.breakers is not None:
+            logger.info(f"Предохранители моделей: {assistant.breakers.stats()}")
+        if assistant.conversations is not None:
+            logger.info(f"Статистика истории диалогов: {assistant.conversations.stats()}")
+    if docs_index.initialized and docs_index.get() is not None:
+        docs_index.get().close()
+    if http_client is not None:
+        await http_client.aclose()
+    logger.info("Общий HTTP клиент для YandexGPT закрыт")
+    if inventory.initialized:
+        await inventory.get().stop()
+    if yc_client.initialized:
+        yc_client.get().close()
+    if metrics_server is not None:
+        await metrics_server.stop()
+    if request_journal is not None:
+        await request_journal.stop()
+        logger.info(f"Журнал запросов: {request_journal.stats()}")
 
 # Обработчик команды /start
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -90,13 +256,17 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "📊 Основные команды:\n"
         "/services - Обзор сервисов Yandex Cloud\n"
         "/calculate_vm - Расчет стоимости виртуальной машины\n"
+        "/cheapest - Подбор самой дешевой конфигурации\n"
         "/pricing - Информация о ценах\n"
-        "/databases - Список доступных баз данных\n\n"
+        "/databases - Список доступных баз данных\n"
+        "/instances - Список виртуальных машин\n"
+        "/cost_report - Стоимость ВМ и дисков в каталогах\n\n"
         "🛠 Дополнительные возможности:\n"
         "/examples - Примеры кода и конфигураций\n"
         "/optimize - Рекомендации по оптимизации\n"
         "/diagnose - Диагностика проблем\n"
-        "/premium - Информация о премиум возможностях\n\n"
+        "/premium - Информация о премиум возможностях\n"
+        "/reset - Начать диалог заново\n\n"
         "💬 Просто напишите свой вопрос, и я постараюсь помочь!"
     )
     await update.message.reply_text(help_text)
@@ -105,27 +275,38 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def calculate_vm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды расчета стоимости VM"""
     try:
-        # Получаем параметры из сообщения
-        args = context.args
-        if len(args) != 3:
+        # Получаем параметры из сообщения; несколько конфигураций разделяются ";" или переводом строки
+        parts = update.message.text.split(maxsplit=1)
+        groups = [group.split() for group in re.split(r"[;\n]+", parts[1])] if len(parts) > 1 else []
+        groups = [group for group in groups if group]
+        if not groups or len(groups) > MAX_VM_CONFIGS or any(len(group) != 3 for group in groups):
             await update.message.reply_text(
                 "❌ Пожалуйста, укажите параметры в формате:\n"
                 "/calculate_vm [cpu] [ram] [disk]\n"
-                "Например: /calculate_vm 2 4 100"
+                "Например: /calculate_vm 2 4 100\n\n"
+                f"Можно рассчитать до {MAX_VM_CONFIGS} конфигураций сразу, разделив их \";\":\n"
+                "/calculate_vm 2 4 100; 4 8 200"
             )
             return
 
-        cpu = int(args[0])
-        ram = int(args[1])
-        disk = int(args[2])
+        configs = [tuple(int(value) for value in group) for group in groups]
 
-        # Рассчитываем стоимость
-        calculation = pricing.calculate_vm_cost(cpu, ram, disk)
-        
-        # Форматируем ответ
-        message = pricing.format_price_message(calculation)
+        if len(configs) == 1:
+            cpu, ram, disk = configs[0]
+
+            # Рассчитываем стоимость
+            calculation = pricing.get().calculate_vm_cost(cpu, ram, disk)
+            
+            # Форматируем ответ
+            message = pricing.get().format_price_message(calculation)
+        else:
+            # Все конфигурации считаются одним векторизованным проходом
+            cpu, ram, disk = zip(*configs)
+            calculation = pricing.get().calculate_vm_cost_batch(cpu, ram, disk)
+            message = pricing.get().format_batch_message(configs, calculation)
         
-        await update.message.reply_text(message)
+        for part in split_message(message):
+            await update.message.reply_text(part)
 
     except ValueError:
         await update.message.reply_text(
@@ -136,6 +317,41 @@ async def calculate_vm(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Ошибка при расчете стоимости VM: {str(e)}")
         await update.message.reply_text("Извините, произошла ошибка при расчете.")
 
+# Обработчик команды подбора самой дешевой конфигурации
+async def cheapest_config(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Подбирает самые дешевые конфигурации под требования к ресурсам"""
+    usage = (
+        "❌ Пожалуйста, укажите параметры в формате:\n"
+        "/cheapest [vm|postgresql] [cpu] [ram] [disk] [часов в месяц] [бюджет]\n"
+        "Например: /cheapest 4 16 100 или /cheapest vm 4 16 100 730 50000"
+    )
+    try:
+        args = list(context.args)
+        # По умолчанию подбираются только VM; PostgreSQL - если запрошен явно
+        kinds = ["vm"]
+        if args and args[0].lower() in ("vm", "postgresql"):
+            kinds = [args.pop(0).lower()]
+        if not 3 <= len(args) <= 5:
+            await update.message.reply_text(usage)
+            return
+
+        requirements = {
+            "cpu": int(args[0]),
+            "ram": int(args[1]),
+            "disk": int(args[2]),
+            "hours": int(args[3]) if len(args) > 3 else 730,
+            "budget": float(args[4]) if len(args) > 4 else None,
+            "kinds": kinds
+        }
+        recommendations = pricing.get().get_service_recommendation(requirements)
+        await update.message.reply_text(pricing.get().format_recommendation_message(recommendations))
+
+    except ValueError:
+        await update.message.reply_text(usage)
+    except Exception as e:
+        logger.error(f"Ошибка при подборе конфигурации: {str(e)}")
+        await update.message.reply_text("Извините, произошла ошибка при подборе конфигурации.")
+
 # Обработчик команды получения информации о ценах
 async def get_pricing(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды получения информации о ценах"""
@@ -155,7 +371,7 @@ async def get_pricing(update: Update, context: ContextTypes.DEFAULT_TYPE):
             """
         else:
             service = args[0].lower()
-            message = pricing.get_pricing_info(service)
+            message = pricing.get().get_pricing_info(service)
             
         await update.message.reply_text(message)
         
@@ -183,24 +399,79 @@ async def recommend_services(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def list_databases(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Получает и отображает список баз данных в Yandex Cloud"""
     try:
-        databases = yc_client.list_databases()
-        if not databases.databases:
+        databases = await inventory.get().get("databases")
+        if not databases:
             await update.message.reply_text("Базы данных не найдены в вашем каталоге.")
             return
 
-        response = "Список баз данных в Yandex Cloud:\n\n"
-        for db in databases.databases:
-            response += f"📁 ID: {db.id}\n"
-            response += f"📌 Имя: {db.name}\n"
-            response += f"📍 Статус: {db.status}\n"
-            response += f"🔧 Тип: {db.type}\n"
-            response += "-------------------\n"
-
-        await update.message.reply_text(response)
+        blocks = (
+            f"📁 ID: {db.id}\n"
+            f"📌 Имя: {db.name}\n"
+            f"📍 Статус: {db.status}\n"
+            f"🔧 Тип: {db.type}\n"
+            "-------------------\n"
+            for db in databases
+        )
+        for message in pack_blocks(blocks, header="Список баз данных в Yandex Cloud:\n\n"):
+            await update.message.reply_text(message)
     except Exception as e:
         logger.error(f"Ошибка при получении списка баз данных: {str(e)}")
         await update.message.reply_text("Произошла ошибка при получении списка баз данных. Проверьте логи для деталей.")
 
+# Обработчик команды получения списка виртуальных машин
+async def list_instances(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Получает и отображает список виртуальных машин в Yandex Cloud"""
+    try:
+        instances = await inventory.get().get("instances")
+        if not instances:
+            await update.message.reply_text("Виртуальные машины не найдены в вашем каталоге.")
+            return
+
+        blocks = (
+            f"🖥 ID: {vm.id}\n"
+            f"📌 Имя: {vm.name}\n"
+            f"📍 Статус: {vm.status}\n"
+            f"⚙️ Ресурсы: {vm.resources.cores} vCPU, {vm.resources.memory // 2**30} ГБ RAM\n"
+            "-------------------\n"
+            for vm in instances
+        )
+        for message in pack_blocks(blocks, header="Список виртуальных машин в Yandex Cloud:\n\n"):
+            await update.message.reply_text(message)
+    except Exception as e:
+        logger.error(f"Ошибка при получении списка виртуальных машин: {str(e)}")
+        await update.message.reply_text("Произошла ошибка при получении списка виртуальных машин. Проверьте логи для деталей.")
+
+# Обработчик команды отчета о стоимости ресурсов
+async def cost_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Считает стоимость реальных ВМ и дисков в каталогах; сводка обновляется по мере готовности каталогов"""
+    folders = report_folders(context.args, yc_client.get().get_folder_id())
+    if not folders:
+        await update.message.reply_text(
+            "❌ Укажите каталоги: /cost_report [folder_id ...]\n"
+            "Например: /cost_report b1g0example1 b1g0example2"
+        )
+        return
+
+    try:
+        reporter = cost_reporter.get()
+        message = await send_editable(update, f"⏳ Считаю стоимость ресурсов, каталогов: {len(folders)}...")
+        results = []
+        last_edit = time.monotonic()
+        async for result in reporter.stream(folders):
+            results.append(result)
+            now = time.monotonic()
+            if len(results) < len(folders) and now - last_edit >= STREAM_EDIT_INTERVAL:
+                await message.edit_text(format_cost_report(results, len(folders), reporter.top)[:TELEGRAM_MESSAGE_LIMIT])
+                last_edit = now
+
+        parts = split_message(format_cost_report(results, len(folders), reporter.top))
+        await message.edit_text(parts[0])
+        for part in parts[1:]:
+            await update.message.reply_text(part)
+    except Exception as e:
+        logger.error(f"Ошибка при расчете стоимости ресурсов: {str(e)}")
+        await update.message.reply_text("Произошла ошибка при расчете стоимости ресурсов. Проверьте логи для деталей.")
+
 # Обработчик команды получения примеров кода
 async def get_examples(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Предоставляет примеры кода для различных сервисов"""
@@ -216,21 +487,75 @@ async def get_examples(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(examples_text)
 
 # Обработчик команды оптимизации
+async def answer_with_assistant(context: ContextTypes.DEFAULT_TYPE, chat_id: int, role: str, prompt: str):
+    """Получает ответ серверного ассистента роли и отправляет его в чат"""
+    try:
+        answer = await assistant_api.get().complete(role, prompt, chat_id=chat_id)
+    except Exception as e:
+        logger.error(f"Ошибка запроса к ассистенту {role}: {str(e)}")
+        answer = "Извините, не удалось подготовить ответ. Попробуйте позже."
+    for part in split_message(answer):
+        await context.bot.send_message(chat_id, part)
+
+async def run_long_request(update: Update, context: ContextTypes.DEFAULT_TYPE, role: str, prompt: str,
+                           system_prompt: str):
+    """Выполняет длинный запрос к модели: отложенно, если это включено, иначе сразу"""
+    chat_id = update.effective_chat.id
+    
+    if assistant_api.get() is not None:
+        # Системный промпт роли хранится на сервере, отправляется только запрос;
+        # задача приложения, поэтому при остановке ответ будет дождан
+        context.application.create_task(answer_with_assistant(context, chat_id, role, prompt), update=update)
+        await update.message.reply_text("⏳ Запрос принят. Ответ придет отдельным сообщением, когда будет готов.")
+        return
+    
+    if not DEFERRED_COMPLETIONS:
+        answer = await cloud_assistant.get().get_completion(prompt, system_prompt=system_prompt, chat_id=chat_id)
+        for part in split_message(answer):
+            await update.message.reply_text(part)
+        return
+    
+    async def deliver(text: str):
+        for part in split_message(text):
+            await context.bot.send_message(chat_id, part)
+    
+    try:
+        await deferred.get().submit(prompt, system_prompt, deliver, chat_id=chat_id)
+        await update.message.reply_text("⏳ Запрос принят. Ответ придет отдельным сообщением, когда будет готов.")
+    except Exception as e:
+        logger.error(f"Ошибка при отправке отложенного запроса: {str(e)}")
+        await update.message.reply_text("Извините, не удалось отправить запрос. Попробуйте позже.")
+
 async def optimize_resources(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Предоставляет рекомендации по оптимизации ресурсов"""
+    if context.args:
+        # /optimize <тип ресурса> <описание конфигурации>
+        resource_type = context.args[0]
+        current_setup = " ".join(context.args[1:]) or resource_type
+        prompt, system_prompt = cloud_assistant.get().optimization_request(resource_type, current_setup)
+        await run_long_request(update, context, "optimization", prompt, system_prompt)
+        return
+    
     optimize_text = (
         "🔧 Рекомендации по оптимизации:\n\n"
         "1. Анализ использования ресурсов\n"
         "2. Оптимизация затрат\n"
         "3. Производительность\n"
         "4. Безопасность\n\n"
-        "Опишите, какой аспект вас интересует."
+        "Опишите, какой аспект вас интересует:\n"
+        "/optimize <тип ресурса> <текущая конфигурация>\n"
+        "Например: /optimize vm 16 vCPU, 64 ГБ RAM, средняя загрузка CPU 10%"
     )
     await update.message.reply_text(optimize_text)
 
 # Обработчик команды диагностики
 async def diagnose_issues(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Помогает диагностировать проблемы"""
+    if context.args:
+        prompt, system_prompt = cloud_assistant.get().diagnostic_request(" ".join(context.args))
+        await run_long_request(update, context, "diagnostics", prompt, system_prompt)
+        return
+    
     diagnose_text = (
         "🔍 Диагностика проблем:\n\n"
         "Опишите проблему, с которой вы столкнулись:\n"
@@ -256,6 +581,13 @@ async def premium_features(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     await update.message.reply_text(premium_text)
 
+# Обработчик команды сброса диалога
+async def reset_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Забывает историю диалога текущего чата"""
+    if cloud_assistant.initialized and cloud_assistant.get().conversations is not None:
+        cloud_assistant.get().conversations.clear(update.effective_chat.id)
+    await update.message.reply_text("🧹 История диалога очищена. Задайте новый вопрос!")
+
 # Обработчик текстовых сообщений
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик текстовых сообщений"""
@@ -270,27 +602,25 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Проверяем, является ли сообщение запросом о конкретном сервисе
         if "сервис" in message_text or "service" in message_text:
             service_name = message_text.replace("сервис", "").replace("service", "").strip()
-            service_info = cloud_assistant.get_service_info(service_name)
-            response = f"""
-            📦 {service_info['name']}
-            
-            📝 Описание: {service_info['description']}
-            
-            ✨ Возможности:
-            {chr(10).join(['• ' + f for f in service_info.get('features', [])])}
-            
-            🎯 Примеры использования:
-            {chr(10).join(['• ' + u for u in service_info.get('use_cases', [])])}
-            """
+            service_info = service_catalog.get().lookup(service_name)
+            if service_info is not None:
+                response = format_service(service_info)
+            else:
+                # Сервиса нет в локальном каталоге - спрашиваем модель
+                response = await cloud_assistant.get().get_service_info(service_name)
+        elif STREAM_RESPONSES:
+            # Используем YandexGPT в потоковом режиме для остальных запросов
+            await stream_reply(update, message_text)
+            return
         else:
             # Используем YandexGPT для остальных запросов
-            response = await get_yandex_response(message_text)
+            response = await get_yandex_response(message_text, chat_id=update.effective_chat.id)
         
         await update.message.reply_text(response)
         
     except Exception as e:
         logger.error(f"Ошибка при обработке сообщения: {str(e)}")
-        await update.message.reply_text("Извините, произошла ошибка при обработке вашего запроса. Попробуйте позже.")
+        await update.message.reply_text(PROCESSING_ERROR_TEXT)
 
 def is_bot_running():
     """Проверяет, запущен ли уже экземпляр бота"""
@@ -319,55 +649,213 @@ def cleanup():
     except:
         pass
 
-def run_bot():
-    """Запускает бота в отдельном процессе"""
-    if is_bot_running():
-        logger.error("Бот уже запущен")
-        return
+def webhook_settings() -> dict:
+    """
+    Параметры приема обновлений через webhook
 
-    save_pid()
-    atexit.register(cleanup)
+    Встроенный HTTP сервер принимает POST от Telegram и проверяет заголовок
+    X-Telegram-Bot-Api-Secret-Token. Настройки: WEBHOOK_URL (публичный адрес,
+    например за балансировщиком), WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH
+    и WEBHOOK_SECRET.
+    """
+    listen = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+    port = int(os.getenv("WEBHOOK_PORT", "8443"))
+    url_path = os.getenv("WEBHOOK_PATH", "telegram")
+    # Если секрет не задан, генерируем новый - он передается Telegram при регистрации webhook
+    secret_token = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+    redact_secret(secret_token)
+
+    logger.info(f"Запуск в режиме webhook на {listen}:{port}/{url_path}")
+    return {
+        "listen": listen,
+        "port": port,
+        "url_path": url_path,
+        "webhook_url": os.getenv("WEBHOOK_URL"),
+        "secret_token": secret_token,
+        "max_connections": int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+    }
+
+def run_webhook(application: Application):
+    """Запускает прием обновлений через webhook"""
+    application.run_webhook(**webhook_settings())
+
+class OutgoingBot(ExtBot):
+    """
+    Бот, который отправляет сообщения и правки через очередь исходящих сообщений
+    и сообщает журналу запросов размер отправленных ответов
+    """
+
+    def __init__(self, *args, outbox=None, journal: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        with self._unfrozen():
+            self.outbox = outbox
+            self.journal = journal
 
+    async def send_message(self, chat_id, text, *args, coalesce: bool = True, **kwargs):
+        if self.outbox is None or args:
+            message = await super().send_message(chat_id, text, *args, **kwargs)
+        else:
+            send = super().send_message
+            # Склеивать можно только простые сообщения: без разметки, клавиатуры и ответа на сообщение
+            message = await self.outbox.send(
+                chat_id, text, lambda part: send(chat_id, part, **kwargs),
+                coalesce=coalesce and is_plain_message(kwargs)
+            )
+        if self.journal:
+            note_response(message.message_id, len(message.text or ""))
+        return message
+
+    async def edit_message_text(self, *args, **kwargs):
+        chat_id = kwargs.get("chat_id")
+        if self.outbox is None or chat_id is None:
+            message = await super().edit_message_text(*args, **kwargs)
+        else:
+            edit = super().edit_message_text
+            message = await self.outbox.call(chat_id, lambda: edit(*args, **kwargs))
+        if self.journal and not isinstance(message, bool):
+            note_response(message.message_id, len(message.text or ""))
+        return message
+
+def build_application(with_updater: bool = True) -> Application:
+    """
+    Создает приложение со всеми обработчиками бота
+
+    :param with_updater: Создавать Updater; воркеру он не нужен, обновления ему передает supervisor
+    """
+    global request_journal, outbox
+    request_journal = create_request_journal()
+    outbox = create_outbox()
+    
     # Получаем токен из переменных окружения
     token = os.getenv("TELEGRAM_BOT_TOKEN")
     
     # Создаем приложение
-    application = Application.builder().token(token).build()
+    builder = (
+        Application.builder()
+        .concurrent_updates(BOT_CONCURRENT_UPDATES)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+    )
+    if not with_updater:
+        builder = builder.updater(None)
+    # Отправка идет через очередь, а размер ответов журнал узнает от бота, поэтому бот создается явно
+    builder = builder.bot(OutgoingBot(
+        token,
+        base_url=TELEGRAM_BASE_URL or "https://api.telegram.org/bot",
+        request=HTTPXRequest(connection_pool_size=256),
+        get_updates_request=HTTPXRequest(),
+        outbox=outbox,
+        journal=request_journal is not None
+    ))
+    application = builder.build()
     
-    # Добавляем обработчики команд
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("calculate_vm", calculate_vm))
-    application.add_handler(CommandHandler("pricing", get_pricing))
-    application.add_handler(CommandHandler("services", recommend_services))
-    application.add_handler(CommandHandler("databases", list_databases))
-    application.add_handler(CommandHandler("examples", get_examples))
-    application.add_handler(CommandHandler("optimize", optimize_resources))
-    application.add_handler(CommandHandler("diagnose", diagnose_issues))
-    application.add_handler(CommandHandler("premium", premium_features))
+    # Добавляем обработчики команд; каждый обернут сбором метрик
+    commands = {
+        "start": start,
+        "help": help_command,
+        "calculate_vm": calculate_vm,
+        "cheapest": cheapest_config,
+        "pricing": get_pricing,
+        "services": recommend_services,
+        "databases": list_databases,
+        "instances": list_instances,
+        "cost_report": cost_report,
+        "examples": get_examples,
+        "optimize": optimize_resources,
+        "diagnose": diagnose_issues,
+        "premium": premium_features,
+        "reset": reset_conversation,
+    }
+    commands["handle_message"] = handle_message
+    for route, handler in commands.items():
+        if request_journal is not None:
+            handler = request_journal.wrap(route, handler)
+        commands[route] = instrument_handler(route, handler)
+    
+    for command, handler in commands.items():
+        if command != "handle_message":
+            application.add_handler(CommandHandler(command, handler))
     
     # Обработчик текстовых сообщений
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, commands["handle_message"]))
+    return application
 
-    def signal_handler(signum, frame):
-        """Обработчик сигналов для корректного завершения"""
-        logger.info("Получен сигнал завершения, останавливаем бота...")
-        asyncio.create_task(application.stop())
-        cleanup()
-        sys.exit(0)
+def run_bot():
+    """Запускает бота в отдельном процессе"""
+    if is_bot_running():
+        logger.error("Бот уже запущен")
+        return
 
-    # Регистрируем обработчики сигналов
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+    save_pid()
+    atexit.register(cleanup)
 
+    # SIGINT и SIGTERM обрабатывает PTB: прием обновлений останавливается,
+    # начатые обработчики дорабатывают, post_stop досылает отложенные ответы,
+    # затем бот закрывается и вызывается post_shutdown
     try:
-        application.run_polling()
+        if BOT_WORKERS > 1:
+            run_supervisor()
+            return
+        application = build_application()
+        if BOT_MODE == "webhook":
+            run_webhook(application)
+        else:
+            application.run_polling()
     except Exception as e:
         logger.error(f"Ошибка при запуске бота: {e}")
         cleanup()
         sys.exit(1)
 
+def run_supervisor():
+    """Запускает supervisor с BOT_WORKERS процессами-воркерами"""
+    from supervisor import Supervisor
+    from telegram import Bot
+    
+    telegram_bot = Bot(os.getenv("TELEGRAM_BOT_TOKEN"), base_url=TELEGRAM_BASE_URL or "https://api.telegram.org/bot")
+    supervisor = Supervisor(
+        telegram_bot,
+        BOT_WORKERS,
+        [sys.executable, os.path.abspath(__file__), "--worker"],
+        drain_timeout=DRAIN_TIMEOUT
+    )
+    asyncio.run(supervisor.run(webhook_settings() if BOT_MODE == "webhook" else None))
+
+def run_worker():
+    """Запускает воркер: обновления приходят от supervisor через stdin"""
+    from supervisor import serve_worker
+    
+    logger.info(f"Воркер {os.getenv('BOT_WORKER_INDEX')} запущен")
+    asyncio.run(serve_worker(build_application(with_updater=False), post_init, post_stop, post_shutdown))
+
+def profile_startup() -> str:
+    """Измеряет стоимость импорта и инициализации компонентов бота"""
+    deferred = {module: module in sys.modules for module in ("yandexcloud", "grpc")}
+    imports = {
+        module: measure_import(module)
+        for module in ("telegram.ext", "httpx", "yandexcloud", "cloud_assistant", "yc_client", "bot")
+    }
+    errors = {}
+    for component in (cloud_assistant, pricing, yc_client):
+        try:
+            component.get()
+        except Exception as e:
+            errors[component.name] = str(e)
+    try:
+        started = time.perf_counter()
+        yc_client.get().sdk
+        init_timings["yandexcloud_sdk"] = time.perf_counter() - started
+    except Exception as e:
+        errors["yandexcloud_sdk"] = str(e)
+    return format_report(imports, dict(init_timings), errors, deferred)
+
 if __name__ == '__main__':
+    if "--profile-startup" in sys.argv:
+        print(profile_startup())
+        sys.exit(0)
+    if "--worker" in sys.argv:
+        run_worker()
+        sys.exit(0)
     try:
         run_bot()
     except KeyboardInterrupt:
@@ -1,20 +1,96 @@
+import asyncio
 import logging
+import time
 import httpx
 import json
+from contextlib import nullcontext
+from typing import AsyncIterator, Optional, Tuple
+from http_pool import create_http_client
+from completion_cache import CompletionCache
+from docs_index import DocsIndex
+from prometheus_client import Counter, Gauge, Histogram
+from metrics import LATENCY_BUCKETS
+from journal import note_upstream, note_model
+from conversation import ConversationStore
+from model_router import ModelRouter, ModelRoute
+from resilience import CircuitBreaker, CircuitBreakers, CircuitOpen, Hedger
+from singleflight import SingleFlight
+from llm_scheduler import (
+    LLMScheduler, UpstreamThrottled, PRIORITY_LOW, parse_retry_after, priority_for_prompt
+)
 
 logger = logging.getLogger(__name__)
 
+LLM_LATENCY = Histogram(
+    "llm_request_duration_seconds", "Время запроса к YandexGPT (для потока - до последнего фрагмента)", ["mode"],
+    buckets=LATENCY_BUCKETS
+)
+LLM_ERRORS = Counter("llm_request_errors_total", "Ошибки запросов к YandexGPT", ["mode", "reason"])
+LLM_IN_FLIGHT = Gauge("llm_requests_in_flight", "Запросы к YandexGPT, ожидающие ответа")
+LLM_QUEUE_DEPTH = Gauge("llm_queue_depth", "Запросы, ожидающие слота планировщика")
+LLM_TOKENS = Counter("llm_tokens_total", "Токены по данным поля usage ответа", ["type"])
+LLM_CACHE_HITS = Counter("llm_cache_hits_total", "Ответы, отданные из кэша без запроса к модели")
+LLM_DEGRADED = Counter("llm_degraded_answers_total", "Ответы без модели при открытом предохранителе", ["source"])
+
+DEGRADED_DOCS_PREFIX = "Модель сейчас перегружена, поэтому вот что нашлось в документации:\n\n"
+DEGRADED_MESSAGE = "Сервис ответов сейчас перегружен. Попробуйте повторить вопрос через минуту."
+
+def _error_reason(error: Exception) -> str:
+    """Метка причины ошибки: HTTP статус или класс исключения"""
+    if isinstance(error, UpstreamThrottled):
+        return str(error.status_code)
+    if isinstance(error, httpx.HTTPStatusError):
+        return str(error.response.status_code)
+    return type(error).__name__
+
+def _model_name(data: dict) -> str:
+    """Модель из modelUri: gpt://<каталог>/yandexgpt-lite -> yandexgpt-lite"""
+    return data["modelUri"].split("/", 3)[-1]
+
+def _record_usage(result: dict):
+    """Учет токенов из поля usage ответа completion API"""
+    usage = result.get("usage") or {}
+    for field, kind in (("inputTextTokens", "input"), ("completionTokens", "completion")):
+        if field in usage:
+            LLM_TOKENS.labels(kind).inc(int(usage[field]))
+
 class CloudAssistant:
-    def __init__(self, api_key: str, folder_id: str):
+    def __init__(self, api_key: str, folder_id: str, http_client: httpx.AsyncClient = None,
+                 cache: CompletionCache = None, scheduler: LLMScheduler = None,
+                 docs_index: DocsIndex = None, base_url: str = None,
+                 conversations: ConversationStore = None, operation_url: str = None,
+                 router: ModelRouter = None, hedger: Hedger = None, breakers: CircuitBreakers = None):
         """
         Инициализация ассистента Yandex Cloud
         
         :param api_key: API ключ
         :param folder_id: ID каталога в облаке
+        :param http_client: Общий HTTP клиент с пулом соединений
+        :param cache: Кэш ответов модели (None - без кэширования)
+        :param scheduler: Планировщик запросов к модели
+        :param docs_index: Индекс документации для подстановки фрагментов в промпт
+        :param base_url: Адрес foundationModels API (по умолчанию - Yandex Cloud)
+        :param conversations: История диалогов по чатам (None - без истории)
+        :param operation_url: Адрес Operation API для отложенных запросов
+        :param router: Выбор модели по сложности запроса (None - всегда yandexgpt-lite)
+        :param hedger: Дублирование медленных запросов (None - без дублей)
+        :param breakers: Предохранители по моделям (None - без предохранителей)
         """
         self.api_key = api_key
         self.folder_id = folder_id
-        self.base_url = "https://llm.api.cloud.yandex.net/foundationModels/v1"
+        self._http_client = http_client
+        self.cache = cache
+        # Одинаковые одновременные запросы ждут один общий ответ апстрима
+        self.inflight = SingleFlight()
+        self.scheduler = scheduler or LLMScheduler()
+        self.docs_index = docs_index
+        self.conversations = conversations
+        self.router = router
+        self.hedger = hedger
+        self.breakers = breakers
+        LLM_QUEUE_DEPTH.set_function(lambda: self.scheduler.queue_depth)
+        self.base_url = base_url or "https://llm.api.cloud.yandex.net/foundationModels/v1"
+        self.operation_url = operation_url or "https://operation.api.cloud.yandex.net/operations"
         self.headers = {
             "Authorization": f"Api-Key {api_key}",
             "Content-Type": "application/json"
@@ -36,54 +112,348 @@ class CloudAssistant:
             )
         }
     
-    async def get_completion(self, prompt: str, system_prompt: str = None) -> str:
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """Общий HTTP клиент; создается при первом обращении, если не был передан"""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = create_http_client()
+        return self._http_client
+    
+    @http_client.setter
+    def http_client(self, client: httpx.AsyncClient):
+        self._http_client = client
+    
+    async def aclose(self):
+        """Закрывает HTTP клиент и освобождает соединения пула"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+    
+    def _build_request(self, prompt: str, system_prompt: str = None, stream: bool = False,
+                       history: list = None, route: ModelRoute = None) -> dict:
+        """
+        Формирование тела запроса к модели
+        
+        :param prompt: Текст запроса
+        :param system_prompt: Системный промпт для задания контекста
+        :param stream: Запросить потоковую генерацию
+        :param history: Предыдущие сообщения диалога
+        :param route: Модель и maxTokens (по умолчанию yandexgpt-lite, 2000)
+        :return: Тело запроса
+        """
+        messages = []
+        if system_prompt:
+            messages.append({
+                "role": "system",
+                "text": system_prompt
+            })
+        
+        if history:
+            messages.extend(history)
+        
+        messages.append({
+            "role": "user",
+            "text": prompt
+        })
+        
+        return {
+            "modelUri": f"gpt://{self.folder_id}/{route.model if route else 'yandexgpt-lite'}",
+            "completionOptions": {
+                "stream": stream,
+                "temperature": 0.6,
+                "maxTokens": route.max_tokens if route else 2000
+            },
+            "messages": messages
+        }
+    
+    def _with_docs_context(self, prompt: str, system_prompt: str = None) -> str:
+        """
+        Добавление к системному промпту релевантных фрагментов документации
+        
+        :param prompt: Текст запроса
+        :param system_prompt: Исходный системный промпт
+        :return: Системный промпт с фрагментами или исходный, если ничего не найдено
+        """
+        if self.docs_index is None:
+            return system_prompt
+        context = self.docs_index.context_for(prompt)
+        if not context:
+            return system_prompt
+        grounding = (
+            "Отвечай кратко и по существу, опираясь на фрагменты документации ниже. "
+            "Если в них нет ответа, так и скажи.\n\n" + context
+        )
+        return f"{system_prompt}\n\n{grounding}" if system_prompt else grounding
+    
+    def build_chat_request(self, prompt: str, system_prompt: str = None, chat_id: int = None,
+                           stream: bool = False) -> dict:
+        """
+        Тело запроса с фрагментами документации и историей диалога чата
+        
+        :param prompt: Текст запроса
+        :param system_prompt: Системный промпт
+        :param chat_id: ID чата, чья история подставляется в запрос
+        :param stream: Запросить потоковую генерацию
+        :return: Тело запроса
+        """
+        history = None
+        if self.conversations is not None and chat_id is not None:
+            history = self.conversations.history(chat_id)
+        route = self.route(prompt, system_prompt)
+        return self._build_request(prompt, self._with_docs_context(prompt, system_prompt), stream, history, route)
+    
+    def route(self, prompt: str, system_prompt: str = None) -> Optional[ModelRoute]:
+        """
+        Выбор модели для запроса; роль определяется по системному промпту,
+        поэтому запросы /diagnose и /optimize узнаются на любом пути
+        
+        :param prompt: Текст запроса
+        :param system_prompt: Системный промпт
+        :return: Маршрут или None, если маршрутизация выключена
+        """
+        if self.router is None:
+            return None
+        role = next((name for name, text in self.system_prompts.items() if text == system_prompt), None)
+        route = self.router.route(prompt, role)
+        note_model(route.model)
+        return route
+    
+    def remember(self, chat_id: int, prompt: str, answer: str):
+        """Сохранение вопроса и ответа в истории чата"""
+        if self.conversations is not None and chat_id is not None and answer:
+            self.conversations.remember(chat_id, prompt, answer)
+    
+    async def get_completion(self, prompt: str, system_prompt: str = None,
+                             chat_id: int = None, priority: int = None) -> str:
         """
         Получение ответа от модели
         
         :param prompt: Текст запроса
         :param system_prompt: Системный промпт для задания контекста
+        :param chat_id: ID чата для справедливого распределения запросов
+        :param priority: Приоритет в очереди (по умолчанию - по длине запроса)
         :return: Ответ модели
         """
         try:
-            messages = []
-            if system_prompt:
-                messages.append({
-                    "role": "system",
-                    "text": system_prompt
-                })
-            
-            messages.append({
-                "role": "user",
-                "text": prompt
-            })
-            
-            data = {
-                "modelUri": f"gpt://{self.folder_id}/yandexgpt-lite",
-                "completionOptions": {
-                    "stream": False,
-                    "temperature": 0.6,
-                    "maxTokens": 2000
-                },
-                "messages": messages
-            }
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
+            data = self.build_chat_request(prompt, system_prompt, chat_id)
+            if priority is None:
+                priority = priority_for_prompt(prompt)
+            text, answered = await self.request_completion(data, chat_id=chat_id, priority=priority)
+            if answered:
+                self.remember(chat_id, prompt, text)
+            return text
+                    
+        except Exception as e:
+            logger.error(f"Error in get_completion: {str(e)}")
+            return "Извините, произошла ошибка при обработке запроса."
+    
+    async def request_completion(self, data: dict, chat_id: int = None,
+                                 priority: int = None) -> Tuple[str, bool]:
+        """
+        Выполнение запроса к completion API с учетом кэша и очереди
+        
+        :param data: Тело запроса
+        :param chat_id: ID чата
+        :param priority: Приоритет в очереди (по умолчанию - по длине запроса)
+        :return: Текст и признак ответа модели: False - деградированный ответ при открытом
+            предохранителе, его не нужно сохранять в истории диалога
+        :raises httpx.HTTPStatusError: Если API вернул ошибку
+        :raises UpstreamThrottled: Если апстрим перегружен и повторы исчерпаны
+        """
+        key = CompletionCache.make_key(data)
+        if self.cache is not None:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                LLM_CACHE_HITS.inc()
+                return cached, True
+        
+        if priority is None:
+            priority = priority_for_prompt(data["messages"][-1]["text"])
+        try:
+            # Открытый предохранитель отвечает сразу, не занимая очередь планировщика
+            breaker = self._breaker(data)
+            if breaker is not None:
+                breaker.check()
+            text = await self.inflight.do(key, lambda: self._fetch_and_store(key, data, chat_id, priority))
+            return text, True
+        except CircuitOpen as e:
+            logger.warning(f"Запрос не отправлен: {e}")
+            return await self.degraded_answer(data, key), False
+    
+    async def _fetch_and_store(self, key: str, data: dict, chat_id: int, priority: int) -> str:
+        text = await self.scheduler.run(lambda: self._attempt(data), chat_id, priority)
+        if self.cache is not None:
+            self.cache.set(key, text)
+        return text
+    
+    def _breaker(self, data: dict) -> Optional[CircuitBreaker]:
+        return self.breakers.get(_model_name(data)) if self.breakers is not None else None
+    
+    def _guard(self, data: dict):
+        """Учет запроса предохранителем модели"""
+        breaker = self._breaker(data)
+        return breaker.call() if breaker is not None else nullcontext()
+    
+    async def _attempt(self, data: dict) -> str:
+        with self._guard(data):
+            if self.hedger is None:
+                return await self._post_completion(data)
+            return await self.hedger.run(lambda: self._post_completion(data), key=data["modelUri"],
+                                         scheduler=self.scheduler)
+    
+    def _open_stream(self, data: dict) -> AsyncIterator[str]:
+        if self.hedger is None:
+            return self._stream_post(data)
+        return self.hedger.stream(lambda: self._stream_post(data), key=data["modelUri"],
+                                  scheduler=self.scheduler)
+    
+    async def degraded_answer(self, data: dict, key: str = None) -> str:
+        """
+        Ответ без обращения к модели, когда ее предохранитель открыт
+        
+        По порядку: устаревший ответ из кэша, фрагменты документации по
+        вопросу, сообщение о перегрузке.
+        
+        :param data: Тело запроса
+        :param key: Ключ кэша, если уже посчитан
+        :return: Текст ответа
+        """
+        if self.cache is not None:
+            stale = await self.cache.get_stale(key or CompletionCache.make_key(data))
+            if stale is not None:
+                LLM_DEGRADED.labels("stale_cache").inc()
+                return stale
+        if self.docs_index is not None:
+            context = self.docs_index.context_for(data["messages"][-1]["text"])
+            if context:
+                LLM_DEGRADED.labels("docs").inc()
+                return DEGRADED_DOCS_PREFIX + context
+        LLM_DEGRADED.labels("none").inc()
+        return DEGRADED_MESSAGE
+    
+    async def _post_completion(self, data: dict) -> str:
+        started = time.perf_counter()
+        with LLM_IN_FLIGHT.track_inprogress(), LLM_LATENCY.labels("sync").time():
+            try:
+                response = await self.http_client.post(
                     f"{self.base_url}/completion",
                     headers=self.headers,
                     json=data
                 )
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    return result["result"]["alternatives"][0]["message"]["text"]
-                else:
-                    logger.error(f"Error from API: {response.status_code} - {response.text}")
-                    return "Извините, произошла ошибка при обработке запроса."
+                self._check_status(response)
+                result = response.json()["result"]
+            except Exception as e:
+                LLM_ERRORS.labels("sync", _error_reason(e)).inc()
+                raise
+            finally:
+                note_upstream(time.perf_counter() - started)
+        _record_usage(result)
+        return result["alternatives"][0]["message"]["text"]
+    
+    def _check_status(self, response: httpx.Response):
+        if response.status_code == 200:
+            return
+        logger.error(f"Error from API: {response.status_code} - {response.text}")
+        if response.status_code in (429, 503):
+            raise UpstreamThrottled(response.status_code, parse_retry_after(response.headers.get("Retry-After")))
+        response.raise_for_status()
+    
+    async def stream_completion(self, prompt: str, system_prompt: str = None,
+                                chat_id: int = None, priority: int = None) -> AsyncIterator[str]:
+        """
+        Потоковое получение ответа от модели
+        
+        API возвращает по строке JSON на каждый фрагмент, и в каждом фрагменте
+        содержится весь сгенерированный к этому моменту текст.
+        
+        :param prompt: Текст запроса
+        :param system_prompt: Системный промпт для задания контекста
+        :param chat_id: ID чата для справедливого распределения запросов
+        :param priority: Приоритет в очереди (по умолчанию - по длине запроса)
+        :return: Асинхронный генератор с накопленным текстом ответа
+        """
+        data = self.build_chat_request(prompt, system_prompt, chat_id, stream=True)
+        
+        key = CompletionCache.make_key(data)
+        if self.cache is not None:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                LLM_CACHE_HITS.inc()
+                self.remember(chat_id, prompt, cached)
+                yield cached
+                return
+        
+        if priority is None:
+            priority = priority_for_prompt(prompt)
+        
+        breaker = self._breaker(data)
+        text = ""
+        try:
+            if breaker is not None:
+                breaker.check()
+            # Одинаковые одновременные запросы читают один поток апстрима
+            async for text in self.inflight.stream(key, lambda: self._stream_upstream(data, key, chat_id, priority)):
+                yield text
+        except CircuitOpen as e:
+            # Предохранитель открыт или открылся, пока запрос ждал слота; фрагментов еще не было.
+            # Деградированный ответ не сохраняется в истории диалога
+            logger.warning(f"Запрос не отправлен: {e}")
+            yield await self.degraded_answer(data, key)
+            return
+        self.remember(chat_id, prompt, text)
+    
+    async def _stream_upstream(self, data: dict, key: str, chat_id: int, priority: int) -> AsyncIterator[str]:
+        """
+        Чтение потока апстрима с повторами; выполняется отдельной задачей SingleFlight
+        
+        Слот планировщика держится, пока читается поток, и не зависит от того,
+        как быстро подписчики отправляют текст в Telegram.
+        """
+        text = ""
+        async with self.scheduler.slot(chat_id, priority):
+            attempt = 0
+            while True:
+                try:
+                    with self._guard(data):
+                        async for text in self._open_stream(data):
+                            yield text
+                    break
+                except UpstreamThrottled as e:
+                    # Статус проверяется до первого фрагмента, так что повтор безопасен
+                    await self.scheduler.backoff(attempt, e)
+                    attempt += 1
+        
+        if self.cache is not None and text:
+            self.cache.set(key, text)
+    
+    async def _stream_post(self, data: dict) -> AsyncIterator[str]:
+        result = {}
+        started = time.perf_counter()
+        with LLM_IN_FLIGHT.track_inprogress(), LLM_LATENCY.labels("stream").time():
+            try:
+                async with self.http_client.stream(
+                    "POST",
+                    f"{self.base_url}/completion",
+                    headers=self.headers,
+                    json=data
+                ) as response:
+                    if response.status_code != 200:
+                        await response.aread()
+                        self._check_status(response)
                     
-        except Exception as e:
-            logger.error(f"Error in get_completion: {str(e)}")
-            return "Извините, произошла ошибка при обработке запроса."
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        result = json.loads(line)["result"]
+                        yield result["alternatives"][0]["message"]["text"]
+            except Exception as e:
+                LLM_ERRORS.labels("stream", _error_reason(e)).inc()
+                raise
+            finally:
+                note_upstream(time.perf_counter() - started)
+        # usage приходит в каждом фрагменте накопительно, учитываем последний
+        _record_usage(result)
     
     async def get_code_example(self, service: str, scenario: str) -> str:
         """
@@ -96,6 +466,56 @@ class CloudAssistant:
         prompt = f"Предоставь пример кода на Python для сервиса {service} в Yandex Cloud. Сценарий: {scenario}"
         return await self.get_completion(prompt, system_prompt=self.system_prompts["examples"])
     
+    async def submit_completion(self, prompt: str, system_prompt: str = None,
+                                priority: int = PRIORITY_LOW) -> str:
+        """
+        Отправка запроса в асинхронный completion API без ожидания генерации
+        
+        :param prompt: Текст запроса
+        :param system_prompt: Системный промпт
+        :param priority: Приоритет в очереди
+        :return: ID операции
+        :raises httpx.HTTPStatusError: Если API вернул ошибку
+        """
+        data = self.build_chat_request(prompt, system_prompt)
+        
+        async def post():
+            with LLM_LATENCY.labels("async_submit").time():
+                response = await self.http_client.post(
+                    f"{self.base_url}/completionAsync",
+                    headers=self.headers,
+                    json=data
+                )
+                self._check_status(response)
+            return response.json()["id"]
+        
+        return await self.scheduler.run(post, priority=priority)
+    
+    async def get_operation(self, operation_id: str) -> dict:
+        """
+        Состояние операции асинхронного запроса
+        
+        :param operation_id: ID операции
+        :return: Операция: done, а по завершении response или error
+        :raises httpx.HTTPStatusError: Если API вернул ошибку
+        """
+        response = await self.http_client.get(f"{self.operation_url}/{operation_id}", headers=self.headers)
+        self._check_status(response)
+        operation = response.json()
+        if operation.get("done") and "response" in operation:
+            _record_usage(operation["response"])
+        return operation
+    
+    def optimization_request(self, resource_type: str, current_setup: str) -> tuple:
+        """Запрос и системный промпт для рекомендаций по оптимизации"""
+        prompt = f"Проанализируй текущую конфигурацию {resource_type}: {current_setup}. Предложи оптимизации."
+        return prompt, self.system_prompts["optimization"]
+    
+    def diagnostic_request(self, problem_description: str) -> tuple:
+        """Запрос и системный промпт для диагностики проблемы"""
+        prompt = f"Помоги диагностировать и решить проблему: {problem_description}"
+        return prompt, self.system_prompts["diagnostics"]
+    
     async def get_optimization_advice(self, resource_type: str, current_setup: str) -> str:
         """
         Получение рекомендаций по оптимизации
@@ -104,8 +524,8 @@ class CloudAssistant:
         :param current_setup: Текущая конфигурация
         :return: Рекомендации по оптимизации
         """
-        prompt = f"Проанализируй текущую конфигурацию {resource_type}: {current_setup}. Предложи оптимизации."
-        return await self.get_completion(prompt, system_prompt=self.system_prompts["optimization"])
+        prompt, system_prompt = self.optimization_request(resource_type, current_setup)
+        return await self.get_completion(prompt, system_prompt=system_prompt, priority=PRIORITY_LOW)
     
     async def get_diagnostic_help(self, problem_description: str) -> str:
         """
@@ -114,8 +534,8 @@ class CloudAssistant:
         :param problem_description: Описание проблемы
         :return: Диагностика и решение
         """
-        prompt = f"Помоги диагностировать и решить проблему: {problem_description}"
-        return await self.get_completion(prompt, system_prompt=self.system_prompts["diagnostics"])
+        prompt, system_prompt = self.diagnostic_request(problem_description)
+        return await self.get_completion(prompt, system_prompt=system_prompt, priority=PRIORITY_LOW)
     
     async def get_service_info(self, service: str) -> str:
         """
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Поддерживаемые типы ресурсов и методы постраничного обхода клиента
+RESOURCES = {
+    "instances": "iter_compute_instances_async",
+    "databases": "iter_databases_async",
+}
+
+
+class _Snapshot:
+    __slots__ = ("items", "fetched_at")
+
+    def __init__(self, items: List, fetched_at: float):
+        self.items = items
+        self.fetched_at = fetched_at
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+class CloudInventory:
+    def __init__(self, yc_client, ttl: float = 60, max_stale: float = 3600, refresh_interval: float = 300):
+        """
+        Кэш инвентаря облака (виртуальные машины и базы данных)
+
+        Свежие данные отдаются сразу. Устаревшие, но не старше max_stale, тоже
+        отдаются сразу, а обновление запускается в фоне (stale-while-revalidate).
+        Дополнительно фоновая задача периодически обновляет все ресурсы.
+
+        :param yc_client: Клиент Yandex Cloud
+        :param ttl: Сколько секунд данные считаются свежими
+        :param max_stale: Сколько секунд можно отдавать устаревшие данные
+        :param refresh_interval: Период фонового обновления, сек (0 - без фонового обновления)
+        """
+        self.yc_client = yc_client
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.refresh_interval = refresh_interval
+
+        self._snapshots: Dict[str, _Snapshot] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._background: asyncio.Task = None
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    async def get(self, resource: str) -> List:
+        """
+        Получение списка ресурсов
+
+        :param resource: Тип ресурса: instances или databases
+        :return: Список ресурсов
+        """
+        snapshot = self._snapshots.get(resource)
+        if snapshot is not None:
+            if snapshot.age < self.ttl:
+                self.hits += 1
+                return snapshot.items
+            if snapshot.age < self.max_stale:
+                self.stale_hits += 1
+                self._refresh_in_background(resource)
+                return snapshot.items
+
+        self.misses += 1
+        return await self.refresh(resource)
+
+    async def refresh(self, resource: str) -> List:
+        """
+        Загрузка списка ресурсов из API; одновременные обновления объединяются
+
+        :param resource: Тип ресурса
+        :return: Свежий список ресурсов
+        """
+        task = self._refreshing.get(resource)
+        if task is None:
+            task = asyncio.ensure_future(self._load(resource))
+            self._refreshing[resource] = task
+            task.add_done_callback(lambda _: self._refreshing.pop(resource, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, resource: str) -> List:
+        started = time.monotonic()
+        iter_pages = getattr(self.yc_client, RESOURCES[resource])
+        items = []
+        async for page in iter_pages():
+            items.extend(page)
+        self._snapshots[resource] = _Snapshot(items, time.monotonic())
+        logger.info(f"Инвентарь {resource} обновлен: {len(items)} шт. за {time.monotonic() - started:.2f} с")
+        return items
+
+    def _refresh_in_background(self, resource: str):
+        if resource in self._refreshing:
+            return
+        task = asyncio.ensure_future(self.refresh(resource))
+        task.add_done_callback(self._log_refresh_error)
+
+    @staticmethod
+    def _log_refresh_error(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Ошибка фонового обновления инвентаря: {task.exception()}")
+
+    async def _refresh_loop(self):
+        while True:
+            for resource in RESOURCES:
+                try:
+                    await self.refresh(resource)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Ошибка фонового обновления инвентаря {resource}: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        """Запускает периодическое фоновое обновление"""
+        if self.refresh_interval > 0 and self._background is None:
+            self._background = asyncio.ensure_future(self._refresh_loop())
+
+    async def stop(self):
+        """Останавливает фоновое обновление"""
+        tasks = list(self._refreshing.values())
+        if self._background is not None:
+            tasks.append(self._background)
+            self._background = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        """Счетчики обращений к кэшу и возраст данных"""
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "age": {name: round(s.age, 1) for name, s in self._snapshots.items()}
+        }
+
+
+def create_cloud_inventory(yc_client) -> CloudInventory:
+    """
+    Создание кэша инвентаря по настройкам из переменных окружения
+
+    INVENTORY_TTL, INVENTORY_MAX_STALE и INVENTORY_REFRESH_INTERVAL.
+    """
+    return CloudInventory(
+        yc_client,
+        ttl=float(os.getenv("INVENTORY_TTL", "60")),
+        max_stale=float(os.getenv("INVENTORY_MAX_STALE", "3600")),
+        refresh_interval=float(os.getenv("INVENTORY_REFRESH_INTERVAL", "300"))
+    )
@@ -1,4 +1,4 @@
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Sequence
 import json
 
 class CloudPricing:
@@ -26,6 +26,23 @@ class CloudPricing:
             }
         }
 
+        # Ресурсы инстансов PostgreSQL (vCPU, ГБ RAM). В прайсе их нет - это допущение
+        # о составе тарифов; используется только при явном подборе postgresql в /cheapest
+        self.database_specs = {
+            "postgresql": {
+                "small": (2, 8),
+                "medium": (4, 16),
+                "large": (8, 32),
+            }
+        }
+
+        # Сетка конфигураций VM для подбора: число ядер и ГБ RAM на ядро
+        self.vm_cores_grid = list(range(2, 97, 2))
+        self.vm_ram_per_core_grid = list(range(1, 17))
+
+        # Отсортированная по цене таблица предложений, строится при первом подборе
+        self._offers = None
+
     def calculate_vm_cost(self, cpu: int, ram: int, disk: int, hours: int = 730) -> Dict:
         """
         Расчет стоимости виртуальной машины
@@ -52,10 +69,145 @@ class CloudPricing:
             "monthly_estimate": round(total, 2)
         }
 
+    def calculate_vm_cost_batch(self, cpu, ram, disk, hours=730) -> Dict:
+        """
+        Векторизованный расчет стоимости множества виртуальных машин
+
+        Все аргументы - числа или массивоподобные объекты одинаковой длины
+        (списки, массивы NumPy); скаляры распространяются на все конфигурации.
+
+        :param cpu: Количество ядер CPU
+        :param ram: Объем RAM в ГБ
+        :param disk: Объем диска в ГБ
+        :param hours: Количество часов работы (по умолчанию месяц)
+        :return: Словарь столбцов (массивов NumPy): cpu, ram, disk, total
+        """
+        # NumPy нужен только для пакетных расчетов, поэтому импортируется здесь
+        import numpy as np
+
+        prices = self.prices["compute"]
+        cpu, ram, disk, hours = np.broadcast_arrays(
+            np.asarray(cpu, dtype=np.float64),
+            np.asarray(ram, dtype=np.float64),
+            np.asarray(disk, dtype=np.float64),
+            np.asarray(hours, dtype=np.float64)
+        )
+
+        cpu_cost = prices["cpu_hour"] * cpu * hours
+        ram_cost = prices["ram_gb_hour"] * ram * hours
+        disk_cost = prices["disk_gb_month"] * disk
+        total = cpu_cost + ram_cost + disk_cost
+
+        return {
+            "cpu": np.round(cpu_cost, 2),
+            "ram": np.round(ram_cost, 2),
+            "disk": np.round(disk_cost, 2),
+            "total": np.round(total, 2)
+        }
+
+    def _build_offers(self) -> Dict:
+        """
+        Построение таблицы предложений, отсортированной по цене часа
+
+        Цена каждого предложения линейна по часам, а диск оплачивается одинаково
+        для всех предложений, поэтому порядок по цене часа не зависит от запроса
+        и таблицу достаточно отсортировать один раз.
+        """
+        import numpy as np
+
+        names, kinds, cpus, rams, rates = [], [], [], [], []
+        compute = self.prices["compute"]
+        for cores in self.vm_cores_grid:
+            for per_core in self.vm_ram_per_core_grid:
+                ram = cores * per_core
+                names.append(f"Compute Cloud VM {cores} vCPU / {ram} ГБ")
+                kinds.append("vm")
+                cpus.append(cores)
+                rams.append(ram)
+                rates.append(compute["cpu_hour"] * cores + compute["ram_gb_hour"] * ram)
+
+        # Тарифы PostgreSQL помесячные - приводим к цене часа для общего порядка
+        for tier, monthly in self.prices["database"]["postgresql"].items():
+            cores, ram = self.database_specs["postgresql"][tier]
+            names.append(f"Managed Service for PostgreSQL ({tier}) {cores} vCPU / {ram} ГБ")
+            kinds.append("postgresql")
+            cpus.append(cores)
+            rams.append(ram)
+            rates.append(monthly / 730)
+
+        order = np.argsort(rates, kind="stable")
+        return {
+            "name": [names[i] for i in order],
+            "kind": [kinds[i] for i in order],
+            "cpu": np.asarray(cpus, dtype=np.float64)[order],
+            "ram": np.asarray(rams, dtype=np.float64)[order],
+            "rate": np.asarray(rates, dtype=np.float64)[order],
+        }
+
+    def find_cheapest_configurations(self, min_cpu: int, min_ram: int, min_disk: int = 0,
+                                     hours: int = 730, budget: Optional[float] = None,
+                                     kinds: Optional[Sequence[str]] = ("vm",), limit: int = 5) -> List[Dict]:
+        """
+        Подбор самых дешевых конфигураций, удовлетворяющих требованиям
+
+        Возвращает Парето-оптимальные варианты: каждый следующий дороже
+        предыдущего, но дает больше CPU или RAM, иначе он не имеет смысла.
+
+        :param min_cpu: Минимум vCPU
+        :param min_ram: Минимум ГБ RAM
+        :param min_disk: Минимум ГБ диска
+        :param hours: Количество часов работы в месяц
+        :param budget: Максимальная стоимость в месяц (None - без ограничения)
+        :param kinds: Типы предложений: vm, postgresql (None - все); по умолчанию только VM
+        :param limit: Максимум вариантов
+        :return: Список вариантов по возрастанию цены
+        """
+        import numpy as np
+
+        if self._offers is None:
+            self._offers = self._build_offers()
+        offers = self._offers
+
+        # Диск стоит одинаково для всех вариантов (для PostgreSQL считаем по цене диска VM)
+        disk_cost = self.prices["compute"]["disk_gb_month"] * min_disk
+
+        # Бюджет отсекает префикс отсортированной таблицы бинарным поиском
+        end = len(offers["rate"])
+        if budget is not None:
+            if hours <= 0:
+                end = len(offers["rate"]) if disk_cost <= budget else 0
+            else:
+                end = int(np.searchsorted(offers["rate"], (budget - disk_cost) / hours, side="right"))
+
+        fits = (offers["cpu"][:end] >= min_cpu) & (offers["ram"][:end] >= min_ram)
+        options = []
+        for i in np.flatnonzero(fits):
+            kind = offers["kind"][i]
+            if kinds is not None and kind not in kinds:
+                continue
+            cpu, ram = offers["cpu"][i], offers["ram"][i]
+            # Вариант не нужен, если есть не более дорогой с не меньшими ресурсами
+            if any(o["cpu"] >= cpu and o["ram"] >= ram for o in options):
+                continue
+            options.append({
+                "name": offers["name"][i],
+                "kind": kind,
+                "cpu": int(cpu),
+                "ram": int(ram),
+                "monthly_cost": round(float(offers["rate"][i] * hours + disk_cost), 2)
+            })
+            if len(options) >= limit:
+                break
+
+        return options
+
     def get_service_recommendation(self, requirements: Dict) -> Dict:
         """
         Получение рекомендаций по выбору сервисов
         
+        Если в требованиях указаны ресурсы (cpu, ram, disk), варианты подбираются
+        по прайсу с учетом hours и budget; иначе - по типу проекта.
+        
         :param requirements: Словарь с требованиями
         :return: Словарь с рекомендациями
         """
@@ -65,6 +217,30 @@ class CloudPricing:
             "explanation": ""
         }
         
+        if any(key in requirements for key in ("cpu", "ram", "disk")):
+            options = self.find_cheapest_configurations(
+                min_cpu=requirements.get("cpu", 0),
+                min_ram=requirements.get("ram", 0),
+                min_disk=requirements.get("disk", 0),
+                hours=requirements.get("hours", 730),
+                budget=requirements.get("budget"),
+                kinds=requirements.get("kinds") or ("vm",)
+            )
+            for option in options:
+                recommendations["recommended_services"].append({
+                    "name": option["name"],
+                    "reason": f"{option['cpu']} vCPU / {option['ram']} ГБ RAM за {option['monthly_cost']} ₽/мес"
+                })
+                recommendations["cost_estimate"][option["name"]] = option["monthly_cost"]
+            if options:
+                recommendations["explanation"] = (
+                    "Самые дешевые конфигурации, удовлетворяющие требованиям; "
+                    "каждая следующая дороже, но дает больше ресурсов"
+                )
+            else:
+                recommendations["explanation"] = "Нет конфигураций, удовлетворяющих требованиям и бюджету"
+            return recommendations
+        
         # Анализ требований
         if requirements.get("type") == "web_app":
             if requirements.get("traffic", 0) < 1000:
@@ -108,6 +284,38 @@ class CloudPricing:
         
         return message
 
+    def format_recommendation_message(self, recommendations: Dict) -> str:
+        """
+        Форматирование сообщения с рекомендациями
+
+        :param recommendations: Результат get_service_recommendation
+        :return: Отформатированное сообщение
+        """
+        message = "🎯 Рекомендуемые конфигурации:\n\n"
+        for i, service in enumerate(recommendations["recommended_services"]):
+            message += f"{i + 1}. {service['name']}\n   {service['reason']}\n"
+        message += f"\n{recommendations['explanation']}\n"
+
+        return message
+
+    def format_batch_message(self, configs: List, calculation: Dict) -> str:
+        """
+        Форматирование сообщения с расчетом нескольких конфигураций
+
+        :param configs: Список конфигураций (cpu, ram, disk)
+        :param calculation: Результат calculate_vm_cost_batch
+        :return: Отформатированное сообщение
+        """
+        message = "💰 Расчет стоимости конфигураций:\n\n"
+        for i, (cpu, ram, disk) in enumerate(configs):
+            message += (
+                f"{i + 1}. {cpu} CPU / {ram} ГБ RAM / {disk} ГБ диска: "
+                f"{calculation['total'][i]:.2f} ₽/мес\n"
+            )
+        message += f"\nИтого: {float(calculation['total'].sum()):.2f} ₽/мес\n"
+
+        return message
+
     def get_pricing_info(self, service: str) -> str:
         """
         Получение информации о ценах на сервис
@@ -0,0 +1,237 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(text: str) -> str:
+    """
+    Нормализация текста запроса для ключа кэша
+
+    Приводит к нижнему регистру, схлопывает пробелы и убирает
+    завершающие знаки препинания, чтобы "Что такое Object Storage?"
+    и "что такое object storage" попадали в одну запись.
+    """
+    return _WHITESPACE_RE.sub(" ", text.lower()).strip().rstrip("?!.").strip()
+
+
+class CompletionCache:
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600, db_path: str = None):
+        """
+        Кэш ответов модели: LRU в памяти с TTL и опциональный уровень в sqlite
+
+        Sqlite не блокирует цикл событий: чтение идет сначала из памяти, а
+        запросы к sqlite выполняются в отдельном потоке кэша. Новые ответы
+        копятся и пишутся тем же потоком пачками одной транзакцией.
+
+        :param max_entries: Максимальное число записей в памяти
+        :param ttl: Время жизни записи в секундах
+        :param db_path: Путь к файлу sqlite для сохранения кэша между перезапусками
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, text)
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self._db = None
+        self._pending: Dict[str, Tuple[float, str]] = {}  # key -> (expires_at, text), еще не записанные
+        self._pending_lock = threading.Lock()
+        self._flush_scheduled = False
+        self._executor = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS completions "
+                "(key TEXT PRIMARY KEY, expires_at REAL NOT NULL, text TEXT NOT NULL)"
+            )
+            self._db.execute("DELETE FROM completions WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+            # После инициализации соединение используется только этим потоком; он же сохраняет порядок пачек
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="completion-cache")
+
+    @staticmethod
+    def make_key(data: Dict) -> str:
+        """
+        Построение ключа кэша по телу запроса к модели
+
+        В ключ входят нормализованные сообщения пользователя, системный промпт,
+        URI модели и параметры генерации (кроме флага stream).
+
+        :param data: Тело запроса к completion API
+        :return: Хэш ключа
+        """
+        messages = [
+            (m["role"], m["text"] if m["role"] == "system" else normalize_prompt(m["text"]))
+            for m in data.get("messages", [])
+        ]
+        options = {k: v for k, v in data.get("completionOptions", {}).items() if k != "stream"}
+        raw = json.dumps([data.get("modelUri"), options, messages], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """
+        Получение ответа из кэша; при промахе в памяти sqlite читается в потоке кэша
+
+        :param key: Ключ кэша
+        :return: Текст ответа или None, если записи нет или она устарела
+        """
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, text = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return text
+            # Устаревшая запись остается до вытеснения: она нужна get_stale
+            self.expirations += 1
+
+        if self._executor is not None:
+            row = self._pending_entry(key)
+            if row is None or row[0] <= now:
+                row = await self._read(
+                    "SELECT expires_at, text FROM completions WHERE key = ? AND expires_at > ?", (key, now)
+                )
+            if row is not None:
+                self._remember(key, row[0], row[1])
+                self.disk_hits += 1
+                return row[1]
+
+        self.misses += 1
+        return None
+
+    async def get_stale(self, key: str) -> Optional[str]:
+        """
+        Ответ из кэша без учета TTL - для деградации, когда модель недоступна
+
+        :param key: Ключ кэша
+        :return: Текст ответа (возможно устаревший) или None
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry[1]
+        if self._executor is not None:
+            pending = self._pending_entry(key)
+            if pending is not None:
+                return pending[1]
+            row = await self._read("SELECT text FROM completions WHERE key = ?", (key,))
+            if row is not None:
+                return row[0]
+        return None
+
+    async def _read(self, query: str, params: tuple) -> Optional[tuple]:
+        """Одна строка из sqlite; запрос выполняется в потоке кэша"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: self._db.execute(query, params).fetchone())
+
+    def _pending_entry(self, key: str) -> Optional[Tuple[float, str]]:
+        with self._pending_lock:
+            return self._pending.get(key)
+
+    def set(self, key: str, text: str):
+        """
+        Сохранение ответа в кэш; запись в sqlite выполняется в фоне
+
+        :param key: Ключ кэша
+        :param text: Текст ответа
+        """
+        expires_at = time.time() + self.ttl
+        self._remember(key, expires_at, text)
+        if self._executor is not None:
+            with self._pending_lock:
+                self._pending[key] = (expires_at, text)
+                if self._flush_scheduled:
+                    # Запись попадет в уже запланированную пачку
+                    return
+                self._flush_scheduled = True
+            self._executor.submit(self._write_pending)
+
+    def _write_pending(self):
+        """Запись накопленных ответов одной транзакцией; выполняется в потоке кэша"""
+        with self._pending_lock:
+            batch = dict(self._pending)
+            self._flush_scheduled = False
+        if not batch:
+            return
+        try:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO completions (key, expires_at, text) VALUES (?, ?, ?)",
+                [(key, expires_at, text) for key, (expires_at, text) in batch.items()]
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Не удалось записать кэш ответов в sqlite: {e}")
+        finally:
+            # Записи остаются видимыми в _pending, пока транзакция не завершена
+            with self._pending_lock:
+                for key, entry in batch.items():
+                    if self._pending.get(key) is entry:
+                        del self._pending[key]
+
+    def _remember(self, key: str, expires_at: float, text: str):
+        self._entries[key] = (expires_at, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        """Счетчики попаданий и промахов для настройки размера и TTL"""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0
+        }
+
+    def close(self):
+        """Дописывает накопленные ответы и закрывает соединения с sqlite"""
+        if self._executor is not None:
+            self._executor.submit(self._write_pending)
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def create_completion_cache() -> Optional[CompletionCache]:
+    """
+    Создание кэша ответов по настройкам из переменных окружения
+
+    COMPLETION_CACHE_SIZE (0 отключает кэш), COMPLETION_CACHE_TTL
+    и COMPLETION_CACHE_DB - путь к файлу sqlite для постоянного уровня.
+
+    :return: Кэш или None, если кэширование отключено
+    """
+    max_entries = int(os.getenv("COMPLETION_CACHE_SIZE", "1000"))
+    if max_entries <= 0:
+        return None
+    return CompletionCache(
+        max_entries=max_entries,
+        ttl=float(os.getenv("COMPLETION_CACHE_TTL", "3600")),
+        db_path=os.getenv("COMPLETION_CACHE_DB") or None
+    )
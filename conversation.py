@@ -0,0 +1,159 @@
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Hashable, List, Optional
+
+# Грубая оценка: в среднем около трех символов русского текста на токен
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """Оценка числа токенов текста без обращения к токенизатору"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class _Message:
+    __slots__ = ("role", "text", "tokens")
+
+    def __init__(self, role: str, text: str):
+        self.role = role
+        self.text = text
+        self.tokens = estimate_tokens(text)
+
+
+class _Chat:
+    __slots__ = ("messages", "chars", "used_at")
+
+    def __init__(self, max_messages: int):
+        self.messages: Deque[_Message] = deque(maxlen=max_messages)
+        self.chars = 0
+        self.used_at = time.monotonic()
+
+
+class ConversationStore:
+    def __init__(self, max_chats: int = 10000, max_messages: int = 20, max_total_chars: int = 20_000_000,
+                 max_message_chars: int = 4000, token_budget: int = 1500, idle_ttl: float = 3600):
+        """
+        История диалогов по чатам
+
+        Память ограничена глобально: при превышении числа чатов или общего
+        объема текста вытесняются давно неактивные чаты (LRU).
+
+        :param max_chats: Максимум чатов в памяти
+        :param max_messages: Максимум сообщений в истории одного чата
+        :param max_total_chars: Общий объем текста всех историй, символов
+        :param max_message_chars: Сообщения длиннее обрезаются при сохранении
+        :param token_budget: Бюджет токенов истории в запросе к модели
+        :param idle_ttl: Через сколько секунд без активности история чата забывается
+        """
+        self.max_chats = max_chats
+        self.max_messages = max_messages
+        self.max_total_chars = max_total_chars
+        self.max_message_chars = max_message_chars
+        self.token_budget = token_budget
+        self.idle_ttl = idle_ttl
+
+        self._chats: "OrderedDict[Hashable, _Chat]" = OrderedDict()
+        self.total_chars = 0
+        self.evictions = 0
+
+    def _drop(self, chat_id: Hashable):
+        chat = self._chats.pop(chat_id)
+        self.total_chars -= chat.chars
+
+    def _evict(self):
+        while self._chats and (len(self._chats) > self.max_chats or self.total_chars > self.max_total_chars):
+            oldest = next(iter(self._chats))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _get(self, chat_id: Hashable) -> Optional[_Chat]:
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            return None
+        if time.monotonic() - chat.used_at > self.idle_ttl:
+            self._drop(chat_id)
+            return None
+        return chat
+
+    def append(self, chat_id: Hashable, role: str, text: str):
+        """
+        Добавление сообщения в историю чата
+
+        :param chat_id: ID чата
+        :param role: Роль: user или assistant
+        :param text: Текст сообщения
+        """
+        chat = self._get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat(self.max_messages)
+        if len(chat.messages) == chat.messages.maxlen:
+            removed = chat.messages[0]
+            chat.chars -= len(removed.text)
+            self.total_chars -= len(removed.text)
+        message = _Message(role, text[:self.max_message_chars])
+        chat.messages.append(message)
+        chat.chars += len(message.text)
+        self.total_chars += len(message.text)
+        chat.used_at = time.monotonic()
+        self._chats.move_to_end(chat_id)
+        self._evict()
+
+    def remember(self, chat_id: Hashable, prompt: str, answer: str):
+        """Сохранение пары вопрос - ответ"""
+        self.append(chat_id, "user", prompt)
+        self.append(chat_id, "assistant", answer)
+
+    def history(self, chat_id: Hashable, budget: int = None) -> List[Dict]:
+        """
+        Последние сообщения чата, укладывающиеся в бюджет токенов
+
+        :param chat_id: ID чата
+        :param budget: Бюджет токенов (по умолчанию token_budget)
+        :return: Сообщения в формате API в хронологическом порядке
+        """
+        chat = self._get(chat_id)
+        if chat is None:
+            return []
+        self._chats.move_to_end(chat_id)
+        budget = self.token_budget if budget is None else budget
+
+        selected = []
+        for message in reversed(chat.messages):
+            if message.tokens > budget:
+                break
+            budget -= message.tokens
+            selected.append({"role": message.role, "text": message.text})
+        # История начинается с вопроса пользователя, а не с середины пары
+        while selected and selected[-1]["role"] != "user":
+            selected.pop()
+        selected.reverse()
+        return selected
+
+    def clear(self, chat_id: Hashable):
+        """Забыть историю чата"""
+        if chat_id in self._chats:
+            self._drop(chat_id)
+
+    def stats(self) -> Dict:
+        """Число чатов, объем истории и число вытеснений"""
+        return {"chats": len(self._chats), "total_chars": self.total_chars, "evictions": self.evictions}
+
+
+def create_conversation_store() -> Optional[ConversationStore]:
+    """
+    Создание хранилища диалогов по настройкам из переменных окружения
+
+    CONVERSATION_TOKEN_BUDGET (0 отключает историю), CONVERSATION_MAX_CHATS,
+    CONVERSATION_MAX_MESSAGES, CONVERSATION_MAX_CHARS и CONVERSATION_IDLE_TTL.
+    """
+    token_budget = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "1500"))
+    if token_budget <= 0:
+        return None
+    return ConversationStore(
+        max_chats=int(os.getenv("CONVERSATION_MAX_CHATS", "10000")),
+        max_messages=int(os.getenv("CONVERSATION_MAX_MESSAGES", "20")),
+        max_total_chars=int(os.getenv("CONVERSATION_MAX_CHARS", "20000000")),
+        token_budget=token_budget,
+        idle_ttl=float(os.getenv("CONVERSATION_IDLE_TTL", "3600"))
+    )
@@ -0,0 +1,258 @@
+import asyncio
+import heapq
+import logging
+import os
+import time
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+from prometheus_client import Counter, Histogram
+
+from metrics import LATENCY_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+COST_REPORT_DURATION = Histogram("cost_report_folder_duration_seconds", "Время сбора и расчета стоимости каталога",
+                                 buckets=LATENCY_BUCKETS)
+COST_REPORT_INSTANCES = Counter("cost_report_instances_total", "Виртуальные машины, учтенные в отчетах о стоимости")
+COST_REPORT_ERRORS = Counter("cost_report_errors_total", "Каталоги, которые не удалось обойти")
+
+GB = 2 ** 30
+# Значение Instance.Status.RUNNING; ядра и память остановленных машин не тарифицируются
+STATUS_RUNNING = 2
+# Максимальный размер страницы List в Compute API
+MAX_PAGE_SIZE = 1000
+
+
+def _error_text(error: Exception) -> str:
+    """Короткий текст ошибки: для gRPC - код и описание, без отладочной строки"""
+    code = getattr(error, "code", None)
+    if callable(code):
+        return f"{code().name}: {error.details()}"
+    return str(error)
+
+
+class FolderCost:
+    __slots__ = ("folder_id", "instances", "running", "disks", "orphan_disks", "cost", "orphan_cost",
+                 "top", "elapsed", "error")
+
+    def __init__(self, folder_id: str, error: str = None):
+        """
+        Стоимость ресурсов одного каталога в месяц
+
+        :param folder_id: ID каталога
+        :param error: Текст ошибки, если каталог не удалось обойти
+        """
+        self.folder_id = folder_id
+        self.instances = 0
+        self.running = 0
+        self.disks = 0
+        self.orphan_disks = 0
+        self.cost = {"cpu": 0.0, "ram": 0.0, "disk": 0.0, "total": 0.0}
+        self.orphan_cost = 0.0
+        self.top = []  # (стоимость, имя, ID) самых дорогих машин
+        self.elapsed = 0.0
+        self.error = error
+
+
+class CostReporter:
+    def __init__(self, yc_client, pricing, concurrency: int = 8, page_size: int = MAX_PAGE_SIZE,
+                 hours: int = 730, top: int = 5):
+        """
+        Отчет о стоимости реальных ресурсов в каталогах
+
+        Каталоги обходятся пулом из concurrency задач; в каждом каталоге
+        виртуальные машины и диски читаются постранично и одновременно.
+        Ядра (с учетом доли ядра), память и размер подключенных дисков всех
+        машин каталога считаются одним вызовом calculate_vm_cost_batch;
+        неподключенные диски входят в тот же вызов. Результат по каталогу
+        отдается сразу, как только он готов.
+
+        :param yc_client: Клиент Yandex Cloud
+        :param pricing: Прайс (CloudPricing)
+        :param concurrency: Сколько каталогов обходится одновременно
+        :param page_size: Размер страницы List
+        :param hours: Часов работы в месяц для запущенных машин
+        :param top: Сколько самых дорогих машин показывать
+        """
+        self.yc_client = yc_client
+        self.pricing = pricing
+        self.concurrency = max(1, concurrency)
+        self.page_size = min(page_size, MAX_PAGE_SIZE)
+        self.hours = hours
+        self.top = top
+
+    async def _instances(self, folder_id: str) -> List[tuple]:
+        """Машины каталога: (ID, имя, запущена, vCPU с учетом доли ядра, ГБ RAM, ID дисков)"""
+        rows = []
+        async for page in self.yc_client.iter_compute_instances_async(folder_id, self.page_size):
+            for vm in page:
+                resources = vm.resources
+                disk_ids = [vm.boot_disk.disk_id] if vm.boot_disk.disk_id else []
+                disk_ids.extend(disk.disk_id for disk in vm.secondary_disks)
+                rows.append((
+                    vm.id, vm.name, vm.status == STATUS_RUNNING,
+                    resources.cores * (resources.core_fraction or 100) / 100,
+                    resources.memory / GB, disk_ids
+                ))
+        return rows
+
+    async def _disks(self, folder_id: str) -> Dict[str, tuple]:
+        """Диски каталога: ID -> (ГБ, подключен ли)"""
+        disks = {}
+        async for page in self.yc_client.iter_disks_async(folder_id, self.page_size):
+            for disk in page:
+                disks[disk.id] = (disk.size / GB, bool(disk.instance_ids))
+        return disks
+
+    async def folder_cost(self, folder_id: str) -> FolderCost:
+        """
+        Обход и расчет стоимости одного каталога
+
+        :param folder_id: ID каталога
+        :return: Стоимость; при ошибке API заполнено поле error
+        """
+        started = time.perf_counter()
+        try:
+            instances, disks = await asyncio.gather(self._instances(folder_id), self._disks(folder_id))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = _error_text(e)
+            logger.error(f"Не удалось обойти каталог {folder_id}: {error}")
+            COST_REPORT_ERRORS.inc()
+            return FolderCost(folder_id, error=error)
+
+        result = FolderCost(folder_id)
+        result.instances = len(instances)
+        result.disks = len(disks)
+        cpu, ram, disk, hours = [], [], [], []
+        for _, _, running, cores, memory, disk_ids in instances:
+            cpu.append(cores)
+            ram.append(memory)
+            disk.append(sum(disks.get(disk_id, (0.0, True))[0] for disk_id in disk_ids))
+            hours.append(self.hours if running else 0)
+            result.running += running
+        # Неподключенные диски тарифицируются как машины без ядер и памяти
+        for size, attached in disks.values():
+            if not attached:
+                cpu.append(0)
+                ram.append(0)
+                disk.append(size)
+                hours.append(0)
+                result.orphan_disks += 1
+
+        if cpu:
+            calculation = self.pricing.calculate_vm_cost_batch(cpu, ram, disk, hours)
+            for field in result.cost:
+                result.cost[field] = round(float(calculation[field].sum()), 2)
+            totals = calculation["total"]
+            result.orphan_cost = round(float(totals[len(instances):].sum()), 2)
+            result.top = heapq.nlargest(
+                self.top, ((float(totals[i]), row[1] or row[0], row[0]) for i, row in enumerate(instances))
+            )
+
+        result.elapsed = time.perf_counter() - started
+        COST_REPORT_DURATION.observe(result.elapsed)
+        COST_REPORT_INSTANCES.inc(result.instances)
+        logger.info(f"Каталог {folder_id}: {result.instances} ВМ, {result.disks} дисков, "
+                    f"{result.cost['total']} ₽/мес за {result.elapsed:.2f} с")
+        return result
+
+    async def stream(self, folder_ids: Iterable[str]) -> AsyncIterator[FolderCost]:
+        """
+        Расчет стоимости каталогов по мере готовности
+
+        :param folder_ids: ID каталогов
+        :return: Асинхронный генератор результатов в порядке завершения
+        """
+        folder_ids = list(dict.fromkeys(folder_ids))
+        queue = asyncio.Queue()
+        for folder_id in folder_ids:
+            queue.put_nowait(folder_id)
+        results = asyncio.Queue()
+
+        async def worker():
+            while not queue.empty():
+                results.put_nowait(await self.folder_cost(queue.get_nowait()))
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(self.concurrency, len(folder_ids)))]
+        try:
+            for _ in folder_ids:
+                yield await results.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+
+def format_cost_report(results: List[FolderCost], folders: int, top: int = 5) -> str:
+    """
+    Сводный отчет по уже посчитанным каталогам
+
+    :param results: Результаты по каталогам
+    :param folders: Сколько каталогов запрошено всего
+    :param top: Сколько самых дорогих машин показать
+    :return: Текст отчета
+    """
+    done = [r for r in results if r.error is None]
+    cost = {field: round(sum(r.cost[field] for r in done), 2) for field in ("cpu", "ram", "disk", "total")}
+    title = "💰 Стоимость ресурсов" if len(results) >= folders else f"⏳ Посчитано каталогов: {len(results)} из {folders}"
+    lines = [
+        title,
+        "",
+        f"Итого: {cost['total']:.2f} ₽/мес",
+        f"• CPU: {cost['cpu']:.2f} ₽",
+        f"• RAM: {cost['ram']:.2f} ₽",
+        f"• Диски: {cost['disk']:.2f} ₽",
+        "",
+        f"🖥 ВМ: {sum(r.instances for r in done)} (запущено {sum(r.running for r in done)}), "
+        f"дисков: {sum(r.disks for r in done)}",
+    ]
+    orphans = sum(r.orphan_disks for r in done)
+    if orphans:
+        lines.append(f"⚠️ Неподключенных дисков: {orphans} на {sum(r.orphan_cost for r in done):.2f} ₽/мес")
+
+    if folders > 1:
+        lines += ["", "📁 По каталогам:"]
+        for r in sorted(results, key=lambda r: -r.cost["total"]):
+            if r.error is not None:
+                lines.append(f"• {r.folder_id}: ошибка - {r.error[:100]}")
+            else:
+                lines.append(f"• {r.folder_id}: {r.cost['total']:.2f} ₽/мес, ВМ: {r.instances}")
+
+    expensive = heapq.nlargest(top, (item for r in done for item in r.top))
+    if expensive:
+        lines += ["", "🔝 Самые дорогие ВМ:"]
+        lines += [f"{i + 1}. {name} ({vm_id}): {total:.2f} ₽/мес" for i, (total, name, vm_id) in enumerate(expensive)]
+    errors = [r for r in results if r.error is not None]
+    if folders == 1 and errors:
+        lines += ["", f"❌ Каталог {errors[0].folder_id} не удалось обойти: {errors[0].error[:200]}"]
+    return "\n".join(lines)
+
+
+def create_cost_reporter(yc_client, pricing) -> CostReporter:
+    """
+    Создание отчета о стоимости по настройкам из переменных окружения
+
+    COST_REPORT_CONCURRENCY, COST_REPORT_PAGE_SIZE и COST_REPORT_TOP.
+    """
+    return CostReporter(
+        yc_client, pricing,
+        concurrency=int(os.getenv("COST_REPORT_CONCURRENCY", "8")),
+        page_size=int(os.getenv("COST_REPORT_PAGE_SIZE", str(MAX_PAGE_SIZE))),
+        top=int(os.getenv("COST_REPORT_TOP", "5"))
+    )
+
+
+def report_folders(args: List[str], default: Optional[str]) -> List[str]:
+    """
+    Каталоги для отчета: из аргументов команды, иначе из COST_REPORT_FOLDERS, иначе каталог бота
+
+    :param args: Аргументы команды (ID через пробел или запятую)
+    :param default: Каталог по умолчанию
+    """
+    raw = " ".join(args) if args else os.getenv("COST_REPORT_FOLDERS", "")
+    folders = list(dict.fromkeys(raw.replace(",", " ").split()))
+    if not folders and default:
+        folders = [default]
+    return folders
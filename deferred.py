@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Текст, который получает пользователь, если отложенный запрос не удался
+FAILURE_TEXT = "Извините, не удалось подготовить ответ. Попробуйте позже."
+
+
+class _Pending:
+    __slots__ = ("operation_id", "on_done", "chat_id", "submitted_at")
+
+    def __init__(self, operation_id: str, on_done: Callable[[str], Awaitable], chat_id):
+        self.operation_id = operation_id
+        self.on_done = on_done
+        self.chat_id = chat_id
+        self.submitted_at = time.monotonic()
+
+
+class DeferredCompletions:
+    def __init__(self, assistant, poll_interval: float = 2.0, timeout: float = 600, max_parallel_checks: int = 16):
+        """
+        Отложенные запросы к модели через асинхронный completion API
+
+        Запрос отправляется в completionAsync, обработчик сразу освобождается,
+        а один общий опросчик периодически проверяет все незавершенные
+        операции и передает готовые ответы в колбэки.
+
+        :param assistant: Ассистент (CloudAssistant)
+        :param poll_interval: Период проверки операций, сек
+        :param timeout: Через сколько секунд операция считается неудавшейся
+        :param max_parallel_checks: Сколько операций проверять одновременно за один проход
+        """
+        self.assistant = assistant
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.max_parallel_checks = max_parallel_checks
+
+        self._pending: Dict[str, _Pending] = {}
+        self._poller: asyncio.Task = None
+        self._deliveries = set()
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+
+    @property
+    def pending(self) -> int:
+        """Число незавершенных операций"""
+        return len(self._pending)
+
+    async def submit(self, prompt: str, system_prompt: str, on_done: Callable[[str], Awaitable],
+                     chat_id=None) -> str:
+        """
+        Отправка отложенного запроса
+
+        :param prompt: Текст запроса
+        :param system_prompt: Системный промпт
+        :param on_done: Корутина, которая получит текст ответа (или сообщение об ошибке)
+        :param chat_id: ID чата, для журнала и статистики
+        :return: ID операции
+        """
+        operation_id = await self.assistant.submit_completion(prompt, system_prompt)
+        self._pending[operation_id] = _Pending(operation_id, on_done, chat_id)
+        self.submitted += 1
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.ensure_future(self._poll_loop())
+        logger.info(f"Отложенный запрос {operation_id} для чата {chat_id} принят")
+        return operation_id
+
+    async def _check(self, pending: _Pending, semaphore: asyncio.Semaphore) -> Optional[str]:
+        """Проверка операции; возвращает текст ответа, если операция завершилась"""
+        async with semaphore:
+            operation = await self.assistant.get_operation(pending.operation_id)
+        if not operation.get("done"):
+            return None
+        if "error" in operation:
+            raise RuntimeError(operation["error"].get("message", "operation failed"))
+        return operation["response"]["alternatives"][0]["message"]["text"]
+
+    def _finish(self, pending: _Pending, text: str):
+        self._pending.pop(pending.operation_id, None)
+        self.total_wait += time.monotonic() - pending.submitted_at
+        # Доставка идет отдельной задачей, чтобы медленная отправка не задерживала опрос
+        task = asyncio.ensure_future(pending.on_done(text))
+        self._deliveries.add(task)
+        task.add_done_callback(self._delivered)
+
+    def _delivered(self, task: asyncio.Task):
+        self._deliveries.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Ошибка доставки отложенного ответа: {task.exception()}")
+
+    async def _poll_loop(self):
+        semaphore = asyncio.Semaphore(self.max_parallel_checks)
+        while self._pending:
+            await asyncio.sleep(self.poll_interval)
+            batch = list(self._pending.values())
+            results = await asyncio.gather(*(self._check(p, semaphore) for p in batch), return_exceptions=True)
+            now = time.monotonic()
+            for pending, result in zip(batch, results):
+                if isinstance(result, str):
+                    self.completed += 1
+                    self._finish(pending, result)
+                elif isinstance(result, RuntimeError):
+                    logger.error(f"Отложенный запрос {pending.operation_id} завершился ошибкой: {result}")
+                    self.failed += 1
+                    self._finish(pending, FAILURE_TEXT)
+                elif now - pending.submitted_at > self.timeout:
+                    logger.error(f"Отложенный запрос {pending.operation_id} не завершился за {self.timeout:.0f} с")
+                    self.failed += 1
+                    self._finish(pending, FAILURE_TEXT)
+                elif isinstance(result, Exception):
+                    # Ошибка опроса (сеть, 429) - проверим операцию на следующем проходе
+                    logger.warning(f"Не удалось проверить операцию {pending.operation_id}: {result}")
+
+    async def drain(self, timeout: float):
+        """
+        Ожидание завершения принятых операций и доставки их ответов перед остановкой
+
+        :param timeout: Максимальное время ожидания, сек
+        """
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            await asyncio.sleep(min(self.poll_interval, 0.5))
+        # Операции завершены, но ответы могут еще отправляться
+        remaining = deadline - time.monotonic()
+        if self._deliveries and remaining > 0:
+            await asyncio.wait(list(self._deliveries), timeout=remaining)
+
+    async def stop(self):
+        """Останавливает опрос; незавершенные операции теряются"""
+        if self._pending:
+            logger.warning(f"Остановка с незавершенными отложенными запросами: {len(self._pending)}")
+        if self._poller is not None:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+            self._poller = None
+        # Уже готовые ответы досылаем
+        await asyncio.gather(*self._deliveries, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        """Счетчики отложенных запросов"""
+        finished = self.completed + self.failed
+        return {
+            "pending": self.pending,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait": round(self.total_wait / finished, 2) if finished else 0.0
+        }
+
+
+def create_deferred_completions(assistant) -> DeferredCompletions:
+    """
+    Создание отложенных запросов по настройкам из переменных окружения
+
+    DEFERRED_POLL_INTERVAL и DEFERRED_TIMEOUT.
+    """
+    return DeferredCompletions(
+        assistant,
+        poll_interval=float(os.getenv("DEFERRED_POLL_INTERVAL", "2.0")),
+        timeout=float(os.getenv("DEFERRED_TIMEOUT", "600"))
+    )
@@ -0,0 +1,281 @@
+import array
+import glob
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DOCS_DIR = os.path.join(BASE_DIR, "docs")
+DOCS_INDEX_PATH = os.path.join(BASE_DIR, "data", "docs_index.bin")
+
+# Формат файла: MAGIC, длина заголовка (uint32), JSON заголовок, выравнивание до 4 байт,
+# массив постингов uint32 (пары doc_id, tf) и тексты фрагментов в UTF-8
+MAGIC = b"BM25IDX1"
+
+# Параметры BM25
+K1 = 1.2
+B = 0.75
+
+# Максимальный размер фрагмента документации, символов
+MAX_PASSAGE_CHARS = 700
+MIN_PASSAGE_CHARS = 40
+
+# Слова длиннее этого порога обрезаются: грубая замена стемминга для русских окончаний
+STEM_LENGTH = 6
+
+_STOP_WORDS = {
+    "и", "в", "во", "на", "с", "со", "по", "для", "к", "о", "об", "от", "до", "из", "за", "не", "что",
+    "как", "это", "или", "а", "но", "у", "же", "ли", "бы", "то", "так", "все", "вы", "мы", "я",
+    "the", "a", "an", "and", "or", "of", "to", "in", "on", "for", "is", "are", "be", "with", "as",
+    "it", "this", "that", "by", "from", "at", "you", "your", "can",
+}
+
+_FRONTMATTER_RE = re.compile(r"\A---\n(.*?)\n---\n", re.S)
+_TITLE_RE = re.compile(r"^title:\s*['\"]?(.*?)['\"]?\s*$", re.M)
+_TAG_RE = re.compile(r"</?[A-Z][^>]*>")
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Разбиение текста на термы индекса
+
+    :param text: Текст
+    :return: Нормализованные термы без стоп-слов
+    """
+    words = re.findall(r"[a-zа-я0-9]+", text.lower().replace("ё", "е"))
+    return [w[:STEM_LENGTH] for w in words if w not in _STOP_WORDS and len(w) > 1]
+
+
+def chunk_mdx(text: str, source: str) -> List[Dict]:
+    """
+    Разбиение страницы .mdx на фрагменты по заголовкам и абзацам
+
+    :param text: Содержимое страницы
+    :param source: Путь страницы относительно каталога документации
+    :return: Фрагменты: source, title, text
+    """
+    page_title = source
+    frontmatter = _FRONTMATTER_RE.match(text)
+    if frontmatter:
+        title = _TITLE_RE.search(frontmatter.group(1))
+        if title:
+            page_title = title.group(1)
+        text = text[frontmatter.end():]
+    text = _TAG_RE.sub("", text)
+
+    passages = []
+    section = page_title
+    buffer = []
+
+    def flush():
+        body = "\n".join(buffer).strip()
+        buffer.clear()
+        if len(body) >= MIN_PASSAGE_CHARS:
+            passages.append({"source": source, "title": section, "text": body})
+
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        heading = _HEADING_RE.match(paragraph)
+        if heading:
+            flush()
+            section = f"{page_title} / {heading.group(2).strip()}" if heading.group(1) != "#" else page_title
+            paragraph = paragraph[heading.end():].strip()
+            if not paragraph:
+                continue
+        if buffer and sum(len(p) for p in buffer) + len(paragraph) > MAX_PASSAGE_CHARS:
+            flush()
+        buffer.append(paragraph[:MAX_PASSAGE_CHARS])
+    flush()
+    return passages
+
+
+def build_index(docs_dir: str = DOCS_DIR, path: str = DOCS_INDEX_PATH) -> Dict:
+    """
+    Построение индекса BM25 по страницам docs/**/*.mdx и запись в файл
+
+    :param docs_dir: Каталог документации
+    :param path: Путь к файлу индекса
+    :return: Статистика: число фрагментов и термов, размер файла, время построения
+    """
+    started = time.perf_counter()
+    passages = []
+    for filename in sorted(glob.glob(os.path.join(docs_dir, "**", "*.mdx"), recursive=True)):
+        with open(filename, "r", encoding="utf-8") as f:
+            passages += chunk_mdx(f.read(), os.path.relpath(filename, docs_dir))
+
+    postings: Dict[str, List] = {}
+    doc_lens = []
+    for doc_id, passage in enumerate(passages):
+        terms = Counter(tokenize(passage["title"] + "\n" + passage["text"]))
+        doc_lens.append(sum(terms.values()))
+        for term, tf in terms.items():
+            postings.setdefault(term, []).append((doc_id, tf))
+
+    flat = array.array("I")
+    terms = {}
+    for term in sorted(postings):
+        terms[term] = [len(flat) // 2, len(postings[term])]
+        for doc_id, tf in postings[term]:
+            flat.extend((doc_id, tf))
+
+    texts = bytearray()
+    meta = []
+    for passage in passages:
+        encoded = passage["text"].encode("utf-8")
+        meta.append([passage["source"], passage["title"], len(texts), len(encoded)])
+        texts += encoded
+
+    header = json.dumps({
+        "byteorder": sys.byteorder,
+        "avgdl": sum(doc_lens) / len(doc_lens) if doc_lens else 0.0,
+        "doc_lens": doc_lens,
+        "passages": meta,
+        "terms": terms,
+    }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    header += b" " * (-(len(MAGIC) + 4 + len(header)) % 4)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        f.write(flat.tobytes())
+        f.write(texts)
+    os.replace(tmp_path, path)
+
+    return {
+        "passages": len(passages),
+        "terms": len(terms),
+        "size": os.path.getsize(path),
+        "build_time": time.perf_counter() - started,
+    }
+
+
+class DocsIndex:
+    def __init__(self, path: str = DOCS_INDEX_PATH, top_k: int = 3, min_score: float = 3.0):
+        """
+        Индекс BM25 по документации, отображенный в память
+
+        В память загружается только словарь; постинги и тексты фрагментов
+        читаются из отображенного файла при поиске.
+
+        :param path: Путь к файлу индекса, построенного build_index
+        :param top_k: Сколько фрагментов подставлять в промпт
+        :param min_score: Минимальная оценка фрагмента для подстановки в промпт
+        :raises ValueError: Если файл не является индексом или собран на другой платформе
+        """
+        self.path = path
+        self.top_k = top_k
+        self.min_score = min_score
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path} не является индексом документации")
+        header_len, = struct.unpack_from("<I", self._mm, len(MAGIC))
+        header_end = len(MAGIC) + 4 + header_len
+        header = json.loads(self._mm[len(MAGIC) + 4:header_end].decode("utf-8"))
+        if header["byteorder"] != sys.byteorder:
+            self._mm.close()
+            raise ValueError(f"Индекс {path} собран с другим порядком байт, перестройте его")
+
+        self.avgdl = header["avgdl"] or 1.0
+        self.doc_lens = header["doc_lens"]
+        self.passages = header["passages"]
+        self.terms = header["terms"]
+        postings_size = 4 * 2 * sum(n for _, n in self.terms.values())
+        self._postings = memoryview(self._mm)[header_end:header_end + postings_size].cast("I")
+        self._texts_offset = header_end + postings_size
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def _text(self, doc_id: int) -> str:
+        _, _, offset, length = self.passages[doc_id]
+        start = self._texts_offset + offset
+        return self._mm[start:start + length].decode("utf-8")
+
+    def search(self, query: str, k: int = 3, min_score: float = 0.0) -> List[Dict]:
+        """
+        Поиск фрагментов документации
+
+        :param query: Текст запроса
+        :param k: Сколько фрагментов вернуть
+        :param min_score: Фрагменты с меньшей оценкой отбрасываются
+        :return: Фрагменты: source, title, text, score - по убыванию оценки
+        """
+        n = len(self.passages)
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            entry = self.terms.get(term)
+            if entry is None:
+                continue
+            offset, df = entry
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for i in range(2 * offset, 2 * (offset + df), 2):
+                doc_id, tf = self._postings[i], self._postings[i + 1]
+                norm = K1 * (1 - B + B * self.doc_lens[doc_id] / self.avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [
+            {"source": self.passages[doc_id][0], "title": self.passages[doc_id][1],
+             "text": self._text(doc_id), "score": score}
+            for doc_id, score in best if score >= min_score
+        ]
+
+    def context_for(self, query: str) -> str:
+        """
+        Блок с релевантными фрагментами документации для системного промпта
+
+        :param query: Вопрос пользователя
+        :return: Текст блока или пустая строка, если ничего не найдено
+        """
+        passages = self.search(query, k=self.top_k, min_score=self.min_score)
+        return "\n\n".join(f"[{p['title']}]\n{p['text']}" for p in passages)
+
+    def close(self):
+        """Освобождает отображение файла"""
+        self._postings.release()
+        self._mm.close()
+
+
+def create_docs_index() -> Optional[DocsIndex]:
+    """
+    Загрузка индекса документации по настройкам из переменных окружения
+
+    DOCS_INDEX_PATH, DOCS_DIR, DOCS_TOP_K и DOCS_MIN_SCORE. Если файла индекса нет, он строится из документации;
+    если нет и документации, поиск по ней отключается.
+    """
+    path = os.getenv("DOCS_INDEX_PATH", DOCS_INDEX_PATH)
+    docs_dir = os.getenv("DOCS_DIR", DOCS_DIR)
+    try:
+        if not os.path.exists(path):
+            if not os.path.isdir(docs_dir):
+                logger.warning(f"Нет индекса {path} и каталога документации {docs_dir}, поиск по документации отключен")
+                return None
+            stats = build_index(docs_dir, path)
+            logger.info(f"Индекс документации построен: {stats}")
+        index = DocsIndex(
+            path,
+            top_k=int(os.getenv("DOCS_TOP_K", "3")),
+            min_score=float(os.getenv("DOCS_MIN_SCORE", "3.0"))
+        )
+    except (OSError, ValueError) as e:
+        logger.error(f"Не удалось загрузить индекс документации: {e}")
+        return None
+    logger.info(f"Индекс документации загружен: {len(index)} фрагментов")
+    return index
@@ -0,0 +1,52 @@
+import logging
+import os
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _http2_available() -> bool:
+    """Проверяет, установлен ли пакет h2 (нужен httpx для HTTP/2)"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Создание общего HTTP клиента с пулом соединений и keep-alive
+
+    Параметры пула и таймаутов читаются из переменных окружения:
+    HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_KEEPALIVE_EXPIRY,
+    HTTP_CONNECT_TIMEOUT, HTTP_TIMEOUT и HTTP2_ENABLED.
+
+    :return: Асинхронный HTTP клиент
+    """
+    limits = httpx.Limits(
+        max_connections=_env_int("HTTP_MAX_CONNECTIONS", 100),
+        max_keepalive_connections=_env_int("HTTP_MAX_KEEPALIVE", 20),
+        keepalive_expiry=_env_float("HTTP_KEEPALIVE_EXPIRY", 60.0)
+    )
+    timeout = httpx.Timeout(
+        _env_float("HTTP_TIMEOUT", 60.0),
+        connect=_env_float("HTTP_CONNECT_TIMEOUT", 5.0)
+    )
+
+    http2 = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+    if http2 and not _http2_available():
+        logger.warning("HTTP/2 запрошен, но пакет h2 не установлен - используем HTTP/1.1")
+        http2 = False
+
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
@@ -0,0 +1,223 @@
+import asyncio
+import contextvars
+import functools
+import gzip
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Файл журнала по умолчанию; отдельный каталог, чтобы журнал не смешивался с файлами проекта
+JOURNAL_PATH = os.path.join("logs", "requests_journal.jsonl")
+
+# Запись журнала для обновления, которое обрабатывается в текущей задаче
+_current_record: contextvars.ContextVar[Optional[Dict]] = contextvars.ContextVar("journal_record", default=None)
+
+
+def note_upstream(seconds: float):
+    """
+    Учет запроса к апстриму в записи текущего обновления
+
+    :param seconds: Время запроса
+    """
+    record = _current_record.get()
+    if record is not None and "duration_ms" not in record:
+        record["upstream_calls"] += 1
+        record["upstream_ms"] = round(record["upstream_ms"] + seconds * 1000, 1)
+
+
+def note_model(model: str):
+    """
+    Учет модели, выбранной для запроса текущего обновления
+
+    :param model: Имя модели
+    """
+    record = _current_record.get()
+    if record is not None and "duration_ms" not in record:
+        record["model"] = model
+
+
+def note_response(message_id: int, chars: int):
+    """
+    Учет отправленного или отредактированного сообщения в записи текущего обновления
+
+    :param message_id: ID сообщения; при редактировании учитывается последний текст
+    :param chars: Длина текста
+    """
+    record = _current_record.get()
+    # Запись уже закрыта, если сообщение отправила фоновая задача после обработчика
+    if record is not None and "_messages" in record:
+        record["_messages"][message_id] = chars
+
+
+class RequestJournal:
+    def __init__(self, path: str = JOURNAL_PATH, max_bytes: int = 50 * 1024 * 1024, backup_count: int = 5,
+                 compress: bool = False, flush_interval: float = 1.0, max_buffer: int = 10000):
+        """
+        Журнал запросов и ответов в формате JSON Lines
+
+        Записи копятся в памяти и пишутся пачками из фоновой задачи;
+        запись в файл, ротация и сжатие выполняются в отдельном потоке.
+
+        :param path: Файл журнала
+        :param max_bytes: Размер файла, после которого он ротируется
+        :param backup_count: Сколько ротированных файлов хранить
+        :param compress: Сжимать ротированные файлы gzip
+        :param flush_interval: Период сброса буфера, сек
+        :param max_buffer: Максимум записей в буфере; лишние отбрасываются
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+
+        self._buffer: List[Dict] = []
+        self._wakeup: asyncio.Event = None
+        self._task: asyncio.Task = None
+        # Один поток сохраняет порядок пачек
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+
+        self.written = 0
+        self.dropped = 0
+
+    def write(self, record: Dict):
+        """
+        Добавление записи в буфер; не блокирует
+
+        :param record: Запись журнала
+        """
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+        self._buffer.append(record)
+        if self._wakeup is not None and len(self._buffer) >= self.max_buffer // 2:
+            self._wakeup.set()
+
+    def _backup_name(self, index: int) -> str:
+        return f"{self.path}.{index}" + (".gz" if self.compress else "")
+
+    def _rotate(self):
+        for index in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(self._backup_name(index)):
+                os.replace(self._backup_name(index), self._backup_name(index + 1))
+        if self.compress:
+            with open(self.path, "rb") as src, gzip.open(self._backup_name(1), "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.path)
+        else:
+            os.replace(self.path, self._backup_name(1))
+
+    def _write_batch(self, records: List[Dict]):
+        data = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in records)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(data)
+            size = f.tell()
+        if self.backup_count > 0 and size >= self.max_bytes:
+            self._rotate()
+
+    async def flush(self):
+        """Запись накопленных записей в файл"""
+        if not self._buffer:
+            return
+        records, self._buffer = self._buffer, []
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._write_batch, records)
+            self.written += len(records)
+        except OSError as e:
+            self.dropped += len(records)
+            logger.error(f"Не удалось записать журнал запросов: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        """Запускает фоновый сброс буфера"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.ensure_future(self._flush_loop())
+
+    async def stop(self):
+        """Останавливает фоновый сброс и дописывает остаток буфера"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        self._executor.shutdown(wait=True)
+
+    def wrap(self, route: str, handler: Callable) -> Callable:
+        """
+        Обертка обработчика Telegram, которая пишет в журнал запрос, маршрут,
+        время обработки и апстрима и размер ответа
+
+        :param route: Маршрут (имя команды или handle_message)
+        :param handler: Асинхронный обработчик (update, context)
+        :return: Обернутый обработчик
+        """
+        @functools.wraps(handler)
+        async def wrapper(update, context):
+            message = update.effective_message
+            record = {
+                "request_id": str(update.update_id),
+                "ts": round(time.time(), 3),
+                "chat_id": update.effective_chat.id if update.effective_chat else None,
+                "route": route,
+                "body": message.text if message is not None else None,
+                "upstream_calls": 0,
+                "upstream_ms": 0.0,
+                "_messages": {},
+            }
+            token = _current_record.set(record)
+            started = time.perf_counter()
+            try:
+                return await handler(update, context)
+            except Exception as e:
+                record["error"] = type(e).__name__
+                raise
+            finally:
+                _current_record.reset(token)
+                record["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                messages = record.pop("_messages")
+                record["responses"] = len(messages)
+                record["response_chars"] = sum(messages.values())
+                self.write(record)
+
+        return wrapper
+
+    def stats(self) -> Dict:
+        """Счетчики записанных и отброшенных записей"""
+        return {"written": self.written, "dropped": self.dropped, "buffered": len(self._buffer)}
+
+
+def create_request_journal() -> Optional[RequestJournal]:
+    """
+    Создание журнала по настройкам из переменных окружения
+
+    JOURNAL_PATH (пустое значение отключает журнал), JOURNAL_MAX_BYTES,
+    JOURNAL_BACKUP_COUNT, JOURNAL_COMPRESS и JOURNAL_FLUSH_INTERVAL.
+    """
+    path = os.getenv("JOURNAL_PATH", JOURNAL_PATH)
+    if not path:
+        return None
+    return RequestJournal(
+        path,
+        max_bytes=int(os.getenv("JOURNAL_MAX_BYTES", str(50 * 1024 * 1024))),
+        backup_count=int(os.getenv("JOURNAL_BACKUP_COUNT", "5")),
+        compress=os.getenv("JOURNAL_COMPRESS", "false").lower() in ("1", "true", "yes"),
+        flush_interval=float(os.getenv("JOURNAL_FLUSH_INTERVAL", "1.0"))
+    )
@@ -0,0 +1,301 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Приоритеты очереди: меньше - раньше
+PRIORITY_HIGH = 0  # короткие интерактивные запросы
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2  # длинные запросы вроде /diagnose и /optimize
+
+# Запросы короче этого порога считаются короткими и идут вне очереди
+SHORT_PROMPT_CHARS = 200
+
+
+def priority_for_prompt(prompt: str) -> int:
+    """Приоритет запроса по его длине"""
+    return PRIORITY_HIGH if len(prompt) < SHORT_PROMPT_CHARS else PRIORITY_NORMAL
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Разбор заголовка Retry-After
+
+    :param value: Значение заголовка - число секунд или HTTP-дата
+    :return: Задержка в секундах или None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class UpstreamThrottled(Exception):
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        """
+        Апстрим ответил 429/503 - запрос можно повторить позже
+
+        :param status_code: HTTP статус ответа
+        :param retry_after: Задержка из заголовка Retry-After, сек
+        """
+        super().__init__(f"Upstream throttled with status {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Ведро токенов
+
+        :param rate: Скорость пополнения, токенов в секунду
+        :param capacity: Емкость ведра (допустимый всплеск)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> float:
+        """
+        Попытка взять токен
+
+        :return: 0, если токен взят, иначе сколько секунд ждать до появления токена
+        """
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        """Ожидание и получение токена"""
+        while True:
+            delay = self.try_acquire()
+            if delay == 0:
+                return
+            await asyncio.sleep(delay)
+
+    @property
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency: int = 8, chat_rate: float = 0.5, chat_burst: float = 3,
+                 max_retries: int = 4, base_delay: float = 0.5, max_delay: float = 30.0):
+        """
+        Планировщик запросов к модели
+
+        Ограничивает число одновременных запросов, выравнивает нагрузку
+        между чатами и повторяет запросы при 429/503 с экспоненциальной
+        задержкой.
+
+        :param max_concurrency: Максимум одновременных запросов к апстриму
+        :param chat_rate: Скорость запросов одного чата, в секунду
+        :param chat_burst: Допустимый всплеск запросов одного чата
+        :param max_retries: Максимум повторов при 429/503
+        :param base_delay: Базовая задержка повтора, сек
+        :param max_delay: Максимальная задержка повтора, сек
+        """
+        self.max_concurrency = max_concurrency
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._active = 0
+        self._waiters = []  # куча (priority, seq, future)
+        self._seq = itertools.count()
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+
+        self.completed = 0
+        self.throttled = 0
+        self.retries = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        """Количество запросов, ожидающих свободного слота"""
+        return len(self._waiters)
+
+    def _bucket(self, chat_id: Hashable) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if len(self._buckets) >= 10000:
+                # Выбрасываем ведра простаивающих чатов - они все равно полные
+                self._buckets = {k: b for k, b in self._buckets.items() if not b.is_full}
+            bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _acquire(self, priority: int):
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), future)
+        heapq.heappush(self._waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот был выдан одновременно с отменой - передаем его дальше
+                self._release()
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def try_acquire(self) -> bool:
+        """
+        Дополнительный слот без ожидания, например для дублирующего запроса
+
+        Выдается, только если есть свободный слот и очередь пуста: дополнительный
+        запрос не превышает max_concurrency и не обгоняет ожидающих.
+
+        :return: True, если слот выдан; его нужно вернуть вызовом release
+        """
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            return True
+        return False
+
+    def release(self):
+        """Возврат слота, полученного try_acquire"""
+        self._release()
+
+    def _release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            # Отмененный ожидающий мог еще не успеть убрать себя из кучи
+            if not future.done():
+                # Слот переходит следующему ожидающему, счетчик не меняется
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, chat_id: Hashable = None, priority: int = PRIORITY_NORMAL):
+        """
+        Получение слота на запрос к апстриму
+
+        :param chat_id: ID чата для ограничения частоты запросов
+        :param priority: Приоритет запроса
+        """
+        started = time.monotonic()
+        if chat_id is not None:
+            await self._bucket(chat_id).acquire()
+        await self._acquire(priority)
+
+        waited = time.monotonic() - started
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        if waited > 1:
+            logger.info(f"Запрос ждал в очереди {waited:.2f} с (в очереди: {self.queue_depth})")
+
+        try:
+            yield
+        finally:
+            self.completed += 1
+            self._release()
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Задержка перед повтором: экспонента с полным джиттером, но не меньше Retry-After
+
+        :param attempt: Номер попытки, начиная с 0
+        :param retry_after: Задержка, запрошенная апстримом
+        :return: Задержка в секундах
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    async def run(self, fn: Callable[[], Awaitable[T]], chat_id: Hashable = None,
+                  priority: int = PRIORITY_NORMAL) -> T:
+        """
+        Выполнение запроса через планировщик с повторами при 429/503
+
+        :param fn: Фабрика корутины, выполняющей запрос
+        :param chat_id: ID чата
+        :param priority: Приоритет запроса
+        :return: Результат запроса
+        """
+        async with self.slot(chat_id, priority):
+            for attempt in itertools.count():
+                try:
+                    return await fn()
+                except UpstreamThrottled as e:
+                    await self.backoff(attempt, e)
+
+    async def backoff(self, attempt: int, error: UpstreamThrottled):
+        """
+        Учет ответа 429/503 и ожидание перед повтором; общий для обычных и потоковых запросов
+
+        Вызывается из обработчика UpstreamThrottled внутри слота.
+
+        :param attempt: Номер неудачной попытки, начиная с 0
+        :param error: Ошибка апстрима
+        :raises UpstreamThrottled: Если повторы исчерпаны
+        """
+        self.throttled += 1
+        if attempt >= self.max_retries:
+            raise error
+        delay = self.backoff_delay(attempt, error.retry_after)
+        logger.warning(f"Апстрим ответил {error.status_code}, повтор через {delay:.2f} с")
+        self.retries += 1
+        await asyncio.sleep(delay)
+
+    def stats(self) -> Dict:
+        """Состояние очереди и время ожидания"""
+        return {
+            "active": self._active,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "avg_wait": round(self.total_wait / self.completed, 3) if self.completed else 0.0,
+            "max_wait": round(self.max_wait, 3)
+        }
+
+
+def create_llm_scheduler() -> LLMScheduler:
+    """
+    Создание планировщика по настройкам из переменных окружения
+
+    LLM_MAX_CONCURRENCY, LLM_CHAT_RATE, LLM_CHAT_BURST и LLM_MAX_RETRIES.
+    """
+    return LLMScheduler(
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+        chat_rate=float(os.getenv("LLM_CHAT_RATE", "0.5")),
+        chat_burst=float(os.getenv("LLM_CHAT_BURST", "3")),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "4"))
+    )
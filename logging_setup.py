@@ -0,0 +1,245 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+from prometheus_client import Counter
+
+# Формат строк лога
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Уровни по умолчанию для отдельных логгеров; переопределяются через LOG_LEVELS
+DEFAULT_LEVELS = {
+    "httpcore": "WARNING",
+    "httpx": "INFO",
+    "telegram": "INFO",
+    "apscheduler": "WARNING",
+}
+
+# Болтливые логгеры, сообщения которых прореживаются
+SAMPLED_LOGGERS = ("httpx", "httpcore")
+
+LOG_DROPPED = Counter("log_records_dropped_total", "Записи лога, отброшенные из-за переполнения очереди")
+
+_SECRET_PATTERNS = [
+    # Токен бота в URL Bot API
+    (re.compile(r"bot\d+:[A-Za-z0-9_-]{20,}"), "bot<скрыто>"),
+    # Ключи и токены в заголовках авторизации
+    (re.compile(r"(Api-Key|Bearer)\s+[A-Za-z0-9_.-]+"), r"\1 <скрыто>"),
+    (re.compile(r"(X-Telegram-Bot-Api-Secret-Token['\"]?[:=]\s*['\"]?)[A-Za-z0-9_-]+"), r"\1<скрыто>"),
+]
+
+
+class RedactingFilter(logging.Filter):
+    def __init__(self, secrets=()):
+        """
+        Фильтр, скрывающий токены и ключи в сообщениях лога
+
+        :param secrets: Дополнительные строки, которые нужно скрывать (значения из окружения)
+        """
+        super().__init__()
+        self.secrets = []
+        for secret in secrets:
+            self.add(secret)
+
+    def add(self, secret: Optional[str]):
+        """
+        Добавление строки, которую нужно скрывать; короткие строки не скрываются,
+        чтобы не портить обычный текст
+
+        :param secret: Секрет, например сгенерированный при запуске
+        """
+        if secret and len(secret) >= 8 and secret not in self.secrets:
+            self.secrets.append(secret)
+
+    def redact(self, text: str) -> str:
+        for secret in self.secrets:
+            text = text.replace(secret, "<скрыто>")
+        for pattern, replacement in _SECRET_PATTERNS:
+            text = pattern.sub(replacement, text)
+        return text
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        redacted = self.redact(message)
+        if redacted != message:
+            record.msg = redacted
+            record.args = None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, prefixes=SAMPLED_LOGGERS, rate: float = 5.0, burst: int = 20):
+        """
+        Прореживание сообщений болтливых логгеров
+
+        Для каждого логгера пропускается не больше rate сообщений в секунду
+        (с всплеском до burst); предупреждения и ошибки проходят всегда.
+        Число отброшенных сообщений дописывается к следующему пропущенному.
+
+        :param prefixes: Имена логгеров (вместе с дочерними), которые прореживаются
+        :param rate: Сообщений в секунду на логгер
+        :param burst: Допустимый всплеск
+        """
+        super().__init__()
+        self.prefixes = tuple(prefixes)
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, list] = {}  # логгер -> [токены, время, отброшено]
+        self._lock = threading.Lock()
+
+    def _sampled(self, name: str) -> bool:
+        return any(name == p or name.startswith(p + ".") for p in self.prefixes)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self._sampled(record.name):
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.setdefault(record.name, [float(self.burst), now, 0])
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            dropped, bucket[2] = bucket[2], 0
+        if dropped:
+            record.msg = f"{record.getMessage()} (пропущено похожих сообщений: {dropped})"
+            record.args = None
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, records: queue.Queue):
+        """
+        Обработчик, который не блокирует вызывающий поток: при переполнении очереди запись отбрасывается
+
+        Отброшенные записи учитываются в метрике log_records_dropped_total,
+        а их число дописывается к следующей записи, попавшей в очередь.
+
+        :param records: Очередь записей
+        """
+        super().__init__(records)
+        self.dropped = 0
+        self._unreported = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        # Вызывается под блокировкой обработчика, record.msg уже отформатирован в prepare
+        if self._unreported:
+            record.msg = f"{record.msg} (очередь лога была переполнена, потеряно записей: {self._unreported})"
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self._unreported += 1
+            LOG_DROPPED.inc()
+            return
+        self._unreported = 0
+
+
+def parse_levels(value: str) -> Dict[str, str]:
+    """
+    Разбор уровней логгеров из строки вида "httpx=WARNING,telegram.ext=DEBUG"
+
+    :param value: Строка настроек
+    :return: Словарь имя логгера -> уровень
+    """
+    levels = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _file_handler(path: str) -> logging.Handler:
+    when = os.getenv("LOG_ROTATE_WHEN")
+    backup_count = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    if when:
+        return logging.handlers.TimedRotatingFileHandler(
+            path, when=when, backupCount=backup_count, encoding='utf-8'
+        )
+    return logging.handlers.RotatingFileHandler(
+        path, maxBytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+        backupCount=backup_count, encoding='utf-8'
+    )
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_redactor: Optional[RedactingFilter] = None
+
+
+def redact_secret(secret: str):
+    """
+    Скрывать в логах секрет, который появился после настройки логирования
+
+    :param secret: Секрет, например сгенерированный при запуске секрет webhook
+    """
+    if _redactor is not None:
+        _redactor.add(secret)
+
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """
+    Настройка логирования через очередь с записью в фоновом потоке
+
+    Обработчики вызывающих потоков только кладут запись в очередь; файл
+    и консоль пишет отдельный поток. Настройки из переменных окружения:
+    LOG_LEVEL, LOG_LEVELS, LOG_FILE, LOG_MAX_BYTES, LOG_ROTATE_WHEN,
+    LOG_BACKUP_COUNT, LOG_QUEUE_SIZE, LOG_SAMPLE_RATE и LOG_SAMPLE_BURST.
+
+    :return: Запущенный слушатель очереди
+    """
+    global _listener, _redactor
+    if _listener is not None:
+        return _listener
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    log_file = os.getenv("LOG_FILE", "bot_debug.log")
+    if log_file:
+        handlers.append(_file_handler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(int(os.getenv("LOG_QUEUE_SIZE", "10000"))))
+    # Фильтры работают до постановки в очередь: секреты не попадают никуда дальше
+    queue_handler.addFilter(SamplingFilter(
+        rate=float(os.getenv("LOG_SAMPLE_RATE", "5")),
+        burst=int(os.getenv("LOG_SAMPLE_BURST", "20"))
+    ))
+    _redactor = RedactingFilter([
+        os.getenv("TELEGRAM_BOT_TOKEN"), os.getenv("YANDEX_API_KEY"), os.getenv("WEBHOOK_SECRET")
+    ])
+    queue_handler.addFilter(_redactor)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    levels = dict(DEFAULT_LEVELS)
+    levels.update(parse_levels(os.getenv("LOG_LEVELS", "")))
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Дописывает записи из очереди и останавливает фоновый поток"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,59 @@
+from typing import Iterable, Iterator, List
+
+# Максимальная длина текстового сообщения в Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+def split_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """
+    Разбивка длинного текста на части, допустимые для отправки в Telegram
+
+    Старается резать по переводу строки, затем по пробелу, и только
+    в крайнем случае посередине слова.
+
+    :param text: Исходный текст
+    :param limit: Максимальная длина одной части
+    :return: Список частей
+    """
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, limit)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:]
+        # Разделитель, по которому резали, в начало следующей части не переносим
+        if text[:1] in ("\n", " "):
+            text = text[1:]
+    if text or not parts:
+        parts.append(text)
+    return parts
+
+
+def pack_blocks(blocks: Iterable[str], header: str = "", limit: int = TELEGRAM_MESSAGE_LIMIT) -> Iterator[str]:
+    """
+    Упаковка текстовых блоков в сообщения не длиннее limit
+
+    Блоки не разрываются между сообщениями (кроме блоков длиннее limit),
+    а готовое сообщение отдается сразу, как только следующий блок в него не влезает.
+
+    :param blocks: Текстовые блоки, например описания отдельных ресурсов
+    :param header: Заголовок первого сообщения
+    :param limit: Максимальная длина сообщения
+    :return: Генератор сообщений
+    """
+    current = header
+    for block in blocks:
+        if len(current) + len(block) <= limit:
+            current += block
+            continue
+        if current:
+            yield current
+        if len(block) > limit:
+            *full, block = split_message(block, limit)
+            yield from full
+        current = block
+    if current:
+        yield current
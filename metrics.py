@@ -0,0 +1,114 @@
+import asyncio
+import functools
+import logging
+import os
+import time
+from typing import Callable, Optional
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, start_http_server
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержки, сек: запросы к модели бывают дольше 10 с корзин по умолчанию
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HANDLER_LATENCY = Histogram(
+    "bot_handler_duration_seconds", "Время обработки обновления обработчиком", ["handler"],
+    buckets=LATENCY_BUCKETS
+)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors_total", "Необработанные исключения в обработчиках", ["handler"]
+)
+HANDLER_IN_FLIGHT = Gauge(
+    "bot_handler_in_flight", "Обновления, которые обрабатываются прямо сейчас", ["handler"]
+)
+
+
+def instrument_handler(name: str, handler: Callable) -> Callable:
+    """
+    Обертка обработчика Telegram, которая измеряет время, ошибки и число одновременных вызовов
+
+    :param name: Имя обработчика в метке handler
+    :param handler: Асинхронный обработчик (update, context)
+    :return: Обернутый обработчик
+    """
+    latency = HANDLER_LATENCY.labels(name)
+    errors = HANDLER_ERRORS.labels(name)
+    in_flight = HANDLER_IN_FLIGHT.labels(name)
+
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            return await handler(update, context)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - started)
+            in_flight.dec()
+
+    return wrapper
+
+
+def total(metric) -> float:
+    """
+    Сумма значений метрики по всем меткам, например число ошибок всех обработчиков
+
+    :param metric: Counter или Gauge
+    :return: Сумма значений
+    """
+    return sum(
+        sample.value for family in metric.collect() for sample in family.samples
+        if sample.name in (family.name, family.name + "_total")
+    )
+
+
+class MetricsServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 9464, registry: CollectorRegistry = REGISTRY):
+        """
+        HTTP эндпоинт /metrics на сервере prometheus_client
+
+        Сервер работает в отдельном потоке и не занимает цикл событий бота.
+
+        :param host: Адрес для прослушивания
+        :param port: Порт для прослушивания
+        :param registry: Реестр метрик (по умолчанию общий REGISTRY)
+        """
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._server = None
+        self._thread = None
+
+    async def start(self):
+        """
+        Начинает принимать запросы
+
+        :raises OSError: Если порт занят
+        """
+        self._server, self._thread = start_http_server(self.port, self.host, self.registry)
+        logger.info(f"Метрики доступны на http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        """Прекращает прием запросов"""
+        if self._server is not None:
+            # shutdown ждет завершения цикла обслуживания, поэтому выполняется вне цикла событий
+            await asyncio.get_running_loop().run_in_executor(None, self._server.shutdown)
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
+
+
+def create_metrics_server() -> Optional[MetricsServer]:
+    """
+    Создание эндпоинта метрик по настройкам из переменных окружения
+
+    METRICS_HOST и METRICS_PORT; METRICS_PORT=0 отключает эндпоинт.
+    """
+    port = int(os.getenv("METRICS_PORT", "9464"))
+    if port == 0:
+        return None
+    return MetricsServer(os.getenv("METRICS_HOST", "127.0.0.1"), port)
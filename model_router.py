@@ -0,0 +1,115 @@
+import logging
+import os
+import re
+from typing import Optional
+
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+LLM_ROUTES = Counter("llm_routes_total", "Выбор модели для запросов", ["tier", "reason"])
+
+TIER_FAST = "fast"
+TIER_LARGE = "large"
+
+# Роли (системные промпты), которым нужна большая модель независимо от текста
+LARGE_ROLES = ("diagnostics", "optimization")
+
+# Признаки сложного запроса: диагностика, сравнение, проектирование, код
+COMPLEX_PATTERN = re.compile(
+    r"почему|ошибк|не работает|не запуска|падает|диагност|сравни|отлича|архитектур|спроектир|миграц|"
+    r"перенест|оптимиз|пошагов|подробн|настро|traceback|exception|terraform|kubernetes|k8s",
+    re.IGNORECASE
+)
+# Максимум баллов за ключевые слова, чтобы длинный список слов не решал все сам
+MAX_KEYWORD_SCORE = 2
+
+
+class ModelRoute:
+    __slots__ = ("tier", "model", "max_tokens", "reason")
+
+    def __init__(self, tier: str, model: str, max_tokens: int, reason: str):
+        self.tier = tier
+        self.model = model
+        self.max_tokens = max_tokens
+        self.reason = reason
+
+    def __repr__(self):
+        return f"ModelRoute({self.tier}, {self.model}, {self.max_tokens}, {self.reason})"
+
+
+class ModelRouter:
+    def __init__(self, fast_model: str = "yandexgpt-lite", large_model: str = "yandexgpt",
+                 fast_max_tokens: int = 2000, large_max_tokens: int = 2000, threshold: int = 2,
+                 long_prompt_chars: int = 400):
+        """
+        Выбор модели по сложности запроса
+
+        Дешевый локальный классификатор: баллы за длину, ключевые слова,
+        код и несколько вопросов; запросы /diagnose и /optimize сразу идут
+        в большую модель. Большинство вопросов в чате простые и получают
+        быструю модель.
+
+        :param fast_model: Быстрая модель (имя в URI gpt://<каталог>/<модель>)
+        :param large_model: Большая модель
+        :param fast_max_tokens: maxTokens для быстрой модели
+        :param large_max_tokens: maxTokens для большой модели
+        :param threshold: С какого балла запрос считается сложным
+        :param long_prompt_chars: С какой длины запрос считается длинным
+        """
+        self.fast = (fast_model, fast_max_tokens)
+        self.large = (large_model, large_max_tokens)
+        self.threshold = threshold
+        self.long_prompt_chars = long_prompt_chars
+
+    def score(self, prompt: str) -> int:
+        """Баллы сложности текста запроса"""
+        score = 0
+        if len(prompt) >= self.long_prompt_chars:
+            score += 2
+        elif len(prompt) >= self.long_prompt_chars // 3:
+            score += 1
+        score += min(MAX_KEYWORD_SCORE, len(COMPLEX_PATTERN.findall(prompt)))
+        if "```" in prompt or prompt.count("\n") >= 3:
+            score += 1
+        if prompt.count("?") >= 2:
+            score += 1
+        return score
+
+    def route(self, prompt: str, role: Optional[str] = None) -> ModelRoute:
+        """
+        Модель и maxTokens для запроса; решение учитывается в метриках
+
+        :param prompt: Текст запроса пользователя
+        :param role: Роль системного промпта (diagnostics, optimization...) или None для чата
+        :return: Выбранный маршрут
+        """
+        if role in LARGE_ROLES:
+            tier, reason = TIER_LARGE, "role"
+        else:
+            score = self.score(prompt)
+            tier = TIER_LARGE if score >= self.threshold else TIER_FAST
+            reason = "score"
+        model, max_tokens = self.large if tier == TIER_LARGE else self.fast
+        LLM_ROUTES.labels(tier, reason).inc()
+        logger.debug(f"Запрос ({len(prompt)} символов, роль {role}) направлен в {model}: {reason}")
+        return ModelRoute(tier, model, max_tokens, reason)
+
+
+def create_model_router() -> Optional[ModelRouter]:
+    """
+    Создание маршрутизатора моделей по настройкам из переменных окружения
+
+    LLM_ROUTING (false - все запросы в быструю модель, как раньше),
+    LLM_FAST_MODEL, LLM_LARGE_MODEL, LLM_FAST_MAX_TOKENS, LLM_LARGE_MAX_TOKENS
+    и LLM_ROUTING_THRESHOLD.
+    """
+    if os.getenv("LLM_ROUTING", "true").lower() not in ("1", "true", "yes"):
+        return None
+    return ModelRouter(
+        fast_model=os.getenv("LLM_FAST_MODEL", "yandexgpt-lite"),
+        large_model=os.getenv("LLM_LARGE_MODEL", "yandexgpt"),
+        fast_max_tokens=int(os.getenv("LLM_FAST_MAX_TOKENS", "2000")),
+        large_max_tokens=int(os.getenv("LLM_LARGE_MAX_TOKENS", "2000")),
+        threshold=int(os.getenv("LLM_ROUTING_THRESHOLD", "2"))
+    )
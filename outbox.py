@@ -0,0 +1,360 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable, List, Optional, TypeVar
+
+from prometheus_client import Counter, Gauge, Histogram
+from telegram.error import RetryAfter
+
+from llm_scheduler import TokenBucket
+from message_utils import TELEGRAM_MESSAGE_LIMIT, split_message
+from metrics import LATENCY_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+OUTBOX_LATENCY = Histogram("outbox_delivery_seconds", "Время от постановки сообщения в очередь до отправки", ["kind"],
+                           buckets=LATENCY_BUCKETS)
+OUTBOX_QUEUE_DEPTH = Gauge("outbox_queue_depth", "Сообщения, ожидающие отправки")
+OUTBOX_ACTIVE_CHATS = Gauge("outbox_active_chats", "Чаты с непустой очередью отправки")
+OUTBOX_MESSAGES = Counter("outbox_messages_total", "Исходящие сообщения и правки", ["result"])
+OUTBOX_RETRY_AFTER = Counter("outbox_retry_after_total", "Ответы Telegram RetryAfter при отправке")
+
+# Разделитель склеиваемых сообщений
+COALESCE_SEPARATOR = "\n\n"
+# Аргументы send_message, меняющие разметку, адресата или уведомление: такие сообщения не склеиваются
+NOT_PLAIN_ARGS = (
+    "parse_mode", "entities", "reply_markup", "reply_to_message_id", "reply_parameters", "message_thread_id",
+    "disable_notification", "protect_content", "link_preview_options", "disable_web_page_preview",
+)
+
+
+def is_plain_message(kwargs: Dict) -> bool:
+    """
+    Простое ли сообщение: без разметки, клавиатуры, ответа на сообщение и особых флагов
+
+    Незаданные аргументы PTB передает как значения по умолчанию (DEFAULT_NONE,
+    DEFAULT_FALSE), которые, как None и False, ложны при проверке истинности.
+
+    :param kwargs: Именованные аргументы send_message
+    :return: True, если сообщение можно склеить с соседними
+    """
+    return not any(kwargs.get(name) for name in NOT_PLAIN_ARGS)
+
+
+class _Outgoing:
+    __slots__ = ("call", "text", "coalesce", "future", "enqueued_at", "attempts")
+
+    def __init__(self, call: Callable, text: Optional[str], coalesce: bool):
+        self.call = call  # call(text) для сообщения, call() для прочих вызовов
+        self.text = text
+        self.coalesce = coalesce
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+
+class Outbox:
+    def __init__(self, global_rate: float = 30, global_burst: float = 30, chat_rate: float = 1.0,
+                 chat_burst: float = 3, group_rate: float = 20 / 60, group_burst: float = 5,
+                 max_retries: int = 5, throttle_window: float = 60, limit: int = TELEGRAM_MESSAGE_LIMIT):
+        """
+        Очередь исходящих сообщений с учетом лимитов Telegram
+
+        У каждого чата своя очередь и своя задача отправки, поэтому порядок
+        внутри чата сохраняется, а разные чаты отправляются параллельно.
+        Пока Telegram не ответил RetryAfter, сообщения уходят без задержек.
+        На RetryAfter чат ставится на паузу на указанное время, и то же
+        сообщение отправляется снова; остальные чаты не ждут. Затем в
+        течение throttle_window этот чат отправляет не чаще лимита чата (в
+        группах лимит ниже), а весь бот - не чаще общего лимита. Текст длиннее
+        limit режется на части, а подряд идущие в очереди короткие сообщения
+        одного чата склеиваются в одно, пока оно не длиннее limit.
+
+        :param global_rate: Сообщений в секунду для всего бота после RetryAfter
+        :param global_burst: Допустимый всплеск для всего бота
+        :param chat_rate: Сообщений в секунду в личный чат после RetryAfter
+        :param chat_burst: Допустимый всплеск в личный чат
+        :param group_rate: Сообщений в секунду в группу после RetryAfter
+        :param group_burst: Допустимый всплеск в группу
+        :param max_retries: Сколько раз повторять отправку после RetryAfter
+        :param throttle_window: Сколько секунд после RetryAfter соблюдать лимиты
+        :param limit: Максимальная длина сообщения
+        """
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self.throttle_window = throttle_window
+        self.limit = limit
+
+        self._global = TokenBucket(global_rate, global_burst)
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._queues: Dict[Hashable, Deque[_Outgoing]] = {}
+        self._workers: Dict[Hashable, asyncio.Task] = {}
+        self._paused_until: Dict[Hashable, float] = {}
+        self._throttled_until: Dict[Hashable, float] = {}  # чат -> до какого момента соблюдать лимит чата
+        self._global_throttled_until = 0.0
+        self._queued = 0
+
+        self.sent = 0
+        self.coalesced = 0
+        self.split = 0
+        self.retry_after = 0
+        self.failed = 0
+        self.queue_peak = 0
+        self._delivered = 0
+        self._delivery_total = 0.0
+        self._delivery_max = 0.0
+        OUTBOX_QUEUE_DEPTH.set_function(lambda: self._queued)
+        OUTBOX_ACTIVE_CHATS.set_function(lambda: len(self._workers))
+
+    @property
+    def queue_depth(self) -> int:
+        """Сообщения и правки, ожидающие отправки во всех чатах"""
+        return self._queued
+
+    def _bucket(self, chat_id: Hashable) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if len(self._buckets) >= 10000:
+                # Выбрасываем ведра простаивающих чатов - они все равно полные
+                self._buckets = {k: b for k, b in self._buckets.items() if not b.is_full}
+            # Отрицательные ID - группы и каналы
+            if isinstance(chat_id, int) and chat_id < 0:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    def _enqueue(self, chat_id: Hashable, item: _Outgoing):
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = self._queues[chat_id] = deque()
+        queue.append(item)
+        self._queued += 1
+        self.queue_peak = max(self.queue_peak, self._queued)
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.ensure_future(self._worker(chat_id))
+
+    async def send(self, chat_id: Hashable, text: str, deliver: Callable[[str], Awaitable[T]],
+                   coalesce: bool = True) -> T:
+        """
+        Отправка текстового сообщения через очередь чата
+
+        :param chat_id: ID чата
+        :param text: Текст; длиннее limit - отправляется несколькими сообщениями
+        :param deliver: Отправка одного сообщения с заданным текстом
+        :param coalesce: Можно склеить с соседними сообщениями очереди; нельзя для сообщений,
+            которые потом редактируются
+        :return: Результат deliver для последней части
+        """
+        parts = split_message(text, self.limit) if len(text) > self.limit else [text]
+        if len(parts) > 1:
+            self.split += 1
+            OUTBOX_MESSAGES.labels("split").inc()
+        items = [_Outgoing(deliver, part, coalesce) for part in parts]
+        for item in items:
+            self._enqueue(chat_id, item)
+        results = await asyncio.gather(*(item.future for item in items))
+        return results[-1]
+
+    async def call(self, chat_id: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Вызов Bot API (например, правка сообщения) в очереди чата с учетом лимитов
+
+        :param chat_id: ID чата
+        :param fn: Фабрика корутины вызова
+        :return: Результат вызова
+        """
+        item = _Outgoing(fn, None, False)
+        self._enqueue(chat_id, item)
+        return await item.future
+
+    def _take(self, queue: Deque[_Outgoing]) -> List[_Outgoing]:
+        """Следующая отправка: первое сообщение и склеиваемые с ним соседи"""
+        while queue and queue[0].future.done():
+            # Ожидавший отправки отменен
+            queue.popleft()
+            self._queued -= 1
+        if not queue:
+            return []
+        batch = [queue.popleft()]
+        self._queued -= 1
+        if batch[0].coalesce:
+            length = len(batch[0].text)
+            while (queue and queue[0].coalesce and not queue[0].future.done()
+                   and length + len(COALESCE_SEPARATOR) + len(queue[0].text) <= self.limit):
+                length += len(COALESCE_SEPARATOR) + len(queue[0].text)
+                batch.append(queue.popleft())
+                self._queued -= 1
+        return batch
+
+    async def _wait_pause(self, chat_id: Hashable):
+        paused = self._paused_until.get(chat_id, 0) - time.monotonic()
+        if paused > 0:
+            await asyncio.sleep(paused)
+
+    async def _wait_limits(self, chat_id: Hashable):
+        """Токены лимитов; нужны, только пока не прошло throttle_window после RetryAfter"""
+        now = time.monotonic()
+        throttled_until = self._throttled_until.get(chat_id)
+        if throttled_until is not None:
+            if now < throttled_until:
+                await self._bucket(chat_id).acquire()
+            else:
+                del self._throttled_until[chat_id]
+                self._buckets.pop(chat_id, None)
+        if now < self._global_throttled_until:
+            await self._global.acquire()
+
+    def _throttle(self, chat_id: Hashable, delay: float):
+        now = time.monotonic()
+        if len(self._throttled_until) >= 10000:
+            self._throttled_until = {k: t for k, t in self._throttled_until.items() if t > now}
+        self._paused_until[chat_id] = now + delay
+        if chat_id not in self._throttled_until:
+            # Ведро начинает пустым: после паузы Telegram не ждет всплеска
+            self._bucket(chat_id).tokens = 0
+        self._throttled_until[chat_id] = now + delay + self.throttle_window
+        if now >= self._global_throttled_until:
+            self._global.tokens = 0
+        self._global_throttled_until = now + delay + self.throttle_window
+
+    async def _worker(self, chat_id: Hashable):
+        queue = self._queues[chat_id]
+        try:
+            while queue:
+                await self._wait_pause(chat_id)
+                # Сообщения выбираются до ожидания токенов: отмененные и склеенные токен не тратят
+                batch = self._take(queue)
+                if not batch:
+                    continue
+                await self._wait_limits(chat_id)
+                await self._deliver(chat_id, batch, queue)
+        finally:
+            del self._workers[chat_id]
+            if queue:
+                # Задачу отменили - оставшиеся сообщения не будут отправлены
+                for item in queue:
+                    if not item.future.done():
+                        item.future.cancel()
+                self._queued -= len(queue)
+                queue.clear()
+            self._queues.pop(chat_id, None)
+
+    async def _deliver(self, chat_id: Hashable, batch: List[_Outgoing], queue: Deque[_Outgoing]):
+        head = batch[0]
+        try:
+            if head.text is None:
+                result = await head.call()
+            else:
+                result = await head.call(COALESCE_SEPARATOR.join(item.text for item in batch))
+        except RetryAfter as e:
+            self.retry_after += 1
+            OUTBOX_RETRY_AFTER.inc()
+            head.attempts += 1
+            if head.attempts <= self.max_retries:
+                delay = float(e.retry_after)
+                logger.warning(f"Telegram просит подождать {delay:.0f} с перед отправкой в чат {chat_id}")
+                self._throttle(chat_id, delay)
+                # Сообщения возвращаются в начало очереди в прежнем порядке
+                queue.extendleft(reversed(batch))
+                self._queued += len(batch)
+                return
+            self._fail(batch, e)
+            return
+        except asyncio.CancelledError:
+            self._fail(batch, None)
+            raise
+        except Exception as e:
+            self._fail(batch, e)
+            return
+
+        self._paused_until.pop(chat_id, None)
+        now = time.monotonic()
+        kind = "message" if head.text is not None else "call"
+        for item in batch:
+            waited = now - item.enqueued_at
+            OUTBOX_LATENCY.labels(kind).observe(waited)
+            self._delivered += 1
+            self._delivery_total += waited
+            self._delivery_max = max(self._delivery_max, waited)
+            if not item.future.done():
+                item.future.set_result(result)
+        self.sent += 1
+        OUTBOX_MESSAGES.labels("sent").inc()
+        if len(batch) > 1:
+            self.coalesced += len(batch) - 1
+            OUTBOX_MESSAGES.labels("coalesced").inc(len(batch) - 1)
+
+    def _fail(self, batch: List[_Outgoing], error: Optional[BaseException]):
+        self.failed += len(batch)
+        OUTBOX_MESSAGES.labels("failed").inc(len(batch))
+        for item in batch:
+            if item.future.done():
+                continue
+            if error is None:
+                item.future.cancel()
+            else:
+                item.future.set_exception(error)
+
+    async def drain(self, timeout: float):
+        """Ожидание отправки всего, что стоит в очередях, но не дольше timeout"""
+        workers = list(self._workers.values())
+        if not workers:
+            return
+        done, pending = await asyncio.wait(workers, timeout=timeout)
+        if pending:
+            logger.warning(f"Не отправлено при остановке: {self._queued} сообщений в {len(pending)} чатах")
+
+    async def stop(self):
+        """Отменяет отправку; ожидающие получают CancelledError"""
+        workers = list(self._workers.values())
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        """Отправки, склейки, разбиения, RetryAfter, очередь и время доставки"""
+        return {
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "split": self.split,
+            "retry_after": self.retry_after,
+            "failed": self.failed,
+            "queue_depth": self._queued,
+            "queue_peak": self.queue_peak,
+            "active_chats": len(self._workers),
+            "throttled_chats": len(self._throttled_until),
+            "delivery_avg_ms": round(self._delivery_total / self._delivered * 1000, 1) if self._delivered else 0.0,
+            "delivery_max_ms": round(self._delivery_max * 1000, 1)
+        }
+
+
+def create_outbox() -> Optional[Outbox]:
+    """
+    Создание очереди исходящих сообщений по настройкам из переменных окружения
+
+    OUTBOX (false - сообщения отправляются напрямую, как раньше), OUTBOX_GLOBAL_RATE,
+    OUTBOX_GLOBAL_BURST, OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST, OUTBOX_GROUP_RATE,
+    OUTBOX_GROUP_BURST, OUTBOX_MAX_RETRIES и OUTBOX_THROTTLE_WINDOW.
+    """
+    if os.getenv("OUTBOX", "true").lower() not in ("1", "true", "yes"):
+        return None
+    return Outbox(
+        global_rate=float(os.getenv("OUTBOX_GLOBAL_RATE", "30")),
+        global_burst=float(os.getenv("OUTBOX_GLOBAL_BURST", "30")),
+        chat_rate=float(os.getenv("OUTBOX_CHAT_RATE", "1")),
+        chat_burst=float(os.getenv("OUTBOX_CHAT_BURST", "3")),
+        group_rate=float(os.getenv("OUTBOX_GROUP_RATE", str(20 / 60))),
+        group_burst=float(os.getenv("OUTBOX_GROUP_BURST", "5")),
+        max_retries=int(os.getenv("OUTBOX_MAX_RETRIES", "5")),
+        throttle_window=float(os.getenv("OUTBOX_THROTTLE_WINDOW", "60"))
+    )
@@ -0,0 +1,504 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+import httpx
+from prometheus_client import Counter, Gauge
+
+from llm_scheduler import LLMScheduler, UpstreamThrottled
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+LLM_HEDGES = Counter("llm_hedged_requests_total", "Дублирующие запросы к модели", ["result"])
+LLM_CIRCUIT_STATE = Gauge("llm_circuit_state", "Состояние предохранителя: 0 - закрыт, 1 - пробный запрос, 2 - открыт",
+                          ["model"])
+LLM_CIRCUIT_REJECTED = Counter("llm_circuit_rejected_total", "Запросы, не отправленные из-за открытого предохранителя",
+                               ["model"])
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Маркер конца потока в очереди попытки
+_END = object()
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """
+    Ошибка, говорящая о проблеме апстрима, а не запроса
+
+    5xx, 503, таймауты и сетевые ошибки; 4xx и 429 (исчерпана квота,
+    повторами занимается планировщик) предохранитель не открывают.
+    """
+    if isinstance(error, UpstreamThrottled):
+        return error.status_code >= 500
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+
+class CircuitOpen(Exception):
+    def __init__(self, name: str, retry_after: float):
+        """
+        Предохранитель открыт - запрос к апстриму не отправляется
+
+        :param name: Имя предохранителя (модель)
+        :param retry_after: Через сколько секунд будет пробный запрос
+        """
+        super().__init__(f"Circuit {name} is open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class _LatencyWindow:
+    __slots__ = ("samples", "min_samples", "quantile", "_cached", "_dirty")
+
+    def __init__(self, size: int, min_samples: int, quantile: float):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+        self.quantile = quantile
+        self._cached = None
+        self._dirty = 0
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+        self._dirty += 1
+
+    def value(self) -> Optional[float]:
+        """Квантиль окна; пересчитывается не чаще раза в несколько новых замеров"""
+        if len(self.samples) < self.min_samples:
+            return None
+        if self._cached is None or self._dirty >= max(1, self.min_samples // 4):
+            ordered = sorted(self.samples)
+            self._cached = ordered[min(len(ordered) - 1, int(len(ordered) * self.quantile))]
+            self._dirty = 0
+        return self._cached
+
+
+class _StreamAttempt:
+    __slots__ = ("queue", "started", "task")
+
+    def __init__(self, factory: Callable[[], AsyncIterator[T]]):
+        self.queue = asyncio.Queue()
+        self.started = time.perf_counter()
+        self.task = asyncio.ensure_future(self._pump(factory))
+
+    async def _pump(self, factory: Callable[[], AsyncIterator[T]]):
+        # Поток целиком читается в своей задаче: соединение открывается и закрывается в одной задаче
+        try:
+            async for item in factory():
+                self.queue.put_nowait((item, None))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.queue.put_nowait((_END, e))
+            return
+        self.queue.put_nowait((_END, None))
+
+
+class Hedger:
+    def __init__(self, quantile: float = 0.95, min_delay: float = 0.3, max_delay: float = 10.0,
+                 initial_delay: float = 3.0, budget: float = 0.1, timeout: float = None,
+                 window: int = 200, min_samples: int = 20):
+        """
+        Дублирующие (hedged) запросы к модели
+
+        Если ответ не пришел за время p95 последних ответов, отправляется
+        второй такой же запрос; используется тот, что ответил первым, второй
+        отменяется. Так хвост задержки (медленный узел, потерянный пакет)
+        срезается ценой нескольких процентов лишних запросов. Задержки
+        считаются отдельно по ключу (модели), доля дублей ограничена бюджетом.
+        Если передан планировщик, дубль занимает в нем свой слот и не
+        отправляется, когда свободных слотов нет.
+
+        :param quantile: Квантиль задержки, после которого отправляется дубль
+        :param min_delay: Нижняя граница задержки перед дублем, сек
+        :param max_delay: Верхняя граница задержки перед дублем, сек
+        :param initial_delay: Задержка, пока замеров меньше min_samples, сек
+        :param budget: Максимальная доля запросов с дублем
+        :param timeout: Общий таймаут запроса с дублем, сек (None - без таймаута)
+        :param window: Сколько последних замеров учитывается
+        :param min_samples: Сколько замеров нужно для расчета квантиля
+        """
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.initial_delay = initial_delay
+        self.budget = budget
+        self.timeout = timeout
+        self.window = window
+        self.min_samples = min_samples
+        self._windows: Dict[Hashable, _LatencyWindow] = {}
+
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.no_slot = 0
+
+    def _window(self, key: Hashable) -> _LatencyWindow:
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = _LatencyWindow(self.window, self.min_samples, self.quantile)
+        return window
+
+    def delay(self, key: Hashable = None) -> float:
+        """Сколько ждать первый ответ перед отправкой дубля, сек"""
+        observed = self._window(key).value()
+        if observed is None:
+            return self.initial_delay
+        return min(self.max_delay, max(self.min_delay, observed))
+
+    def _may_hedge(self, scheduler: Optional[LLMScheduler]) -> bool:
+        # Один дубль разрешен всегда, дальше - не больше budget от числа запросов
+        if self.hedged >= self.budget * self.requests + 1:
+            return False
+        if scheduler is not None and not scheduler.try_acquire():
+            self.no_slot += 1
+            LLM_HEDGES.labels("no_slot").inc()
+            return False
+        self.hedged += 1
+        LLM_HEDGES.labels("fired").inc()
+        return True
+
+    async def run(self, fn: Callable[[], Awaitable[T]], key: Hashable = None,
+                  scheduler: LLMScheduler = None) -> T:
+        """
+        Выполнение запроса с дублем
+
+        :param fn: Фабрика корутины, выполняющей запрос; вызывается для каждой попытки
+        :param key: Ключ статистики задержек (модель)
+        :param scheduler: Планировщик, в котором дубль занимает отдельный слот
+        :return: Результат первой успешной попытки
+        :raises asyncio.TimeoutError: Если истек общий таймаут
+        """
+        if self.timeout is None:
+            return await self._run(fn, key, scheduler)
+        return await asyncio.wait_for(self._run(fn, key, scheduler), self.timeout)
+
+    async def _run(self, fn: Callable[[], Awaitable[T]], key: Hashable, scheduler: Optional[LLMScheduler]) -> T:
+        window = self._window(key)
+        self.requests += 1
+        started = {}
+
+        def attempt() -> asyncio.Task:
+            task = asyncio.ensure_future(fn())
+            started[task] = time.perf_counter()
+            return task
+
+        first = attempt()
+        pending = {first}
+        error = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.delay(key))
+            if not done and self._may_hedge(scheduler):
+                hedge = attempt()
+                if scheduler is not None:
+                    hedge.add_done_callback(lambda _: scheduler.release())
+                pending.add(hedge)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        window.observe(time.perf_counter() - started[task])
+                        if task is not first:
+                            self.hedge_wins += 1
+                            LLM_HEDGES.labels("won").inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def stream(self, factory: Callable[[], AsyncIterator[T]], key: Hashable = None,
+                     scheduler: LLMScheduler = None) -> AsyncIterator[T]:
+        """
+        Потоковый запрос с дублем
+
+        Гонка идет до первого фрагмента: если его нет дольше квантиля времени
+        до первого фрагмента, открывается второй поток; дальше читается тот,
+        что начал отвечать первым. Таймаут ограничивает ожидание первого фрагмента.
+
+        :param factory: Фабрика асинхронного генератора; вызывается для каждой попытки
+        :param key: Ключ статистики задержек (модель)
+        :param scheduler: Планировщик, в котором дубль занимает отдельный слот
+        :return: Асинхронный генератор фрагментов победившей попытки
+        """
+        key = (key, "stream")
+        window = self._window(key)
+        self.requests += 1
+        attempts = [_StreamAttempt(factory)]
+        getters = {asyncio.ensure_future(attempts[0].queue.get()): attempts[0]}
+        winner = None
+        first_item = None
+        error = None
+        deadline = time.perf_counter() + self.timeout if self.timeout is not None else None
+        hedge_at = time.perf_counter() + self.delay(key)
+        try:
+            while getters and winner is None:
+                wait_until = deadline
+                if hedge_at is not None:
+                    wait_until = hedge_at if deadline is None else min(hedge_at, deadline)
+                timeout = None if wait_until is None else max(0.0, wait_until - time.perf_counter())
+                done, _ = await asyncio.wait(getters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    now = time.perf_counter()
+                    if deadline is not None and now >= deadline:
+                        raise asyncio.TimeoutError()
+                    if hedge_at is not None and now >= hedge_at:
+                        hedge_at = None
+                        if self._may_hedge(scheduler):
+                            attempts.append(_StreamAttempt(factory))
+                            if scheduler is not None:
+                                attempts[1].task.add_done_callback(lambda _: scheduler.release())
+                            getters[asyncio.ensure_future(attempts[1].queue.get())] = attempts[1]
+                    continue
+                for getter in done:
+                    attempt = getters.pop(getter)
+                    item, exc = getter.result()
+                    if winner is not None:
+                        continue
+                    if item is _END and exc is not None:
+                        error = exc
+                        continue
+                    # Пустой ответ без фрагментов тоже считается завершенной попыткой
+                    winner, first_item = attempt, item
+            if winner is None:
+                raise error
+            window.observe(time.perf_counter() - winner.started)
+            if winner is not attempts[0]:
+                self.hedge_wins += 1
+                LLM_HEDGES.labels("won").inc()
+            for attempt in attempts:
+                if attempt is not winner:
+                    attempt.task.cancel()
+            if first_item is _END:
+                return
+            yield first_item
+            while True:
+                item, exc = await winner.queue.get()
+                if item is _END:
+                    if exc is not None:
+                        raise exc
+                    return
+                yield item
+        finally:
+            for getter in getters:
+                getter.cancel()
+            for attempt in attempts:
+                attempt.task.cancel()
+            await asyncio.gather(*(attempt.task for attempt in attempts), return_exceptions=True)
+
+    def stats(self) -> Dict:
+        """Доля дублей, выигравшие дубли и текущие задержки по ключам"""
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "no_slot": self.no_slot,
+            "delays": {str(key): round(self.delay(key), 3) for key in self._windows}
+        }
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_ratio: float = 0.5, min_requests: int = 10,
+                 window: float = 30.0, open_seconds: float = 15.0):
+        """
+        Предохранитель запросов к модели
+
+        Считает исходы запросов за последние window секунд; если ошибок
+        апстрима не меньше failure_ratio при хотя бы min_requests запросах,
+        предохранитель открывается и запросы сразу отклоняются (CircuitOpen),
+        а не копятся в ожидании таймаутов. Через open_seconds пропускается
+        один пробный запрос: успех закрывает предохранитель, ошибка снова
+        открывает.
+
+        :param name: Имя для метрик и логов (модель)
+        :param failure_ratio: Доля ошибок, при которой предохранитель открывается
+        :param min_requests: Минимум запросов в окне для решения
+        :param window: Окно подсчета ошибок, сек
+        :param open_seconds: Сколько держать предохранитель открытым, сек
+        """
+        self.name = name
+        self.failure_ratio = failure_ratio
+        self.min_requests = min_requests
+        self.window = window
+        self.open_seconds = open_seconds
+
+        self.state = CLOSED
+        self._outcomes = deque()  # (время, ошибка ли)
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+        self.opened = 0
+        self.rejected = 0
+        self._set_state(CLOSED)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(f"Предохранитель {self.name}: {self.state} -> {state}")
+        self.state = state
+        LLM_CIRCUIT_STATE.labels(self.name).set(_STATE_VALUES[state])
+
+    def retry_after(self) -> float:
+        """Сколько секунд до пробного запроса; 0 - запрос можно отправлять"""
+        if self.state == OPEN:
+            return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+        if self.state == HALF_OPEN and self._probing:
+            return self.open_seconds
+        return 0.0
+
+    def check(self):
+        """
+        Быстрая проверка до постановки в очередь; место пробного запроса не занимает
+
+        :raises CircuitOpen: Если предохранитель открыт
+        """
+        wait = self.retry_after()
+        if wait > 0:
+            self.rejected += 1
+            LLM_CIRCUIT_REJECTED.labels(self.name).inc()
+            raise CircuitOpen(self.name, wait)
+
+    def allow(self):
+        """
+        Разрешение на запрос; в полуоткрытом состоянии - только одному
+
+        :raises CircuitOpen: Если предохранитель открыт
+        """
+        self.check()
+        if self.state == OPEN:
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            self._probing = True
+
+    def _prune(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            if self._outcomes.popleft()[1]:
+                self._failures -= 1
+
+    def record(self, failed: bool):
+        """Учет исхода запроса"""
+        if self.state == HALF_OPEN:
+            self._probing = False
+            if failed:
+                self._open()
+            else:
+                self._outcomes.clear()
+                self._failures = 0
+                self._set_state(CLOSED)
+            return
+        if self.state == OPEN:
+            # Запрос, отправленный до открытия
+            return
+        now = time.monotonic()
+        self._outcomes.append((now, failed))
+        self._failures += failed
+        self._prune(now)
+        if len(self._outcomes) >= self.min_requests and self._failures >= self.failure_ratio * len(self._outcomes):
+            self._open()
+
+    def _open(self):
+        self.opened += 1
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._failures = 0
+        self._set_state(OPEN)
+
+    @contextmanager
+    def call(self):
+        """
+        Учет одного запроса к апстриму
+
+        Отмена (в том числе проигравшего дубля) не считается ни успехом, ни ошибкой.
+
+        :raises CircuitOpen: Если предохранитель открыт
+        """
+        self.allow()
+        try:
+            yield
+        except Exception as e:
+            self.record(is_upstream_failure(e))
+            raise
+        except BaseException:
+            if self.state == HALF_OPEN:
+                self._probing = False
+            raise
+        else:
+            self.record(False)
+
+    def stats(self) -> Dict:
+        return {"state": self.state, "opened": self.opened, "rejected": self.rejected}
+
+
+class CircuitBreakers:
+    def __init__(self, **settings):
+        """
+        Предохранители по именам (моделям): отказ большой модели не
+        отключает быструю
+
+        :param settings: Параметры CircuitBreaker, кроме имени
+        """
+        self.settings = settings
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = self._breakers[name] = CircuitBreaker(name, **self.settings)
+        return breaker
+
+    def stats(self) -> Dict:
+        return {name: breaker.stats() for name, breaker in self._breakers.items()}
+
+
+def _enabled(name: str) -> bool:
+    return os.getenv(name, "true").lower() in ("1", "true", "yes")
+
+
+def create_hedger() -> Optional[Hedger]:
+    """
+    Создание дублирования запросов по настройкам из переменных окружения
+
+    LLM_HEDGE (false отключает), LLM_HEDGE_QUANTILE, LLM_HEDGE_MIN_DELAY,
+    LLM_HEDGE_MAX_DELAY, LLM_HEDGE_INITIAL_DELAY, LLM_HEDGE_BUDGET
+    и LLM_REQUEST_TIMEOUT (0 - без общего таймаута).
+    """
+    if not _enabled("LLM_HEDGE"):
+        return None
+    timeout = float(os.getenv("LLM_REQUEST_TIMEOUT", "45"))
+    return Hedger(
+        quantile=float(os.getenv("LLM_HEDGE_QUANTILE", "0.95")),
+        min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.3")),
+        max_delay=float(os.getenv("LLM_HEDGE_MAX_DELAY", "10")),
+        initial_delay=float(os.getenv("LLM_HEDGE_INITIAL_DELAY", "3")),
+        budget=float(os.getenv("LLM_HEDGE_BUDGET", "0.1")),
+        timeout=timeout or None
+    )
+
+
+def create_circuit_breakers() -> Optional[CircuitBreakers]:
+    """
+    Создание предохранителей по настройкам из переменных окружения
+
+    LLM_BREAKER (false отключает), LLM_BREAKER_FAILURE_RATIO,
+    LLM_BREAKER_MIN_REQUESTS, LLM_BREAKER_WINDOW и LLM_BREAKER_OPEN_SECONDS.
+    """
+    if not _enabled("LLM_BREAKER"):
+        return None
+    return CircuitBreakers(
+        failure_ratio=float(os.getenv("LLM_BREAKER_FAILURE_RATIO", "0.5")),
+        min_requests=int(os.getenv("LLM_BREAKER_MIN_REQUESTS", "10")),
+        window=float(os.getenv("LLM_BREAKER_WINDOW", "30")),
+        open_seconds=float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "15"))
+    )
@@ -0,0 +1,141 @@
+import bisect
+import difflib
+import json
+import logging
+import os
+import re
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Файл каталога по умолчанию
+SERVICE_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "services.json")
+
+# Минимальная длина префикса и порог похожести для нечеткого поиска
+MIN_PREFIX_LENGTH = 3
+FUZZY_CUTOFF = 0.8
+# Максимальная длина словосочетания в запросе, которое сверяется с индексом
+MAX_PHRASE_WORDS = 4
+
+# Слова, которые не отличают один сервис от другого
+_NOISE_WORDS = {"yandex", "яндекс", "managed", "service", "for", "сервис"}
+
+
+def normalize_name(text: str) -> str:
+    """
+    Нормализация названия для поиска: нижний регистр, ё -> е, без пунктуации
+
+    :param text: Название или фраза
+    :return: Нормализованная строка из слов через пробел
+    """
+    text = text.lower().replace("ё", "е")
+    words = re.findall(r"[a-zа-я0-9]+", text)
+    return " ".join(w for w in words if w not in _NOISE_WORDS)
+
+
+class ServiceCatalog:
+    def __init__(self, services: List[Dict]):
+        """
+        Локальный каталог сервисов Yandex Cloud
+
+        Индексирует нормализованные названия и синонимы (русские и английские),
+        поэтому типовые вопросы о сервисах не требуют обращения к модели.
+
+        :param services: Описания сервисов: name, aliases, description, features, use_cases
+        """
+        self.services = services
+        self._index: Dict[str, Dict] = {}
+        for service in services:
+            for name in [service["name"]] + service.get("aliases", []):
+                key = normalize_name(name)
+                if key:
+                    self._index.setdefault(key, service)
+        # Отсортированные ключи для поиска по префиксу
+        self._keys = sorted(self._index)
+
+    @classmethod
+    def load(cls, path: str = SERVICE_CATALOG_PATH) -> "ServiceCatalog":
+        """
+        Загрузка каталога из JSON файла
+
+        :param path: Путь к файлу каталога
+        :return: Каталог сервисов
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            catalog = cls(json.load(f))
+        logger.info(f"Каталог сервисов загружен: {len(catalog.services)} сервисов, {len(catalog._keys)} ключей")
+        return catalog
+
+    def _by_prefix(self, prefix: str) -> Optional[Dict]:
+        if len(prefix) < MIN_PREFIX_LENGTH:
+            return None
+        position = bisect.bisect_left(self._keys, prefix)
+        matches = set()
+        while position < len(self._keys) and self._keys[position].startswith(prefix):
+            matches.add(id(self._index[self._keys[position]]))
+            if len(matches) > 1:
+                # Префикс неоднозначен
+                return None
+            service = self._index[self._keys[position]]
+            position += 1
+        return service if matches else None
+
+    def _phrases(self, query: str) -> List[str]:
+        words = query.split()
+        phrases = []
+        for size in range(min(len(words), MAX_PHRASE_WORDS), 0, -1):
+            phrases += [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+        return phrases
+
+    def lookup(self, query: str) -> Optional[Dict]:
+        """
+        Поиск сервиса по названию или фразе, в которой оно встречается
+
+        Сначала точное совпадение всей фразы и ее частей (длинные раньше),
+        затем однозначный префикс и в конце нечеткое совпадение.
+
+        :param query: Текст запроса
+        :return: Описание сервиса или None
+        """
+        query = normalize_name(query)
+        if not query:
+            return None
+        phrases = self._phrases(query)
+
+        for phrase in phrases:
+            service = self._index.get(phrase)
+            if service is not None:
+                return service
+
+        for phrase in phrases:
+            service = self._by_prefix(phrase)
+            if service is not None:
+                return service
+
+        for phrase in phrases:
+            if len(phrase) < MIN_PREFIX_LENGTH:
+                continue
+            matches = difflib.get_close_matches(phrase, self._keys, n=1, cutoff=FUZZY_CUTOFF)
+            if matches:
+                return self._index[matches[0]]
+        return None
+
+
+def format_service(service: Dict) -> str:
+    """
+    Форматирование описания сервиса для Telegram
+
+    :param service: Описание сервиса из каталога
+    :return: Текст сообщения
+    """
+    lines = [f"📦 {service['name']}", "", f"📝 Описание: {service['description']}"]
+    if service.get("features"):
+        lines += ["", "✨ Возможности:"] + [f"• {f}" for f in service["features"]]
+    if service.get("use_cases"):
+        lines += ["", "🎯 Примеры использования:"] + [f"• {u}" for u in service["use_cases"]]
+    return "\n".join(lines)
+
+
+def create_service_catalog() -> ServiceCatalog:
+    """Загрузка каталога из файла SERVICE_CATALOG_PATH (переменная окружения)"""
+    return ServiceCatalog.load(os.getenv("SERVICE_CATALOG_PATH", SERVICE_CATALOG_PATH))
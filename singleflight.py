@@ -0,0 +1,158 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _Broadcast:
+    __slots__ = ("task", "value", "version", "done", "error", "changed", "subscribers")
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.value = None
+        self.version = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+
+    def _wake(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def publish(self, value):
+        self.value = value
+        self.version += 1
+        self._wake()
+
+    def finish(self, error: BaseException = None):
+        self.done = True
+        self.error = error
+        self._wake()
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Объединение одинаковых одновременных запросов
+
+        Пока запрос с некоторым ключом выполняется, остальные вызовы с тем же
+        ключом не запускают новый, а ждут результат уже идущего.
+        """
+        self._calls: Dict[Hashable, _Call] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self.started = 0  # сколько запросов реально ушло в апстрим
+        self.shared = 0  # сколько вызовов присоединилось к уже идущему запросу
+
+    @property
+    def in_flight(self) -> int:
+        """Количество выполняющихся сейчас уникальных запросов"""
+        return len(self._calls) + len(self._streams)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Выполнение запроса с объединением по ключу
+
+        Ошибка запроса передается всем ожидающим. Отмена одного ожидающего
+        не затрагивает остальных; сам запрос отменяется, только когда
+        его перестали ждать все.
+
+        :param key: Ключ запроса
+        :param fn: Фабрика корутины, выполняющей запрос
+        :return: Результат запроса
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.started += 1
+        else:
+            self.shared += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Новые вызовы не должны присоединяться к отменяемому запросу
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def stream(self, key: Hashable, factory: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        Потоковый запрос с объединением по ключу
+
+        Поток читает одна задача, независимо от скорости подписчиков. Каждый
+        подписчик получает последнее значение, промежуточные могут
+        пропускаться, поэтому способ подходит для потоков, где значение
+        заменяет предыдущее (накопленный текст ответа). Присоединившийся
+        позже сразу получает текущее значение. Ошибка потока передается всем
+        подписчикам; поток отменяется, когда ушли все подписчики.
+
+        :param key: Ключ запроса
+        :param factory: Фабрика асинхронного генератора, читающего апстрим
+        :return: Асинхронный генератор значений
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._pump(key, broadcast, factory))
+            self.started += 1
+        else:
+            self.shared += 1
+
+        broadcast.subscribers += 1
+        seen = 0
+        try:
+            while True:
+                if broadcast.version > seen:
+                    seen = broadcast.version
+                    yield broadcast.value
+                elif broadcast.done:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+                else:
+                    await broadcast.changed.wait()
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.task.done():
+                self._forget_stream(key, broadcast)
+                broadcast.task.cancel()
+
+    async def _pump(self, key: Hashable, broadcast: _Broadcast, factory: Callable[[], AsyncIterator[T]]):
+        try:
+            async for value in factory():
+                broadcast.publish(value)
+        except asyncio.CancelledError:
+            broadcast.finish(asyncio.CancelledError())
+            raise
+        except Exception as e:
+            broadcast.finish(e)
+        else:
+            broadcast.finish()
+        finally:
+            self._forget_stream(key, broadcast)
+
+    def _forget_stream(self, key: Hashable, broadcast: _Broadcast):
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
+
+    def stats(self) -> Dict:
+        """Счетчики объединения запросов"""
+        return {"in_flight": self.in_flight, "started": self.started, "shared": self.shared}
@@ -0,0 +1,90 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Dict, Generic, TypeVar
+
+T = TypeVar("T")
+
+# Признак еще не созданного компонента: фабрика может вернуть None, если компонент отключен
+_UNSET = object()
+
+# Время инициализации ленивых компонентов, сек
+init_timings: Dict[str, float] = {}
+
+
+class Lazy(Generic[T]):
+    def __init__(self, name: str, factory: Callable[[], T]):
+        """
+        Компонент, который создается при первом обращении
+
+        :param name: Имя компонента для отчета о времени запуска
+        :param factory: Функция, создающая компонент
+        """
+        self.name = name
+        self._factory = factory
+        self._value = _UNSET
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self) -> bool:
+        return self._value is not _UNSET
+
+    def get(self) -> T:
+        """Возвращает компонент, создавая его при первом вызове"""
+        if self._value is _UNSET:
+            with self._lock:
+                if self._value is _UNSET:
+                    started = time.perf_counter()
+                    self._value = self._factory()
+                    init_timings[self.name] = time.perf_counter() - started
+        return self._value
+
+
+def measure_import(module: str) -> float:
+    """
+    Время импорта модуля в чистом интерпретаторе
+
+    Импорт выполняется в отдельном процессе, чтобы уже загруженные
+    зависимости не искажали результат. Процесс запускается из каталога
+    бота, чтобы его модули находились при запуске из любого каталога.
+
+    :param module: Имя модуля
+    :return: Время импорта в секундах
+    """
+    code = (
+        "import time; started = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - started)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def format_report(imports: Dict[str, float], inits: Dict[str, float], errors: Dict[str, str],
+                  deferred: Dict[str, bool]) -> str:
+    """
+    Форматирование отчета о стоимости запуска
+
+    :param imports: Время импорта модулей
+    :param inits: Время инициализации компонентов
+    :param errors: Ошибки инициализации компонентов
+    :param deferred: Модули, которые не должны загружаться при импорте бота,
+        и были ли они все-таки загружены
+    :return: Текст отчета
+    """
+    lines = ["Импорт модулей (отдельный процесс):"]
+    lines += [f"  {name:<24} {seconds * 1000:8.1f} мс" for name, seconds in imports.items()]
+    lines.append("Инициализация компонентов:")
+    lines += [f"  {name:<24} {seconds * 1000:8.1f} мс" for name, seconds in inits.items()]
+    lines += [f"  {name:<24} ошибка: {error}" for name, error in errors.items()]
+    for module, loaded in deferred.items():
+        state = "загружен при импорте - регрессия!" if loaded else "отложен"
+        lines.append(f"Модуль {module}: {state}")
+    return "\n".join(lines)
@@ -0,0 +1,248 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+import sys
+from typing import Callable, Dict, List, Optional
+
+from telegram import Bot, Update
+from telegram.ext import Application, Updater
+
+from journal import JOURNAL_PATH
+
+logger = logging.getLogger(__name__)
+
+# Максимальный размер одного обновления в канале supervisor -> worker
+MAX_UPDATE_BYTES = 4 * 1024 * 1024
+# Сколько ждать воркеры сверх DRAIN_TIMEOUT, прежде чем завершить их принудительно
+KILL_GRACE = 10.0
+# Пауза перед перезапуском упавшего воркера
+RESTART_DELAY = 1.0
+
+
+def worker_path(path: str, index: int) -> str:
+    """
+    Отдельный файл для воркера: bot_debug.log -> bot_debug.w1.log
+
+    :param path: Путь из настроек; пустой путь и os.devnull не меняются
+    :param index: Номер воркера
+    """
+    if not path or path == os.devnull:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.w{index}{ext}"
+
+
+def worker_env(index: int) -> Dict[str, str]:
+    """
+    Переменные окружения воркера
+
+    Журнал, лог и порт метрик у каждого воркера свои: процессы не пишут
+    в общие файлы и не делят порт.
+    """
+    env = dict(os.environ)
+    env["BOT_WORKER_INDEX"] = str(index)
+    env["LOG_FILE"] = worker_path(os.getenv("LOG_FILE", "bot_debug.log"), index)
+    env["JOURNAL_PATH"] = worker_path(os.getenv("JOURNAL_PATH", JOURNAL_PATH), index)
+    metrics_port = int(os.getenv("METRICS_PORT", "9464"))
+    if metrics_port:
+        env["METRICS_PORT"] = str(metrics_port + index)
+    return env
+
+
+def shard_key(update: Update) -> int:
+    """Ключ шардирования: чат, иначе пользователь, иначе само обновление"""
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return update.update_id
+
+
+class Supervisor:
+    def __init__(self, bot: Bot, workers: int, command: List[str], drain_timeout: float = 30.0):
+        """
+        Прием обновлений и их раздача процессам-воркерам
+
+        Supervisor получает обновления (polling или webhook) и пересылает каждое
+        воркеру по хешу chat_id, поэтому обновления одного чата обрабатываются
+        одним процессом по порядку, а состояние чата (история, кэши) остается
+        в нем. Обновления передаются строками JSON через stdin воркера; закрытие
+        stdin означает, что воркер должен доделать начатое и завершиться.
+
+        :param bot: Бот для получения обновлений
+        :param workers: Число процессов-воркеров
+        :param command: Команда запуска воркера
+        :param drain_timeout: Сколько ждать завершения воркеров при остановке, сек
+        """
+        self.bot = bot
+        self.workers = workers
+        self.command = command
+        self.drain_timeout = drain_timeout
+
+        self._processes: List[Optional[asyncio.subprocess.Process]] = [None] * workers
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+        self.routed = [0] * workers
+        self.dropped = 0
+        self.restarts = 0
+
+    def shard(self, update: Update) -> int:
+        """Номер воркера для обновления"""
+        return shard_key(update) % self.workers
+
+    async def _spawn(self, index: int):
+        self._processes[index] = await asyncio.create_subprocess_exec(
+            *self.command, stdin=asyncio.subprocess.PIPE, env=worker_env(index)
+        )
+        logger.info(f"Воркер {index} запущен, PID {self._processes[index].pid}")
+
+    async def _watch(self, index: int):
+        """Перезапуск воркера, если он завершился не по команде supervisor"""
+        while True:
+            returncode = await self._processes[index].wait()
+            if self._stopping:
+                return
+            logger.error(f"Воркер {index} завершился с кодом {returncode}, перезапуск")
+            self.restarts += 1
+            await asyncio.sleep(RESTART_DELAY)
+            if self._stopping:
+                return
+            await self._spawn(index)
+
+    async def _feed(self, index: int):
+        """Передача обновлений воркеру; у каждого воркера своя очередь, медленный не задерживает остальных"""
+        queue = self._queues[index]
+        while True:
+            line = await queue.get()
+            process = self._processes[index]
+            if line is None:
+                if process.returncode is None and process.stdin.can_write_eof():
+                    process.stdin.write_eof()
+                return
+            try:
+                process.stdin.write(line)
+                await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                self.dropped += 1
+                logger.warning(f"Воркер {index} недоступен, обновление потеряно")
+
+    def dispatch(self, update: Update):
+        """Отправка обновления воркеру его чата; не блокирует"""
+        index = self.shard(update)
+        self.routed[index] += 1
+        self._queues[index].put_nowait(update.to_json().encode("utf-8") + b"\n")
+
+    async def _route(self, update_queue: asyncio.Queue):
+        while True:
+            update = await update_queue.get()
+            self.dispatch(update)
+            update_queue.task_done()
+
+    async def _drain_workers(self):
+        """Закрывает stdin воркеров и ждет, пока они обработают принятое"""
+        self._stopping = True
+        for queue in self._queues:
+            queue.put_nowait(None)
+        processes = [p for p in self._processes if p is not None]
+        try:
+            await asyncio.wait_for(asyncio.gather(*(p.wait() for p in processes)), self.drain_timeout + KILL_GRACE)
+        except asyncio.TimeoutError:
+            for index, process in enumerate(self._processes):
+                if process is not None and process.returncode is None:
+                    logger.error(f"Воркер {index} не завершился вовремя, принудительная остановка")
+                    process.kill()
+            await asyncio.gather(*(p.wait() for p in processes))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def run(self, webhook: Dict = None):
+        """
+        Запуск воркеров и прием обновлений до SIGINT/SIGTERM
+
+        :param webhook: Параметры Updater.start_webhook; без них используется polling
+        """
+        for index in range(self.workers):
+            self._queues.append(asyncio.Queue())
+            await self._spawn(index)
+            self._tasks.append(asyncio.ensure_future(self._feed(index)))
+            self._tasks.append(asyncio.ensure_future(self._watch(index)))
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        update_queue = asyncio.Queue()
+        updater = Updater(self.bot, update_queue)
+        router = asyncio.ensure_future(self._route(update_queue))
+        try:
+            async with updater:
+                if webhook is not None:
+                    await updater.start_webhook(**webhook)
+                else:
+                    await updater.start_polling()
+                logger.info(f"Supervisor запущен, воркеров: {self.workers}")
+                await stop.wait()
+                logger.info("Получен сигнал завершения, прием обновлений остановлен")
+                await updater.stop()
+                # Уже полученные обновления раздаются воркерам до закрытия их stdin
+                await update_queue.join()
+        finally:
+            router.cancel()
+            await asyncio.gather(router, return_exceptions=True)
+            await self._drain_workers()
+        logger.info(f"Supervisor остановлен: {self.stats()}")
+
+    def stats(self) -> Dict:
+        """Распределение обновлений по воркерам, потери и перезапуски"""
+        return {"routed": list(self.routed), "dropped": self.dropped, "restarts": self.restarts}
+
+
+async def serve_worker(application: Application, post_init: Callable, post_stop: Callable,
+                       post_shutdown: Callable):
+    """
+    Цикл воркера: обновления читаются строками JSON из stdin
+
+    Сигналы завершения воркер игнорирует: остановкой управляет supervisor,
+    закрывая stdin (это же происходит, если supervisor аварийно завершился).
+    После конца ввода обрабатываются все принятые обновления, затем
+    выполняется обычная остановка приложения.
+
+    :param application: Приложение бота без Updater
+    :param post_init: Инициализация компонентов бота
+    :param post_stop: Досылка начатой работы, пока бот еще открыт
+    :param post_shutdown: Освобождение компонентов бота
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=MAX_UPDATE_BYTES)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+    await application.initialize()
+    await post_init(application)
+    await application.start()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                update = Update.de_json(json.loads(line), application.bot)
+            except ValueError as e:
+                logger.error(f"Некорректное обновление от supervisor: {e}")
+                continue
+            await application.update_queue.put(update)
+    finally:
+        # stop() дожидается обработки всех обновлений из очереди
+        await application.stop()
+        await post_stop(application)
+        # Порядок тот же, что в run_polling: сначала закрывается бот, затем компоненты
+        await application.shutdown()
+        await post_shutdown(application)
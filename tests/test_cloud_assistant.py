@@ -0,0 +1,60 @@
+import asyncio
+import json
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cloud_assistant import DEGRADED_MESSAGE, CloudAssistant
+from conversation import ConversationStore
+from resilience import CircuitBreakers
+
+
+def make_assistant(handler):
+    return CloudAssistant(
+        "key", "folder",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        base_url="http://llm",
+        conversations=ConversationStore(),
+        breakers=CircuitBreakers(min_requests=1, open_seconds=60),
+    )
+
+
+def answer(text: str) -> dict:
+    return {"result": {"alternatives": [{"message": {"role": "assistant", "text": text}}]}}
+
+
+def test_degraded_answers_are_not_remembered():
+    status = [200]
+
+    def handler(request):
+        if status[0] != 200:
+            return httpx.Response(status[0], text="error")
+        if json.loads(request.content)["completionOptions"]["stream"]:
+            lines = [json.dumps(answer(text)) for text in ("Отв", "Ответ")]
+            return httpx.Response(200, text="\n".join(lines))
+        return httpx.Response(200, json=answer("Ответ"))
+
+    async def scenario():
+        assistant = make_assistant(handler)
+        assert await assistant.get_completion("вопрос 1", chat_id=1) == "Ответ"
+        # Подписчик потока может пропускать промежуточные фрагменты, но получает итоговый текст
+        assert [item async for item in assistant.stream_completion("вопрос 2", chat_id=1)][-1] == "Ответ"
+
+        # Ошибка апстрима открывает предохранитель, дальше отдаются деградированные ответы
+        status[0] = 500
+        for prompt in ("ошибка 1", "ошибка 2"):
+            await assistant.get_completion(prompt, chat_id=1)
+        assert assistant.breakers.stats()["yandexgpt-lite"]["state"] == "open"
+        assert await assistant.get_completion("вопрос 3", chat_id=1) == DEGRADED_MESSAGE
+        assert [item async for item in assistant.stream_completion("вопрос 4", chat_id=1)] == [DEGRADED_MESSAGE]
+        data = assistant.build_chat_request("вопрос 5", chat_id=1)
+        assert await assistant.request_completion(data, chat_id=1) == (DEGRADED_MESSAGE, False)
+
+        history = assistant.conversations.history(1)
+        assert [m["text"] for m in history] == ["вопрос 1", "Ответ", "вопрос 2", "Ответ"]
+        await assistant.aclose()
+
+    asyncio.run(scenario())
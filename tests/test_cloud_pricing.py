@@ -0,0 +1,87 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cloud_pricing import CloudPricing
+
+
+def test_batch_cost_matches_single_cost_on_every_row():
+    pricing = CloudPricing()
+    configs = [(1, 1, 0), (2, 4, 100), (16, 64, 500), (3, 7, 33), (96, 1536, 4096)]
+    cpu, ram, disk = zip(*configs)
+    for hours in (730, 1, 0):
+        batch = pricing.calculate_vm_cost_batch(cpu, ram, disk, hours)
+        for i, config in enumerate(configs):
+            single = pricing.calculate_vm_cost(*config, hours=hours)
+            assert batch["total"][i] == single["total"]
+            for column in ("cpu", "ram", "disk"):
+                assert batch[column][i] == single["details"][column]
+
+
+def test_batch_cost_broadcasts_scalars():
+    pricing = CloudPricing()
+    batch = pricing.calculate_vm_cost_batch([2, 4], 8, 100)
+    assert list(batch["total"]) == [
+        pricing.calculate_vm_cost(2, 8, 100)["total"],
+        pricing.calculate_vm_cost(4, 8, 100)["total"],
+    ]
+
+
+def _all_offers(pricing, kinds):
+    """Полный перебор предложений для сверки с подбором"""
+    offers = []
+    compute = pricing.prices["compute"]
+    if "vm" in kinds:
+        for cores in pricing.vm_cores_grid:
+            for per_core in pricing.vm_ram_per_core_grid:
+                ram = cores * per_core
+                offers.append(("vm", cores, ram, compute["cpu_hour"] * cores + compute["ram_gb_hour"] * ram))
+    if "postgresql" in kinds:
+        for tier, monthly in pricing.prices["database"]["postgresql"].items():
+            cores, ram = pricing.database_specs["postgresql"][tier]
+            offers.append(("postgresql", cores, ram, monthly / 730))
+    return offers
+
+
+def test_cheapest_configurations_respect_budget_and_pareto_front():
+    pricing = CloudPricing()
+    options = pricing.find_cheapest_configurations(min_cpu=4, min_ram=12, min_disk=50, budget=40000, limit=10)
+
+    assert options
+    costs = [option["monthly_cost"] for option in options]
+    assert costs == sorted(costs)
+    assert all(cost <= 40000 for cost in costs)
+    assert all(option["cpu"] >= 4 and option["ram"] >= 12 for option in options)
+    # Каждый следующий вариант дает больше CPU или RAM, чем все предыдущие
+    for i, option in enumerate(options):
+        for previous in options[:i]:
+            assert option["cpu"] > previous["cpu"] or option["ram"] > previous["ram"]
+
+    disk_cost = pricing.prices["compute"]["disk_gb_month"] * 50
+    cheapest = min(
+        rate * 730 + disk_cost
+        for kind, cpu, ram, rate in _all_offers(pricing, ("vm",))
+        if cpu >= 4 and ram >= 12
+    )
+    assert costs[0] == round(cheapest, 2)
+
+
+def test_cheapest_configurations_return_nothing_below_budget():
+    pricing = CloudPricing()
+    assert pricing.find_cheapest_configurations(min_cpu=2, min_ram=2, budget=1) == []
+
+
+def test_cheapest_configurations_exclude_postgresql_unless_requested():
+    pricing = CloudPricing()
+    default = pricing.find_cheapest_configurations(min_cpu=2, min_ram=8, limit=50)
+    assert {option["kind"] for option in default} == {"vm"}
+
+    with_db = pricing.find_cheapest_configurations(min_cpu=2, min_ram=8, kinds=("postgresql",), limit=50)
+    assert {option["kind"] for option in with_db} == {"postgresql"}
+    assert with_db[0]["monthly_cost"] == round(pricing.prices["database"]["postgresql"]["small"], 2)
+
+    mixed = pricing.find_cheapest_configurations(min_cpu=2, min_ram=8, kinds=None, limit=50)
+    expected = min(rate for kind, cpu, ram, rate in _all_offers(pricing, ("vm", "postgresql"))
+                   if cpu >= 2 and ram >= 8)
+    assert mixed[0]["monthly_cost"] == round(expected * 730, 2)
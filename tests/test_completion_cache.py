@@ -0,0 +1,42 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from completion_cache import CompletionCache
+
+
+def test_sqlite_writes_are_batched_and_flushed_on_close(tmp_path):
+    path = str(tmp_path / "cache.db")
+
+    async def fill():
+        cache = CompletionCache(max_entries=1, db_path=path)
+        for i in range(100):
+            cache.set(f"key-{i}", f"ответ {i}")
+        # Вытесненная из памяти запись доступна, даже если еще не записана
+        assert await cache.get("key-0") == "ответ 0"
+        assert await cache.get_stale("key-1") == "ответ 1"
+        cache.close()
+
+    async def reopen():
+        cache = CompletionCache(max_entries=1, db_path=path)
+        assert await cache.get("key-99") == "ответ 99"
+        assert await cache.get("key-50") == "ответ 50"
+        # Повторное чтение обслуживается из памяти
+        assert await cache.get("key-50") == "ответ 50"
+        assert (cache.stats()["disk_hits"], cache.stats()["hits"]) == (2, 1)
+        cache.close()
+
+    asyncio.run(fill())
+    asyncio.run(reopen())
+
+
+def test_memory_only_cache_expires_entries():
+    async def scenario():
+        cache = CompletionCache(max_entries=10, ttl=-1)
+        cache.set("key", "ответ")
+        assert await cache.get("key") is None
+        assert await cache.get_stale("key") == "ответ"
+
+    asyncio.run(scenario())
@@ -0,0 +1,58 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import conversation
+from conversation import ConversationStore, estimate_tokens
+
+# 29 символов - 10 токенов по грубой оценке
+TEXT = "x" * 29
+
+
+def test_history_fits_budget_and_starts_with_user_turn():
+    assert estimate_tokens(TEXT) == 10
+    store = ConversationStore(token_budget=35)
+    for i in range(3):
+        store.remember(1, f"{i}" + TEXT[1:], f"{i}" + TEXT[1:])
+
+    history = store.history(1)
+    # В бюджет влезают три последних сообщения, но первое из них - ответ без вопроса
+    assert [(m["role"], m["text"][0]) for m in history] == [("user", "2"), ("assistant", "2")]
+    assert len(store.history(1, budget=60)) == 6
+    assert store.history(1, budget=5) == []
+    assert store.history(2) == []
+
+
+def test_idle_chats_are_evicted_lru_first():
+    store = ConversationStore(max_chats=2)
+    store.remember(1, "вопрос", "ответ")
+    store.remember(2, "вопрос", "ответ")
+    store.history(1)
+    store.remember(3, "вопрос", "ответ")
+
+    assert store.history(2) == []
+    assert len(store.history(1)) == len(store.history(3)) == 2
+    assert store.stats()["evictions"] == 1
+
+
+def test_total_chars_limit_evicts_oldest_chats():
+    store = ConversationStore(max_total_chars=100, max_message_chars=30)
+    for chat_id in range(3):
+        store.remember(chat_id, "q" * 40, "a" * 40)
+
+    assert store.stats() == {"chats": 1, "total_chars": 60, "evictions": 2}
+    assert [m["text"] for m in store.history(2)] == ["q" * 30, "a" * 30]
+
+
+def test_history_expires_after_idle_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(conversation.time, "monotonic", lambda: now[0])
+    store = ConversationStore(idle_ttl=60)
+    store.remember(1, "вопрос", "ответ")
+
+    now[0] += 59
+    assert len(store.history(1)) == 2
+    now[0] += 61
+    assert store.history(1) == []
+    assert store.stats()["total_chars"] == 0
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cloud_pricing import CloudPricing
+from cost_report import GB, STATUS_RUNNING, CostReporter, format_cost_report, report_folders
+
+
+def vm(vm_id, cores, memory_gb, disk_ids, running=True, fraction=100):
+    return SimpleNamespace(
+        id=vm_id, name=f"name-{vm_id}", status=STATUS_RUNNING if running else 4,
+        resources=SimpleNamespace(cores=cores, core_fraction=fraction, memory=memory_gb * GB),
+        boot_disk=SimpleNamespace(disk_id=disk_ids[0]),
+        secondary_disks=[SimpleNamespace(disk_id=d) for d in disk_ids[1:]],
+    )
+
+
+def disk(disk_id, size_gb, attached=True):
+    return SimpleNamespace(id=disk_id, size=size_gb * GB, instance_ids=["vm"] if attached else [])
+
+
+class FakeClient:
+    def __init__(self, folders):
+        self.folders = folders
+        self.pages = []
+
+    async def _pages(self, items, page_size):
+        for i in range(0, len(items), page_size):
+            self.pages.append(page_size)
+            await asyncio.sleep(0)
+            yield items[i:i + page_size]
+
+    def iter_compute_instances_async(self, folder_id, page_size):
+        if folder_id not in self.folders:
+            raise PermissionError(f"нет доступа к {folder_id}")
+        return self._pages(self.folders[folder_id][0], page_size)
+
+    def iter_disks_async(self, folder_id, page_size):
+        return self._pages(self.folders.get(folder_id, ([], []))[1], page_size)
+
+
+FOLDERS = {
+    "f1": (
+        [vm("a", 2, 4, ["d1", "d2"]), vm("b", 4, 8, ["d3"]), vm("c", 2, 2, ["d4"], running=False)],
+        [disk("d1", 10), disk("d2", 20), disk("d3", 30), disk("d4", 40), disk("d5", 50, attached=False)],
+    ),
+    "f2": ([vm("e", 4, 4, ["d6"], fraction=50)], [disk("d6", 100)]),
+}
+
+
+def collect(reporter, folder_ids):
+    async def scenario():
+        return [result async for result in reporter.stream(folder_ids)]
+
+    return asyncio.run(scenario())
+
+
+def test_folder_costs_aggregate_across_pages():
+    pricing = CloudPricing()
+    client = FakeClient(FOLDERS)
+    results = {r.folder_id: r for r in collect(CostReporter(client, pricing, page_size=2), ["f1", "f2", "f1"])}
+
+    f1 = results["f1"]
+    assert (f1.instances, f1.running, f1.disks, f1.orphan_disks) == (3, 2, 5, 1)
+    expected = [pricing.calculate_vm_cost(2, 4, 30), pricing.calculate_vm_cost(4, 8, 30),
+                pricing.calculate_vm_cost(0, 0, 40, hours=0), pricing.calculate_vm_cost(0, 0, 50, hours=0)]
+    assert f1.cost["total"] == round(sum(c["total"] for c in expected), 2)
+    assert f1.orphan_cost == expected[3]["total"]
+    assert [vm_id for _, _, vm_id in f1.top] == ["b", "a", "c"]
+
+    # Доля ядра учитывается: 4 ядра по 50% стоят как 2
+    assert results["f2"].cost["total"] == pricing.calculate_vm_cost(2, 4, 100)["total"]
+    # Страницы по 2 объекта: 3 ВМ и 5 дисков f1, 1 ВМ и 1 диск f2
+    assert len(client.pages) == 2 + 3 + 1 + 1
+
+
+def test_report_sums_folders_and_keeps_errors():
+    results = collect(CostReporter(FakeClient(FOLDERS), CloudPricing(), concurrency=2), ["f1", "f2", "missing"])
+    assert len(results) == 3
+    missing = next(r for r in results if r.folder_id == "missing")
+    assert "нет доступа" in missing.error
+
+    total = sum(r.cost["total"] for r in results if r.error is None)
+    report = format_cost_report(results, folders=3)
+    assert report.startswith("💰 Стоимость ресурсов")
+    assert f"Итого: {total:.2f} ₽/мес" in report
+    assert "ВМ: 4 (запущено 3), дисков: 6" in report
+    assert "Неподключенных дисков: 1" in report
+    assert "• missing: ошибка - нет доступа к missing" in report
+
+    partial = format_cost_report(results[:1], folders=3)
+    assert partial.startswith("⏳ Посчитано каталогов: 1 из 3")
+
+
+def test_report_folders_prefers_arguments(monkeypatch):
+    monkeypatch.setenv("COST_REPORT_FOLDERS", "x, y")
+    assert report_folders(["a,b", "a"], "default") == ["a", "b"]
+    assert report_folders([], "default") == ["x", "y"]
+    monkeypatch.delenv("COST_REPORT_FOLDERS")
+    assert report_folders([], "default") == ["default"]
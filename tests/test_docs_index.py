@@ -0,0 +1,75 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docs_index import DocsIndex, build_index, chunk_mdx, tokenize
+
+PAGES = {
+    "compute/vm-create.mdx": (
+        "---\ntitle: Создание виртуальной машины\n---\n\n"
+        "# Создание виртуальной машины\n\n"
+        "Чтобы создать виртуальную машину, выберите образ, зону доступности и количество vCPU.\n\n"
+        "## Диски\n\n"
+        "К виртуальной машине можно подключить загрузочный диск и дополнительные сетевые диски.\n"
+    ),
+    "storage/bucket.mdx": (
+        "---\ntitle: Бакеты\n---\n\n"
+        "Бакет хранит объекты Object Storage. Имя бакета уникально во всем облаке.\n\n"
+        "<Note>Бакет нельзя переименовать после создания.</Note>\n"
+    ),
+    "functions/trigger.mdx": (
+        "---\ntitle: Триггеры\n---\n\n"
+        "Триггер вызывает облачную функцию по расписанию или при появлении объекта в бакете.\n"
+    ),
+}
+
+
+def build(tmp_path):
+    docs = tmp_path / "docs"
+    for name, text in PAGES.items():
+        page = docs / name
+        page.parent.mkdir(parents=True, exist_ok=True)
+        page.write_text(text, encoding="utf-8")
+    path = str(tmp_path / "index.bin")
+    stats = build_index(str(docs), path)
+    return DocsIndex(path), stats
+
+
+def test_tokenize_drops_stop_words_and_truncates():
+    assert tokenize("Создание виртуальной машины и ВМ в облаке") == ["создан", "виртуа", "машины", "вм", "облаке"]
+
+
+def test_chunk_mdx_uses_titles_and_strips_tags():
+    passages = chunk_mdx(PAGES["compute/vm-create.mdx"], "compute/vm-create.mdx")
+    assert [p["title"] for p in passages] == ["Создание виртуальной машины", "Создание виртуальной машины / Диски"]
+    bucket = chunk_mdx(PAGES["storage/bucket.mdx"], "storage/bucket.mdx")
+    assert "<Note>" not in bucket[0]["text"]
+
+
+def test_search_ranks_passages_by_relevance(tmp_path):
+    index, stats = build(tmp_path)
+    try:
+        assert stats["passages"] == len(index) == 4
+
+        results = index.search("как подключить диск к виртуальной машине", k=4)
+        assert results[0]["title"] == "Создание виртуальной машины / Диски"
+        assert results[1]["source"] == "compute/vm-create.mdx"
+        assert [r["score"] for r in results] == sorted((r["score"] for r in results), reverse=True)
+
+        assert [r["source"] for r in index.search("переименовать бакет", k=2)][0] == "storage/bucket.mdx"
+        assert index.search("kubernetes") == []
+        assert index.search("бакет", min_score=100.0) == []
+    finally:
+        index.close()
+
+
+def test_context_for_uses_top_k(tmp_path):
+    index, _ = build(tmp_path)
+    index.top_k, index.min_score = 1, 0.0
+    try:
+        context = index.context_for("триггер функции по расписанию")
+        assert context.startswith("[Триггеры]\n")
+        assert context.count("[") == 1
+    finally:
+        index.close()
@@ -0,0 +1,67 @@
+import asyncio
+import gzip
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from journal import JOURNAL_PATH, RequestJournal, create_request_journal
+
+
+def read_lines(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_journal_rotates_and_gzips_backups(tmp_path):
+    path = str(tmp_path / "logs" / "journal.jsonl")
+
+    async def scenario():
+        journal = RequestJournal(path, max_bytes=200, backup_count=2, compress=True)
+        for i in range(6):
+            # Каждая пачка больше max_bytes, поэтому после нее файл ротируется
+            for j in range(5):
+                journal.write({"request_id": f"{i}-{j}", "body": "x" * 20})
+            await journal.flush()
+        await journal.stop()
+        return journal
+
+    journal = asyncio.run(scenario())
+
+    assert journal.stats() == {"written": 30, "dropped": 0, "buffered": 0}
+    assert sorted(os.listdir(tmp_path / "logs")) == ["journal.jsonl.1.gz", "journal.jsonl.2.gz"]
+    # Свежий архив - последняя пачка, старые сверх backup_count удалены
+    assert [r["request_id"] for r in read_lines(path + ".1.gz")] == [f"5-{j}" for j in range(5)]
+    assert [r["request_id"] for r in read_lines(path + ".2.gz")] == [f"4-{j}" for j in range(5)]
+
+
+def test_journal_without_compression_keeps_plain_backups(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+
+    async def scenario():
+        journal = RequestJournal(path, max_bytes=10_000, backup_count=1)
+        journal.write({"request_id": "1"})
+        await journal.flush()
+        journal.max_bytes = 1
+        journal.write({"request_id": "2"})
+        await journal.stop()
+
+    asyncio.run(scenario())
+    assert sorted(os.listdir(tmp_path)) == ["journal.jsonl.1"]
+    assert [r["request_id"] for r in read_lines(path + ".1")] == ["1", "2"]
+
+
+def test_journal_drops_records_over_buffer_limit(tmp_path):
+    journal = RequestJournal(str(tmp_path / "journal.jsonl"), max_buffer=2)
+    for i in range(5):
+        journal.write({"request_id": str(i)})
+    assert journal.stats() == {"written": 0, "dropped": 3, "buffered": 2}
+
+
+def test_default_path_does_not_clash_with_project_files(monkeypatch):
+    monkeypatch.delenv("JOURNAL_PATH", raising=False)
+    assert create_request_journal().path == JOURNAL_PATH == os.path.join("logs", "requests_journal.jsonl")
+    monkeypatch.setenv("JOURNAL_PATH", "")
+    assert create_request_journal() is None
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_scheduler import LLMScheduler, UpstreamThrottled
+
+
+def test_waiter_cancelled_during_release_passes_slot_on():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot():
+                await release.wait()
+
+        first = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        cancelled = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        # Слот освобождается в том же шаге цикла, в котором отменяется ожидающий
+        release.set()
+        cancelled.cancel()
+        results = await asyncio.gather(first, cancelled, return_exceptions=True)
+        assert results[0] is None
+        assert isinstance(results[1], asyncio.CancelledError)
+        assert scheduler.stats()["active"] == 0
+        assert scheduler.queue_depth == 0
+
+        await asyncio.wait_for(hold(), 1)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_is_skipped_in_favour_of_next():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1)
+        release = asyncio.Event()
+        served = []
+
+        async def hold(name):
+            async with scheduler.slot():
+                served.append(name)
+                await release.wait()
+
+        first = asyncio.ensure_future(hold("first"))
+        await asyncio.sleep(0)
+        cancelled = asyncio.ensure_future(hold("cancelled"))
+        last = asyncio.ensure_future(hold("last"))
+        await asyncio.sleep(0)
+        release.set()
+        cancelled.cancel()
+        await asyncio.wait_for(asyncio.gather(first, cancelled, last, return_exceptions=True), 1)
+        assert served == ["first", "last"]
+        assert scheduler.stats()["active"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_backoff_counts_retries_and_gives_up():
+    async def scenario():
+        scheduler = LLMScheduler(max_retries=2, base_delay=0.001, max_delay=0.001)
+        calls = []
+
+        async def throttled():
+            calls.append(1)
+            raise UpstreamThrottled(429, None)
+
+        try:
+            await scheduler.run(throttled)
+        except UpstreamThrottled:
+            pass
+        else:
+            raise AssertionError("ожидалась UpstreamThrottled")
+        assert len(calls) == 3
+        stats = scheduler.stats()
+        assert (stats["throttled"], stats["retries"]) == (3, 2)
+
+    asyncio.run(scenario())
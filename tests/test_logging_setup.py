@@ -0,0 +1,51 @@
+import logging
+import os
+import queue
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logging_setup import LOG_DROPPED, DroppingQueueHandler, RedactingFilter
+from metrics import total
+
+
+def make_logger(name, handler):
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.handlers = [handler]
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def test_dropped_records_are_counted_and_reported():
+    records = queue.Queue(maxsize=1)
+    handler = DroppingQueueHandler(records)
+    logger = make_logger("test_dropping", handler)
+    dropped_before = total(LOG_DROPPED)
+
+    for i in range(3):
+        logger.info(f"запись {i}")
+    assert handler.dropped == 2
+    assert total(LOG_DROPPED) == dropped_before + 2
+    assert records.get_nowait().getMessage() == "запись 0"
+
+    logger.info("запись 3")
+    assert records.get_nowait().getMessage() == "запись 3 (очередь лога была переполнена, потеряно записей: 2)"
+    logger.info("запись 4")
+    assert records.get_nowait().getMessage() == "запись 4"
+
+
+def test_secret_added_after_setup_is_redacted():
+    records = queue.Queue()
+    handler = DroppingQueueHandler(records)
+    redactor = RedactingFilter(["short", None, "Api-Key-value-123"])
+    handler.addFilter(redactor)
+    logger = make_logger("test_redacting", handler)
+
+    generated = "generated-webhook-secret"
+    redactor.add(generated)
+    logger.info(f"secret={generated} key=Api-Key-value-123 short")
+    message = records.get_nowait().getMessage()
+    assert generated not in message and "Api-Key-value-123" not in message
+    # Короткие строки не скрываются, чтобы не портить обычный текст
+    assert message.endswith("short")
@@ -0,0 +1,60 @@
+import asyncio
+import os
+import socket
+import sys
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import HANDLER_ERRORS, MetricsServer, instrument_handler, total
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_instrumented_handler_is_exported_on_metrics_endpoint():
+    async def ok(update, context):
+        return "ok"
+
+    async def broken(update, context):
+        raise RuntimeError("boom")
+
+    async def scenario():
+        errors_before = total(HANDLER_ERRORS)
+        assert await instrument_handler("test_ok", ok)(None, None) == "ok"
+        with pytest.raises(RuntimeError):
+            await instrument_handler("test_broken", broken)(None, None)
+        assert total(HANDLER_ERRORS) == errors_before + 1
+
+        server = MetricsServer(port=free_port())
+        await server.start()
+        try:
+            async with httpx.AsyncClient() as client:
+                response = await client.get(f"http://127.0.0.1:{server.port}/metrics")
+        finally:
+            await server.stop()
+        assert response.status_code == 200
+        assert 'bot_handler_errors_total{handler="test_broken"} 1.0' in response.text
+        assert 'bot_handler_duration_seconds_count{handler="test_ok"} 1.0' in response.text
+        assert 'bot_handler_duration_seconds_bucket{handler="test_ok",le="30.0"} 1.0' in response.text
+        assert 'bot_handler_in_flight{handler="test_ok"} 0.0' in response.text
+
+    asyncio.run(scenario())
+
+
+def test_busy_port_raises_os_error():
+    async def scenario():
+        first = MetricsServer(port=free_port())
+        await first.start()
+        try:
+            with pytest.raises(OSError):
+                await MetricsServer(port=first.port).start()
+        finally:
+            await first.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,47 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_router import TIER_FAST, TIER_LARGE, ModelRouter, create_model_router
+
+
+def test_score_counts_length_keywords_code_and_questions():
+    short = ModelRouter(long_prompt_chars=30)
+    assert short.score("привет") == 0
+    assert short.score("x" * 10) == 1
+    assert short.score("x" * 30) == 2
+
+    router = ModelRouter(long_prompt_chars=300)
+    # Ключевые слова дают не больше MAX_KEYWORD_SCORE баллов
+    assert router.score("почему ошибка, не работает, падает") == 2
+    assert router.score("```print()```") == 1
+    assert router.score("что? где?") == 1
+
+
+def test_route_switches_tier_at_threshold():
+    router = ModelRouter(fast_model="lite", large_model="pro", fast_max_tokens=500, large_max_tokens=1500,
+                         threshold=2)
+    below = router.route("почему так")
+    assert (below.tier, below.model, below.max_tokens, below.reason) == (TIER_FAST, "lite", 500, "score")
+    at = router.route("почему ошибка")
+    assert (at.tier, at.model, at.max_tokens, at.reason) == (TIER_LARGE, "pro", 1500, "score")
+
+    assert ModelRouter(threshold=1).route("почему так").tier == TIER_LARGE
+
+
+def test_route_sends_heavy_roles_to_large_model():
+    router = ModelRouter()
+    assert router.route("привет", role="diagnostics").reason == "role"
+    assert router.route("привет", role="optimization").tier == TIER_LARGE
+    assert router.route("привет", role="default").tier == TIER_FAST
+
+
+def test_fast_tier_keeps_baseline_max_tokens(monkeypatch):
+    for name in ("LLM_ROUTING", "LLM_FAST_MAX_TOKENS", "LLM_LARGE_MAX_TOKENS"):
+        monkeypatch.delenv(name, raising=False)
+    router = create_model_router()
+    assert router.fast == ("yandexgpt-lite", 2000)
+    assert router.large == ("yandexgpt", 2000)
+    monkeypatch.setenv("LLM_ROUTING", "false")
+    assert create_model_router() is None
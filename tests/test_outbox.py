@@ -0,0 +1,103 @@
+import asyncio
+import inspect
+import os
+import sys
+import time
+
+from telegram.error import RetryAfter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from outbox import Outbox, is_plain_message
+
+
+def test_no_pacing_until_retry_after():
+    async def scenario():
+        outbox = Outbox(chat_rate=1, chat_burst=1)
+        sent = []
+
+        async def deliver(text):
+            sent.append(text)
+            return text
+
+        started = time.monotonic()
+        for i in range(10):
+            await outbox.send(1, f"m{i}", deliver)
+        assert time.monotonic() - started < 0.5
+        assert sent == [f"m{i}" for i in range(10)]
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_pauses_chat_and_keeps_order():
+    async def scenario():
+        outbox = Outbox(chat_rate=20, chat_burst=1)
+        sent = []
+        refusals = [RetryAfter(1)]
+
+        async def deliver(text):
+            if refusals:
+                raise refusals.pop()
+            sent.append((text, time.monotonic()))
+            return text
+
+        async def other(text):
+            sent.append((text, time.monotonic()))
+            return text
+
+        started = time.monotonic()
+        results = await asyncio.gather(
+            outbox.send(1, "первое", deliver, coalesce=False),
+            outbox.send(1, "второе", deliver, coalesce=False),
+            outbox.send(2, "другой чат", other),
+        )
+        assert results == ["первое", "второе", "другой чат"]
+        order = [text for text, _ in sent]
+        assert order.index("первое") < order.index("второе")
+        # Другой чат паузу не ждет
+        assert dict(sent)["другой чат"] - started < 0.5
+        assert dict(sent)["первое"] - started >= 1
+        assert outbox.stats()["retry_after"] == 1
+        assert outbox.stats()["throttled_chats"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_message_does_not_use_chat_token():
+    async def scenario():
+        outbox = Outbox(chat_rate=2, chat_burst=1)
+        outbox._throttle(1, 0)
+        sent = []
+
+        async def deliver(text):
+            sent.append(text)
+            return text
+
+        cancelled = asyncio.ensure_future(outbox.send(1, "отменено", deliver, coalesce=False))
+        kept = asyncio.ensure_future(outbox.send(1, "отправлено", deliver, coalesce=False))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        started = time.monotonic()
+        assert await kept == "отправлено"
+        assert sent == ["отправлено"]
+        # Токен взят одним сообщением: ожидание не больше одного интервала
+        assert time.monotonic() - started < 0.75
+
+    asyncio.run(scenario())
+
+
+def test_plain_message_is_decided_by_explicit_arguments():
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+    from telegram.constants import ParseMode
+    from telegram.ext import ExtBot
+
+    # Так PTB передает незаданные аргументы при вызове Message.reply_text
+    defaults = {name: param.default for name, param in inspect.signature(ExtBot.send_message).parameters.items()
+                if name not in ("self", "chat_id", "text")}
+    assert is_plain_message(defaults)
+    assert is_plain_message({"parse_mode": None, "reply_markup": None, "disable_notification": False})
+
+    keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("ok", callback_data="ok")]])
+    for kwargs in ({"parse_mode": ParseMode.HTML}, {"reply_markup": keyboard}, {"reply_to_message_id": 1},
+                   {"disable_notification": True}):
+        assert not is_plain_message({**defaults, **kwargs})
@@ -0,0 +1,170 @@
+import asyncio
+import os
+import sys
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import resilience
+from llm_scheduler import LLMScheduler
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, Hedger
+
+
+def upstream_error(status: int = 503) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://llm")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status, request=request))
+
+
+def fail(breaker, error):
+    with pytest.raises(type(error)):
+        with breaker.call():
+            raise error
+
+
+def test_breaker_goes_closed_open_half_open_closed(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker("model", failure_ratio=0.5, min_requests=4, window=30, open_seconds=10)
+
+    with breaker.call():
+        pass
+    # 4xx - ошибка запроса, а не апстрима, предохранитель не открывает
+    fail(breaker, upstream_error(400))
+    fail(breaker, upstream_error(503))
+    assert breaker.state == CLOSED
+    fail(breaker, httpx.ConnectError("refused"))
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpen) as rejected:
+        breaker.check()
+    assert rejected.value.retry_after == 10
+    now[0] += 10
+
+    # Пробный запрос пропускается только один
+    with breaker.call():
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(CircuitOpen):
+            breaker.check()
+    assert breaker.state == CLOSED
+    assert breaker.stats() == {"state": CLOSED, "opened": 1, "rejected": 2}
+
+
+def test_failed_probe_reopens_breaker(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker("model", min_requests=1, open_seconds=5)
+    fail(breaker, upstream_error())
+    now[0] += 5
+    fail(breaker, upstream_error())
+    assert (breaker.state, breaker.opened, breaker.retry_after()) == (OPEN, 2, 5)
+
+
+def test_old_failures_leave_the_window(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker("model", min_requests=2, window=30)
+    fail(breaker, upstream_error())
+    now[0] += 31
+    with breaker.call():
+        pass
+    assert breaker.state == CLOSED
+
+
+def test_hedger_returns_fastest_attempt_and_cancels_loser():
+    async def scenario():
+        hedger = Hedger(initial_delay=0.01)
+        started, cancelled = [], []
+
+        async def request():
+            index = len(started)
+            started.append(index)
+            try:
+                await asyncio.sleep(1.0 if index == 0 else 0.01)
+            except asyncio.CancelledError:
+                cancelled.append(index)
+                raise
+            return index
+
+        assert await hedger.run(request, key="model") == 1
+        assert cancelled == [0]
+        assert hedger.stats()["hedged"] == hedger.stats()["hedge_wins"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_hedger_does_not_hedge_fast_requests():
+    async def scenario():
+        hedger = Hedger(initial_delay=1.0)
+        calls = []
+
+        async def request():
+            calls.append(1)
+            return "ok"
+
+        assert await hedger.run(request) == "ok"
+        assert (len(calls), hedger.hedged) == (1, 0)
+
+    asyncio.run(scenario())
+
+
+def test_hedger_stream_reads_winner_and_cancels_loser():
+    async def scenario():
+        hedger = Hedger(initial_delay=0.01)
+        started, closed = [], []
+
+        async def stream():
+            index = len(started)
+            started.append(index)
+            try:
+                await asyncio.sleep(1.0 if index == 0 else 0.01)
+                for part in ("a", "b"):
+                    yield f"{index}{part}"
+            finally:
+                closed.append(index)
+
+        assert [item async for item in hedger.stream(stream, key="model")] == ["1a", "1b"]
+        assert sorted(closed) == [0, 1]
+        assert hedger.stats()["hedge_wins"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_hedge_takes_its_own_scheduler_slot():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=2)
+        hedger = Hedger(initial_delay=0.01)
+        active = []
+
+        async def request():
+            active.append(scheduler.stats()["active"])
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        async with scheduler.slot():
+            assert await hedger.run(request, scheduler=scheduler) == "ok"
+        # Дубль занял второй слот и вернул его после завершения
+        assert active == [1, 2]
+        assert (hedger.hedged, hedger.no_slot, scheduler.stats()["active"]) == (1, 0, 0)
+
+    asyncio.run(scenario())
+
+
+def test_no_hedge_without_free_slot():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1)
+        hedger = Hedger(initial_delay=0.01)
+        calls = []
+
+        async def request():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            yield "ok"
+
+        async with scheduler.slot():
+            assert [item async for item in hedger.stream(request, scheduler=scheduler)] == ["ok"]
+        assert (len(calls), hedger.hedged, hedger.no_slot) == (1, 0, 1)
+        assert scheduler.stats()["active"] == 0
+
+    asyncio.run(scenario())
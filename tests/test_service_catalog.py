@@ -0,0 +1,51 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service_catalog import ServiceCatalog, normalize_name
+
+SERVICES = [
+    {"name": "Compute Cloud", "aliases": ["виртуальные машины", "vm"], "description": "ВМ"},
+    {"name": "Managed Service for PostgreSQL", "aliases": ["postgres", "постгрес"], "description": "БД"},
+    {"name": "Managed Service for MySQL", "aliases": ["mysql"], "description": "БД"},
+    {"name": "Cloud Functions", "aliases": ["функции"], "description": "FaaS"},
+    {"name": "Cloud Logging", "aliases": [], "description": "Логи"},
+]
+
+
+def names(catalog, *queries):
+    return [(catalog.lookup(q) or {}).get("name") for q in queries]
+
+
+def test_normalize_name_drops_noise_and_punctuation():
+    assert normalize_name("Yandex Managed Service for PostgreSQL!") == "postgresql"
+    assert normalize_name("Ёмкость  хранилища") == "емкость хранилища"
+
+
+def test_lookup_exact_name_and_alias_inside_phrase():
+    catalog = ServiceCatalog(SERVICES)
+    assert names(catalog, "Compute Cloud", "сколько стоят виртуальные машины?", "Расскажи про MySQL") == [
+        "Compute Cloud", "Compute Cloud", "Managed Service for MySQL",
+    ]
+
+
+def test_lookup_unambiguous_prefix_only():
+    catalog = ServiceCatalog(SERVICES)
+    assert names(catalog, "postgr", "функц") == ["Managed Service for PostgreSQL", "Cloud Functions"]
+    # "cl" слишком короткий, "cloud" - общий префикс Cloud Functions и Cloud Logging
+    assert catalog.lookup("cl") is None
+    assert catalog.lookup("cloud") is None
+
+
+def test_lookup_fuzzy_match_and_miss():
+    catalog = ServiceCatalog(SERVICES)
+    assert names(catalog, "что такое posgresql", "mysqk") == [
+        "Managed Service for PostgreSQL", "Managed Service for MySQL",
+    ]
+    assert catalog.lookup("погода в москве") is None
+
+
+def test_bundled_catalog_loads():
+    catalog = ServiceCatalog.load()
+    assert catalog.lookup("кубер")["name"] == "Managed Service for Kubernetes"
@@ -0,0 +1,78 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_streams_share_one_upstream():
+    async def scenario():
+        flight = SingleFlight()
+        started = []
+
+        async def upstream():
+            started.append(1)
+            text = ""
+            for word in ("один", "два", "три"):
+                await asyncio.sleep(0.01)
+                text += word
+                yield text
+
+        async def consume(delay):
+            last = None
+            async for text in flight.stream("key", upstream):
+                last = text
+                await asyncio.sleep(delay)
+            return last
+
+        # Медленный подписчик не задерживает поток и получает итоговый текст
+        results = await asyncio.gather(consume(0), consume(0.05), consume(0))
+        assert results == ["одиндватри"] * 3
+        assert len(started) == 1
+        assert flight.stats() == {"in_flight": 0, "started": 1, "shared": 2}
+
+    asyncio.run(scenario())
+
+
+def test_stream_error_reaches_every_subscriber():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def upstream():
+            await asyncio.sleep(0.01)
+            yield "частично"
+            raise RuntimeError("обрыв")
+
+        async def consume():
+            async for _ in flight.stream("key", upstream):
+                pass
+
+        results = await asyncio.gather(consume(), consume(), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert flight.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_stream_cancelled_when_all_subscribers_leave():
+    async def scenario():
+        flight = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def upstream():
+            try:
+                yield "начало"
+                await asyncio.sleep(10)
+                yield "конец"
+            finally:
+                cancelled.set()
+
+        stream = flight.stream("key", upstream)
+        assert await stream.__anext__() == "начало"
+        await stream.aclose()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        assert flight.in_flight == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from startup_profile import Lazy, measure_import
+
+
+def test_measure_import_works_outside_bot_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert measure_import("startup_profile") >= 0
+
+
+def test_profile_startup_runs_from_another_directory(tmp_path):
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "bot.py"), "--profile-startup"],
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    assert "Импорт модулей (отдельный процесс):" in result.stdout
+    assert "Модуль yandexcloud: отложен" in result.stdout
+
+
+def test_lazy_creates_disabled_component_once():
+    calls = []
+    component = Lazy("disabled", lambda: calls.append(1))
+    assert not component.initialized
+    assert component.get() is None
+    assert component.get() is None
+    assert component.initialized
+    assert calls == [1]
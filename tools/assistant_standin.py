@@ -0,0 +1,298 @@
+"""
+Локальная заглушка Assistant API (gRPC) для проверки assistant_api.py без сети
+
+Реализует AssistantService (Create/Get/Update/Delete/List/ListVersions),
+ThreadService.Create и RunService.Create/Listen/Get в памяти процесса.
+Ответ запуска строится из инструкции ассистента и текста запроса, поэтому
+видно, что системный промпт хранится на сервере, а не приходит в запросе.
+
+Пример:
+    python tools/assistant_standin.py --port 18083 --latency 0.3
+    ASSISTANT_API=true YANDEX_ASSISTANT_ENDPOINT=127.0.0.1:18083 YANDEX_ASSISTANT_INSECURE=true python bot.py
+
+    python tools/assistant_standin.py --check   # прогон клиента против заглушки
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import threading
+import time
+from concurrent import futures
+
+import grpc
+from google.protobuf import timestamp_pb2
+from yandex.cloud.ai.assistants.v1 import assistant_pb2, assistant_service_pb2, assistant_service_pb2_grpc
+from yandex.cloud.ai.assistants.v1.runs import run_pb2, run_service_pb2, run_service_pb2_grpc
+from yandex.cloud.ai.assistants.v1.threads import message_pb2, thread_pb2, thread_service_pb2_grpc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _now() -> timestamp_pb2.Timestamp:
+    stamp = timestamp_pb2.Timestamp()
+    stamp.GetCurrentTime()
+    return stamp
+
+
+class AssistantStandIn:
+    def __init__(self, host: str = "127.0.0.1", port: int = 18083, latency: float = 0.1, chunks: int = 3):
+        """
+        Заглушка Assistant API
+
+        :param host: Адрес для прослушивания
+        :param port: Порт для прослушивания
+        :param latency: Время генерации ответа запуска, сек
+        :param chunks: Сколько частичных сообщений отдает Listen до DONE
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.chunks = max(1, chunks)
+        self.assistants = {}  # ID -> Assistant
+        self.versions = {}  # ID ассистента -> [AssistantVersion]
+        self.threads = {}  # ID -> Thread
+        self.runs = {}  # ID -> (Run, текст запроса)
+        self.calls = {}  # метод -> число вызовов
+        self.request_bytes = {}  # метод -> суммарный размер запросов
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def endpoint(self) -> str:
+        """Значение для YANDEX_ASSISTANT_ENDPOINT"""
+        return f"{self.host}:{self.port}"
+
+    def _count(self, method: str, request, context):
+        if not dict(context.invocation_metadata()).get("authorization", "").startswith("Api-Key "):
+            context.abort(grpc.StatusCode.UNAUTHENTICATED, "no api key")
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            self.request_bytes[method] = self.request_bytes.get(method, 0) + request.ByteSize()
+
+    def _new_id(self, prefix: str) -> str:
+        return f"{prefix}{next(self._ids):06d}"
+
+    def _page(self, items: list, request):
+        start = int(request.page_token or 0)
+        size = request.page_size or 100
+        next_token = str(start + size) if start + size < len(items) else ""
+        return items[start:start + size], next_token
+
+    def _answer(self, assistant, prompt: str) -> str:
+        return f"[{assistant.name}] Ответ на: {prompt}"
+
+    def start(self):
+        """Запускает gRPC сервер в пуле потоков"""
+        standin = self
+
+        class Assistants(assistant_service_pb2_grpc.AssistantServiceServicer):
+            def Create(self, request, context):
+                standin._count("AssistantService.Create", request, context)
+                assistant = assistant_pb2.Assistant(
+                    id=standin._new_id("asst"), folder_id=request.folder_id, name=request.name,
+                    description=request.description, labels=dict(request.labels), model_uri=request.model_uri,
+                    instruction=request.instruction, completion_options=request.completion_options,
+                    created_at=_now(), updated_at=_now()
+                )
+                with standin._lock:
+                    standin.assistants[assistant.id] = assistant
+                    standin.versions[assistant.id] = [assistant_service_pb2.AssistantVersion(
+                        id=standin._new_id("ver"), assistant=assistant
+                    )]
+                return assistant
+
+            def Get(self, request, context):
+                standin._count("AssistantService.Get", request, context)
+                if request.assistant_id not in standin.assistants:
+                    context.abort(grpc.StatusCode.NOT_FOUND, "assistant not found")
+                return standin.assistants[request.assistant_id]
+
+            def Update(self, request, context):
+                standin._count("AssistantService.Update", request, context)
+                assistant = standin.assistants.get(request.assistant_id)
+                if assistant is None:
+                    context.abort(grpc.StatusCode.NOT_FOUND, "assistant not found")
+                updated = assistant_pb2.Assistant()
+                updated.CopyFrom(assistant)
+                for path in request.update_mask.paths:
+                    if path in ("labels",):
+                        updated.labels.clear()
+                        updated.labels.update(request.labels)
+                    elif path in ("completion_options", "prompt_truncation_options", "expiration_config"):
+                        getattr(updated, path).CopyFrom(getattr(request, path))
+                    else:
+                        setattr(updated, path, getattr(request, path))
+                updated.updated_at.CopyFrom(_now())
+                with standin._lock:
+                    standin.assistants[updated.id] = updated
+                    standin.versions[updated.id].append(assistant_service_pb2.AssistantVersion(
+                        id=standin._new_id("ver"), update_mask=request.update_mask, assistant=updated
+                    ))
+                return updated
+
+            def Delete(self, request, context):
+                standin._count("AssistantService.Delete", request, context)
+                with standin._lock:
+                    standin.assistants.pop(request.assistant_id, None)
+                    standin.versions.pop(request.assistant_id, None)
+                return assistant_service_pb2.DeleteAssistantResponse()
+
+            def List(self, request, context):
+                standin._count("AssistantService.List", request, context)
+                items = [a for a in standin.assistants.values() if a.folder_id == request.folder_id]
+                page, next_token = standin._page(items, request)
+                return assistant_service_pb2.ListAssistantsResponse(assistants=page, next_page_token=next_token)
+
+            def ListVersions(self, request, context):
+                standin._count("AssistantService.ListVersions", request, context)
+                page, next_token = standin._page(standin.versions.get(request.assistant_id, []), request)
+                return assistant_service_pb2.ListAssistantVersionsResponse(versions=page, next_page_token=next_token)
+
+        class Threads(thread_service_pb2_grpc.ThreadServiceServicer):
+            def Create(self, request, context):
+                standin._count("ThreadService.Create", request, context)
+                thread = thread_pb2.Thread(id=standin._new_id("thr"), folder_id=request.folder_id,
+                                           name=request.name, created_at=_now())
+                with standin._lock:
+                    standin.threads[thread.id] = thread
+                return thread
+
+        class Runs(run_service_pb2_grpc.RunServiceServicer):
+            def Create(self, request, context):
+                standin._count("RunService.Create", request, context)
+                if request.assistant_id not in standin.assistants:
+                    context.abort(grpc.StatusCode.NOT_FOUND, "assistant not found")
+                if request.thread_id not in standin.threads:
+                    context.abort(grpc.StatusCode.NOT_FOUND, "thread not found")
+                prompt = "".join(
+                    part.text.content for message in request.additional_messages for part in message.content.content
+                )
+                run = run_pb2.Run(id=standin._new_id("run"), assistant_id=request.assistant_id,
+                                  thread_id=request.thread_id, created_at=_now(),
+                                  state=run_pb2.RunState(status=run_pb2.RunState.PENDING))
+                with standin._lock:
+                    standin.runs[run.id] = (run, prompt)
+                return run
+
+            def Listen(self, request, context):
+                standin._count("RunService.Listen", request, context)
+                if request.run_id not in standin.runs:
+                    context.abort(grpc.StatusCode.NOT_FOUND, "run not found")
+                run, prompt = standin.runs[request.run_id]
+                text = standin._answer(standin.assistants[run.assistant_id], prompt)
+                for i in range(1, standin.chunks + 1):
+                    time.sleep(standin.latency / standin.chunks)
+                    content = message_pb2.MessageContent(content=[message_pb2.ContentPart(
+                        text=message_pb2.Text(content=text[:len(text) * i // standin.chunks])
+                    )])
+                    if i < standin.chunks:
+                        yield run_service_pb2.StreamEvent(event_type=run_service_pb2.StreamEvent.PARTIAL_MESSAGE,
+                                                          partial_message=content)
+                completed = message_pb2.Message(id=standin._new_id("msg"), thread_id=run.thread_id, content=content,
+                                                status=message_pb2.Message.COMPLETED)
+                run.state.CopyFrom(run_pb2.RunState(status=run_pb2.RunState.COMPLETED, completed_message=completed))
+                yield run_service_pb2.StreamEvent(event_type=run_service_pb2.StreamEvent.DONE,
+                                                  completed_message=completed)
+
+            def Get(self, request, context):
+                standin._count("RunService.Get", request, context)
+                if request.run_id not in standin.runs:
+                    context.abort(grpc.StatusCode.NOT_FOUND, "run not found")
+                return standin.runs[request.run_id][0]
+
+        self._server = grpc.server(futures.ThreadPoolExecutor(max_workers=16))
+        assistant_service_pb2_grpc.add_AssistantServiceServicer_to_server(Assistants(), self._server)
+        thread_service_pb2_grpc.add_ThreadServiceServicer_to_server(Threads(), self._server)
+        run_service_pb2_grpc.add_RunServiceServicer_to_server(Runs(), self._server)
+        self._server.add_insecure_port(self.endpoint)
+        self._server.start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.stop(grace=None)
+            self._server = None
+
+
+async def check(standin: AssistantStandIn, requests: int) -> str:
+    """Прогон AssistantAPI против заглушки: создание ассистентов, повторный запуск с кэшем, запросы"""
+    from assistant_api import AssistantAPI
+    from llm_scheduler import LLMScheduler
+
+    instructions = {
+        "optimization": "Ты - специалист по оптимизации в Yandex Cloud. " * 5,
+        "diagnostics": "Ты - эксперт по диагностике проблем в Yandex Cloud. " * 5,
+    }
+    # Чужой ассистент в каталоге и несколько страниц списка
+    for i in range(7):
+        standin.assistants[f"foreign{i}"] = assistant_pb2.Assistant(id=f"foreign{i}", folder_id="folder", name=f"x{i}")
+
+    cache_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".assistants-check.json")
+    lines = []
+    try:
+        # Ограничение частоты по чатам здесь не проверяется
+        scheduler = LLMScheduler(chat_rate=1000, chat_burst=1000)
+        api = AssistantAPI("key", "folder", instructions, endpoint=standin.endpoint, secure=False,
+                           cache_path=cache_path, scheduler=scheduler)
+        started = time.perf_counter()
+        answers = await asyncio.gather(*(
+            api.complete("optimization" if i % 2 else "diagnostics", f"запрос {i}", chat_id=i % 3)
+            for i in range(requests)
+        ))
+        elapsed = time.perf_counter() - started
+        lines.append(f"Ответов: {len(answers)} за {elapsed:.2f} с, пример: {answers[0]}")
+        lines.append(f"Клиент: {api.stats()}")
+        versions = [v.id async for v in api.iter_versions(api.stats()["assistants"]["optimization"], page_size=1)]
+        lines.append(f"Версий ассистента optimization: {len(versions)}")
+        await api.aclose()
+
+        # Второй процесс с тем же кэшем не вызывает List/Create; измененный промпт обновляет ассистента
+        before = dict(standin.calls)
+        instructions["diagnostics"] += "Отвечай кратко."
+        api = AssistantAPI("key", "folder", instructions, endpoint=standin.endpoint, secure=False,
+                           cache_path=cache_path)
+        await api.complete("optimization", "повтор", chat_id=1)
+        await api.complete("diagnostics", "повтор", chat_id=1)
+        lines.append(f"Повторный запуск: {api.stats()}")
+        lines.append(f"Вызовы при повторном запуске: "
+                     f"{ {k: v - before.get(k, 0) for k, v in standin.calls.items() if v != before.get(k, 0)} }")
+        await api.aclose()
+    finally:
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+
+    runs = standin.calls.get("RunService.Create", 1)
+    lines.append(f"Вызовы заглушки: {dict(sorted(standin.calls.items()))}")
+    lines.append(f"Средний размер RunService.Create: {standin.request_bytes['RunService.Create'] / runs:.0f} байт")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка Assistant API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18083)
+    parser.add_argument("--latency", type=float, default=0.1, help="время генерации ответа, сек")
+    parser.add_argument("--check", action="store_true", help="прогнать клиент assistant_api против заглушки и выйти")
+    parser.add_argument("--requests", type=int, default=20, help="число запросов для --check")
+    args = parser.parse_args()
+
+    standin = AssistantStandIn(args.host, args.port, args.latency)
+    standin.start()
+    if args.check:
+        try:
+            print(asyncio.run(check(standin, args.requests)))
+        finally:
+            standin.stop()
+        return
+    print(f"Заглушка Assistant API: {standin.endpoint}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        standin.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Сравнение скорости поштучного и пакетного расчета стоимости VM
+
+Пример:
+    python tools/bench_pricing.py --configs 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cloud_pricing import CloudPricing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк расчета стоимости VM")
+    parser.add_argument("--configs", type=int, default=100000, help="число конфигураций")
+    parser.add_argument("--repeat", type=int, default=3, help="число повторов, берется лучший результат")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    cpu = rng.integers(1, 97, args.configs)
+    ram = rng.integers(1, 385, args.configs)
+    disk = rng.integers(10, 4097, args.configs)
+    hours = rng.integers(1, 745, args.configs)
+
+    pricing = CloudPricing()
+    rows = list(zip(cpu.tolist(), ram.tolist(), disk.tolist(), hours.tolist()))
+
+    def scalar():
+        return [pricing.calculate_vm_cost(c, r, d, h)["total"] for c, r, d, h in rows]
+
+    def batch():
+        return pricing.calculate_vm_cost_batch(cpu, ram, disk, hours)["total"]
+
+    results = {}
+    for name, fn in (("поштучно", scalar), ("пакетно", batch)):
+        best = min(_timed(fn) for _ in range(args.repeat))
+        results[name] = best
+        print(f"{name:<10} {best * 1000:10.1f} мс  {args.configs / best:14,.0f} конфигураций/с")
+
+    # Результаты должны совпадать с поштучным расчетом
+    assert np.allclose(scalar(), batch())
+    print(f"Ускорение: {results['поштучно'] / results['пакетно']:.1f}x")
+
+
+def _timed(fn) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Построение индекса BM25 по документации docs/
+
+Собирает индекс, печатает время построения, размер файла и задержку запросов.
+
+Пример:
+    python tools/build_docs_index.py
+    python tools/build_docs_index.py --docs docs --out data/docs_index.bin --query "как настроить навигацию"
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docs_index import DOCS_DIR, DOCS_INDEX_PATH, DocsIndex, build_index  # noqa: E402
+
+SAMPLE_QUERIES = [
+    "как начать работу с ботом",
+    "расчет стоимости виртуальной машины",
+    "диагностика проблем",
+    "how to add code blocks",
+    "navigation settings in mint.json",
+    "автоматизация задач в облаке",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Построение индекса BM25 по документации")
+    parser.add_argument("--docs", default=DOCS_DIR, help="каталог с .mdx страницами")
+    parser.add_argument("--out", default=DOCS_INDEX_PATH, help="файл индекса")
+    parser.add_argument("--query", action="append", help="запрос для замера (можно несколько)")
+    parser.add_argument("--repeat", type=int, default=200, help="сколько раз выполнить каждый запрос")
+    parser.add_argument("--top-k", type=int, default=3, help="сколько фрагментов возвращать")
+    args = parser.parse_args()
+
+    stats = build_index(args.docs, args.out)
+    print(f"Фрагментов: {stats['passages']}, термов: {stats['terms']}")
+    print(f"Время построения: {stats['build_time'] * 1000:.1f} мс")
+    print(f"Размер индекса: {stats['size'] / 1024:.1f} КБ ({args.out})")
+
+    started = time.perf_counter()
+    index = DocsIndex(args.out)
+    print(f"Загрузка индекса: {(time.perf_counter() - started) * 1000:.2f} мс")
+
+    queries = args.query or SAMPLE_QUERIES
+    latencies = []
+    for query in queries:
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            results = index.search(query, k=args.top_k)
+            latencies.append(time.perf_counter() - started)
+        if results:
+            print(f"  {query!r}: {results[0]['title']} ({results[0]['score']:.2f})")
+        else:
+            print(f"  {query!r}: нет совпадений")
+
+    latencies.sort()
+    print(f"Задержка запроса: p50 {statistics.median(latencies) * 1e6:.0f} мкс, "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1e6:.0f} мкс, max {latencies[-1] * 1e6:.0f} мкс")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Локальная заглушка Compute API (gRPC) для проверки отчета о стоимости без сети
+
+Реализует InstanceService.List и DiskService.List с постраничной выдачей.
+Каталоги folder-1 ... folder-N заполняются синтетическими машинами и дисками
+(у части машин второй диск, часть дисков не подключена); каталоги с
+префиксом denied- отвечают PERMISSION_DENIED. Задержка каждой страницы
+настраивается.
+
+Пример:
+    python tools/compute_standin.py --port 18084 --folders 10 --instances 5000
+    YC_API_ENDPOINT=127.0.0.1:18084 YC_API_INSECURE=true COST_REPORT_FOLDERS=folder-1,folder-2 python bot.py
+
+    python tools/compute_standin.py --check   # отчет по всем каталогам заглушки
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+from concurrent import futures
+
+import grpc
+from yandex.cloud.compute.v1 import (
+    disk_pb2, disk_service_pb2, disk_service_pb2_grpc, instance_pb2, instance_service_pb2, instance_service_pb2_grpc
+)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+GB = 2 ** 30
+
+
+class ComputeStandIn:
+    def __init__(self, host: str = "127.0.0.1", port: int = 18084, folders: int = 10, instances: int = 1000,
+                 latency: float = 0.05, seed: int = 1):
+        """
+        Заглушка Compute API
+
+        :param host: Адрес для прослушивания
+        :param port: Порт для прослушивания
+        :param folders: Число каталогов folder-1 ... folder-N
+        :param instances: Машин в каждом каталоге
+        :param latency: Задержка ответа на страницу, сек
+        :param seed: Зерно генератора конфигураций
+        """
+        self.host = host
+        self.port = port
+        self.folders = folders
+        self.instances = instances
+        self.latency = latency
+        self.seed = seed
+        self.calls = {}  # метод -> число вызовов
+        self._data = {}  # каталог -> (машины, диски)
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def endpoint(self) -> str:
+        """Значение для YC_API_ENDPOINT"""
+        return f"{self.host}:{self.port}"
+
+    @property
+    def folder_ids(self) -> list:
+        return [f"folder-{i}" for i in range(1, self.folders + 1)]
+
+    def _count(self, method: str):
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+    def folder(self, folder_id: str):
+        """Машины и диски каталога; создаются при первом обращении"""
+        with self._lock:
+            data = self._data.get(folder_id)
+            if data is None:
+                data = self._data[folder_id] = self._generate(folder_id)
+        return data
+
+    def _generate(self, folder_id: str):
+        if folder_id not in self.folder_ids:
+            return [], []
+        rng = random.Random(f"{self.seed}:{folder_id}")
+        instances, disks = [], []
+        for i in range(self.instances):
+            vm_id = f"{folder_id}-vm-{i}"
+            boot = disk_pb2.Disk(id=f"{vm_id}-boot", folder_id=folder_id, size=rng.choice((20, 50, 100)) * GB,
+                                 instance_ids=[vm_id])
+            disks.append(boot)
+            secondary = []
+            if i % 4 == 0:
+                data = disk_pb2.Disk(id=f"{vm_id}-data", folder_id=folder_id, size=rng.choice((100, 500, 1000)) * GB,
+                                     instance_ids=[vm_id])
+                disks.append(data)
+                secondary.append(instance_pb2.AttachedDisk(disk_id=data.id))
+            cores = rng.choice((2, 2, 4, 8, 16))
+            instances.append(instance_pb2.Instance(
+                id=vm_id, folder_id=folder_id, name=f"vm-{i}", zone_id="ru-central1-a",
+                status=instance_pb2.Instance.STOPPED if rng.random() < 0.1 else instance_pb2.Instance.RUNNING,
+                resources=instance_pb2.Resources(
+                    cores=cores, memory=cores * rng.choice((1, 2, 4)) * GB, core_fraction=rng.choice((20, 50, 100))
+                ),
+                boot_disk=instance_pb2.AttachedDisk(disk_id=boot.id),
+                secondary_disks=secondary
+            ))
+        for i in range(self.instances // 50):
+            disks.append(disk_pb2.Disk(id=f"{folder_id}-orphan-{i}", folder_id=folder_id, size=200 * GB))
+        return instances, disks
+
+    def _page(self, items: list, request, context):
+        if request.folder_id.startswith("denied-"):
+            context.abort(grpc.StatusCode.PERMISSION_DENIED, "permission denied")
+        time.sleep(self.latency)
+        start = int(request.page_token or 0)
+        size = request.page_size or 100
+        next_token = str(start + size) if start + size < len(items) else ""
+        return items[start:start + size], next_token
+
+    def start(self):
+        """Запускает gRPC сервер в пуле потоков"""
+        standin = self
+
+        class Instances(instance_service_pb2_grpc.InstanceServiceServicer):
+            def List(self, request, context):
+                standin._count("InstanceService.List")
+                page, token = standin._page(standin.folder(request.folder_id)[0], request, context)
+                return instance_service_pb2.ListInstancesResponse(instances=page, next_page_token=token)
+
+        class Disks(disk_service_pb2_grpc.DiskServiceServicer):
+            def List(self, request, context):
+                standin._count("DiskService.List")
+                page, token = standin._page(standin.folder(request.folder_id)[1], request, context)
+                return disk_service_pb2.ListDisksResponse(disks=page, next_page_token=token)
+
+        self._server = grpc.server(futures.ThreadPoolExecutor(max_workers=32))
+        instance_service_pb2_grpc.add_InstanceServiceServicer_to_server(Instances(), self._server)
+        disk_service_pb2_grpc.add_DiskServiceServicer_to_server(Disks(), self._server)
+        self._server.add_insecure_port(self.endpoint)
+        self._server.start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.stop(grace=None)
+            self._server = None
+
+
+def expected_total(standin: ComputeStandIn, folder_ids: list, hours: int = 730) -> float:
+    """Стоимость по тем же правилам, но поштучно через calculate_vm_cost - для сверки"""
+    from cloud_pricing import CloudPricing
+
+    pricing = CloudPricing()
+    total = 0.0
+    for folder_id in folder_ids:
+        instances, disks = standin.folder(folder_id)
+        sizes = {disk.id: disk.size / GB for disk in disks}
+        for vm in instances:
+            running = vm.status == instance_pb2.Instance.RUNNING
+            disk = sizes[vm.boot_disk.disk_id] + sum(sizes[d.disk_id] for d in vm.secondary_disks)
+            cost = pricing.calculate_vm_cost(vm.resources.cores * vm.resources.core_fraction / 100,
+                                             vm.resources.memory / GB, disk, hours if running else 0)
+            total += cost["total"]
+        total += sum(pricing.calculate_vm_cost(0, 0, disk.size / GB, 0)["total"]
+                     for disk in disks if not disk.instance_ids)
+    return total
+
+
+async def check(standin: ComputeStandIn, workers: int, concurrency: int) -> str:
+    """Отчет по всем каталогам заглушки и одному недоступному; сверка итога с поштучным расчетом"""
+    from cloud_pricing import CloudPricing
+    from cost_report import CostReporter, format_cost_report
+    from yc_client import YandexCloudClient
+
+    client = YandexCloudClient(max_workers=workers, endpoint=standin.endpoint, insecure=True)
+    reporter = CostReporter(client, CloudPricing(), concurrency=concurrency)
+    folder_ids = standin.folder_ids + ["denied-1"]
+    # Данные заглушки готовятся заранее, чтобы в замер вошел только обход
+    for folder_id in standin.folder_ids:
+        standin.folder(folder_id)
+
+    started = time.perf_counter()
+    results = []
+    progress = []
+    async for result in reporter.stream(folder_ids):
+        results.append(result)
+        progress.append(round(time.perf_counter() - started, 2))
+    elapsed = time.perf_counter() - started
+    client.close()
+
+    report = format_cost_report(results, len(folder_ids))
+    total = sum(r.cost["total"] for r in results if r.error is None)
+    expected = expected_total(standin, standin.folder_ids)
+    lines = [
+        report,
+        "",
+        f"Каталогов: {len(folder_ids)}, ВМ: {standin.folders * standin.instances}, за {elapsed:.2f} с",
+        f"Готовность каталогов, с: {progress}",
+        f"Сверка с поштучным расчетом: {total:.2f} / {expected:.2f} (расхождение {abs(total - expected):.2f})",
+        f"Вызовы заглушки: {dict(sorted(standin.calls.items()))}",
+    ]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка Compute API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18084)
+    parser.add_argument("--folders", type=int, default=10, help="число каталогов")
+    parser.add_argument("--instances", type=int, default=1000, help="машин в каталоге")
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка страницы, сек")
+    parser.add_argument("--check", action="store_true", help="построить отчет по всем каталогам заглушки и выйти")
+    parser.add_argument("--workers", type=int, default=8, help="потоков клиента для --check (YC_API_WORKERS)")
+    parser.add_argument("--concurrency", type=int, default=8, help="каталогов одновременно для --check")
+    args = parser.parse_args()
+
+    standin = ComputeStandIn(args.host, args.port, args.folders, args.instances, args.latency)
+    standin.start()
+    if args.check:
+        try:
+            print(asyncio.run(check(standin, args.workers, args.concurrency)))
+        finally:
+            standin.stop()
+        return
+    print(f"Заглушка Compute API: {standin.endpoint}, каталоги: folder-1 ... folder-{args.folders}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        standin.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Нагрузочный тест обработчиков бота без сети
+
+Поднимает фиктивный Bot API (tools/telegram_standin.py) и заглушку YandexGPT
+(tools/yandexgpt_stub.py), строит приложение бота с настоящими обработчиками
+и подает в него синтетические обновления с заданной частотой. В конце печатает
+пропускную способность, перцентили задержки, задержку цикла событий и память.
+
+Трассы в формате JSONL (как журнал logs/requests_journal.jsonl): на строку один объект, текст
+сообщения берется из поля text, prompt или body; поля chat_id и ts необязательны.
+
+Примеры:
+    python tools/loadtest.py --rate 50 --requests 500
+    python tools/loadtest.py --trace logs/requests_journal.jsonl --rate 20 --llm-latency 1.5 --throttle-rate 0.05
+    python tools/loadtest.py --trace journal.jsonl --realtime --speed 4
+    python tools/loadtest.py --assistant-api   # /optimize и /diagnose через заглушку Assistant API
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import psutil
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+sys.path.insert(0, TOOLS_DIR)
+
+from telegram_standin import FakeBotAPI, make_update  # noqa: E402
+from yandexgpt_stub import YandexGPTStub  # noqa: E402
+from assistant_standin import AssistantStandIn  # noqa: E402
+
+# Смесь запросов по умолчанию: команды без апстрима, каталог и свободные вопросы к модели
+DEFAULT_MIX = [
+    "/help",
+    "/calculate_vm 4 8 100",
+    "/calculate_vm 2 4 50; 4 16 200; 8 32 500",
+    "/cheapest 4 16 100",
+    "/pricing compute",
+    "/optimize vm 8 vCPU, 32 ГБ RAM, средняя загрузка CPU 10%",
+    "/diagnose виртуальная машина перестала отвечать по SSH после перезагрузки",
+    "расскажи про сервис object storage",
+    "как уменьшить расходы на виртуальные машины?",
+    "чем отличается managed postgresql от ydb",
+    "как настроить автоматизацию развертывания в облаке",
+]
+
+
+def load_trace(path: str) -> list:
+    """
+    Чтение трассы запросов
+
+    :param path: Путь к JSONL файлу
+    :return: Записи: text, chat_id (или None), ts (или None)
+    """
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = record.get("text") or record.get("prompt") or record.get("body")
+            if text:
+                entries.append({"text": text, "chat_id": record.get("chat_id"), "ts": record.get("ts")})
+    return entries
+
+
+def percentile(values: list, q: float) -> float:
+    """Перцентиль отсортированного списка"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def route_of(text: str) -> str:
+    """Маршрут для разбивки задержек: команда или message"""
+    return text.split()[0].split("@")[0] if text.startswith("/") else "message"
+
+
+class LoopMonitor:
+    def __init__(self, interval: float = 0.01):
+        """
+        Замер задержки цикла событий и памяти процесса
+
+        :param interval: Период проверки, сек
+        """
+        self.interval = interval
+        self.lags = []
+        self.process = psutil.Process()
+        self.rss_start = self.process.memory_info().rss
+        self.rss_peak = self.rss_start
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+            if len(self.lags) % 10 == 0:
+                self.rss_peak = max(self.rss_peak, self.process.memory_info().rss)
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self.rss_peak = max(self.rss_peak, self.process.memory_info().rss)
+
+
+async def run_load(application, entries: list, rate: float, realtime: bool, speed: float, chats: int) -> dict:
+    """
+    Подача обновлений в приложение по расписанию (открытая модель нагрузки)
+
+    :param application: Инициализированное приложение бота
+    :param entries: Записи трассы
+    :param rate: Обновлений в секунду (если не realtime)
+    :param realtime: Воспроизводить интервалы по полю ts
+    :param speed: Ускорение воспроизведения для realtime
+    :param chats: Сколько разных чатов использовать для записей без chat_id
+    :return: Задержки по маршрутам и время прогона
+    """
+    from telegram import Update
+
+    latencies = {}
+    first_ts = next((e["ts"] for e in entries if e["ts"] is not None), None)
+    started = time.perf_counter()
+
+    async def process(update_id: int, entry: dict):
+        chat_id = entry["chat_id"] or 100000 + update_id % chats
+        update = Update.de_json(make_update(update_id, chat_id, entry["text"]), application.bot)
+        begin = time.perf_counter()
+        await application.process_update(update)
+        latencies.setdefault(route_of(entry["text"]), []).append(time.perf_counter() - begin)
+
+    tasks = []
+    for update_id, entry in enumerate(entries, 1):
+        if realtime and first_ts is not None and entry["ts"] is not None:
+            offset = (entry["ts"] - first_ts) / speed
+        else:
+            offset = (update_id - 1) / rate
+        delay = started + offset - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(process(update_id, entry)))
+    await asyncio.gather(*tasks)
+    return {"latencies": latencies, "elapsed": time.perf_counter() - started}
+
+
+def format_report(result: dict, monitor: LoopMonitor, api: FakeBotAPI, stub: YandexGPTStub, errors: float) -> str:
+    all_latencies = sorted(x for values in result["latencies"].values() for x in values)
+    lags = sorted(monitor.lags)
+    ms = 1000
+    lines = [
+        f"Обновлений: {len(all_latencies)} за {result['elapsed']:.2f} с "
+        f"({len(all_latencies) / result['elapsed']:.1f}/с)",
+        f"Задержка: p50 {percentile(all_latencies, 0.5) * ms:.1f} мс, p95 {percentile(all_latencies, 0.95) * ms:.1f} мс, "
+        f"p99 {percentile(all_latencies, 0.99) * ms:.1f} мс, max {all_latencies[-1] * ms:.1f} мс",
+    ]
+    for route, values in sorted(result["latencies"].items()):
+        values.sort()
+        lines.append(f"  {route:<16} n={len(values):<6} p50 {percentile(values, 0.5) * ms:8.1f} мс  "
+                     f"p95 {percentile(values, 0.95) * ms:8.1f} мс  p99 {percentile(values, 0.99) * ms:8.1f} мс")
+    if lags:
+        lines.append(f"Задержка цикла событий: средняя {statistics.mean(lags) * ms:.2f} мс, "
+                     f"p99 {percentile(lags, 0.99) * ms:.2f} мс, max {lags[-1] * ms:.2f} мс")
+    mb = 1024 * 1024
+    lines.append(f"Память (RSS): {monitor.rss_start / mb:.1f} МБ в начале, пик {monitor.rss_peak / mb:.1f} МБ")
+    lines.append(f"Необработанных ошибок в обработчиках: {int(errors)}")
+    lines.append(f"Ответы заглушки YandexGPT: {dict(sorted(stub.calls.items()))}, модели: {stub.models}")
+    lines.append(f"Вызовы Bot API: {dict(sorted(api.calls.items()))}")
+    return "\n".join(lines)
+
+
+async def main_async(args, api: FakeBotAPI, stub: YandexGPTStub):
+    import bot
+    import metrics
+
+    if args.trace:
+        entries = load_trace(args.trace)
+    else:
+        entries = [{"text": text, "chat_id": None, "ts": None} for text in DEFAULT_MIX]
+    if args.requests:
+        entries = [entries[i % len(entries)] for i in range(args.requests)]
+
+    application = bot.build_application()
+    await application.initialize()
+    await bot.post_init(application)
+    # Приложение запускается, чтобы stop() дождался фоновых задач (ответов серверных ассистентов)
+    await application.start()
+
+    monitor = LoopMonitor()
+    monitor.start()
+    try:
+        result = await run_load(application, entries, args.rate, args.realtime, args.speed, args.chats)
+        # Ответы на /optimize и /diagnose приходят после обработчика; ждем их, но не дольше таймаута заглушки
+        deadline = time.monotonic() + args.llm_latency + args.llm_jitter + 30
+        while bot.deferred.initialized and bot.deferred.get().pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        deferred_stats = bot.deferred.get().stats() if bot.deferred.initialized else None
+        assistant = bot.cloud_assistant.get()
+        resilience_stats = {
+            "hedger": assistant.hedger.stats() if assistant.hedger is not None else None,
+            "breakers": assistant.breakers.stats() if assistant.breakers is not None else None,
+        }
+        outbox_stats = bot.outbox.stats() if bot.outbox is not None else None
+    finally:
+        await monitor.stop()
+        await application.stop()
+        await bot.post_stop(application)
+        await application.shutdown()
+        await bot.post_shutdown(application)
+
+    errors = metrics.total(metrics.HANDLER_ERRORS)
+    print(format_report(result, monitor, api, stub, errors))
+    if deferred_stats:
+        print(f"Отложенные запросы: {deferred_stats}")
+    print(f"Дубли и предохранители: {resilience_stats}")
+    print(f"Исходящие сообщения: {outbox_stats}")
+    if api.flood_limits:
+        print(f"Отклонено Bot API по лимитам (429): {api.flood_rejected}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест обработчиков бота с локальными заглушками")
+    parser.add_argument("--trace", help="JSONL трасса запросов (поля text/prompt/body, chat_id, ts)")
+    parser.add_argument("--requests", type=int, default=None,
+                        help="сколько обновлений подать (трасса повторяется по кругу); по умолчанию 200 без трассы")
+    parser.add_argument("--rate", type=float, default=20, help="обновлений в секунду")
+    parser.add_argument("--realtime", action="store_true", help="воспроизводить интервалы трассы по полю ts")
+    parser.add_argument("--speed", type=float, default=1.0, help="ускорение воспроизведения для --realtime")
+    parser.add_argument("--chats", type=int, default=1000, help="число разных чатов для записей без chat_id")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="время генерации заглушки, сек")
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="разброс времени генерации, сек")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500 от заглушки")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="доля ответов 429 от заглушки")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="доля медленных ответов заглушки")
+    parser.add_argument("--tail-latency", type=float, default=5.0, help="доп. задержка медленного ответа, сек")
+    parser.add_argument("--flood-limits", action="store_true",
+                        help="фиктивный Bot API отвечает 429 сверх лимитов Telegram на отправку")
+    parser.add_argument("--cache", action="store_true", help="не отключать кэш ответов модели")
+    parser.add_argument("--api-port", type=int, default=18081, help="порт фиктивного Bot API")
+    parser.add_argument("--llm-port", type=int, default=18082, help="порт заглушки YandexGPT")
+    parser.add_argument("--assistant-api", action="store_true",
+                        help="/optimize и /diagnose через заглушку Assistant API вместо completionAsync")
+    parser.add_argument("--assistant-port", type=int, default=18083, help="порт заглушки Assistant API")
+    args = parser.parse_args()
+    if args.requests is None and not args.trace:
+        args.requests = 200
+
+    api = FakeBotAPI(port=args.api_port, flood_limits=args.flood_limits)
+    stub = YandexGPTStub(port=args.llm_port, latency=args.llm_latency, jitter=args.llm_jitter,
+                         error_rate=args.error_rate, throttle_rate=args.throttle_rate, seed=1,
+                         tail_rate=args.tail_rate, tail_latency=args.tail_latency)
+    api.start()
+    stub.start()
+    standin = None
+    if args.assistant_api:
+        standin = AssistantStandIn(port=args.assistant_port, latency=args.llm_latency)
+        standin.start()
+        os.environ.update({
+            "ASSISTANT_API": "true",
+            "YANDEX_ASSISTANT_ENDPOINT": standin.endpoint,
+            "YANDEX_ASSISTANT_INSECURE": "true",
+            "ASSISTANT_CACHE_PATH": "",
+        })
+
+    # Настройки читаются при импорте бота, поэтому задаются до него
+    os.environ.update({
+        "TELEGRAM_BOT_TOKEN": "123456:loadtest",
+        "TELEGRAM_BASE_URL": api.base_url,
+        "YANDEX_LLM_BASE_URL": stub.base_url,
+        "YANDEX_OPERATION_BASE_URL": stub.operation_url,
+        "YANDEX_API_KEY": "loadtest",
+        "YANDEX_FOLDER_ID": "loadtest-folder",
+        "METRICS_PORT": "0",
+    })
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("LOG_LEVELS", "httpx=WARNING,telegram=WARNING")
+    os.environ.setdefault("LOG_FILE", "")
+    # Журнал запросов пишется, но никуда не сохраняется: его стоимость входит в замер
+    os.environ.setdefault("JOURNAL_PATH", os.devnull)
+    os.environ.setdefault("DEFERRED_POLL_INTERVAL", "0.2")
+    if not args.cache:
+        os.environ["COMPLETION_CACHE_SIZE"] = "0"
+
+    try:
+        asyncio.run(main_async(args, api, stub))
+    finally:
+        if standin is not None:
+            print(f"Вызовы Assistant API: {dict(sorted(standin.calls.items()))}")
+            standin.stop()
+        stub.stop()
+        api.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Локальный стенд Telegram для проверки бота без сети
+
+Поднимает фиктивный Bot API (getMe, setWebhook, sendMessage, editMessageText...)
+и отправляет в webhook бота обновления в формате Telegram.
+
+Стенд запускается первым: при старте бот обращается к Bot API (getMe, setWebhook).
+
+Пример:
+    # терминал 1
+    python tools/telegram_standin.py --webhook http://127.0.0.1:8443/telegram --secret secret --updates 200
+    # терминал 2
+    BOT_MODE=webhook WEBHOOK_SECRET=secret WEBHOOK_LISTEN=127.0.0.1 WEBHOOK_PORT=8443 \\
+    TELEGRAM_BASE_URL=http://127.0.0.1:8081/bot TELEGRAM_BOT_TOKEN=123:test python bot.py
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+import httpx
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "StandIn", "username": "standin_bot"}
+
+
+class FakeBotAPI:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8081, flood_limits: bool = False,
+                 chat_rate: float = 1.0, chat_burst: float = 3, global_rate: float = 30):
+        """
+        Фиктивный Bot API: отвечает на вызовы бота и запоминает отправленные сообщения
+
+        С flood_limits sendMessage и editMessageText сверх лимитов (в чат и
+        на весь бот) получают 429 с retry_after, как от настоящего Telegram.
+
+        :param host: Адрес для прослушивания
+        :param port: Порт для прослушивания
+        :param flood_limits: Эмулировать лимиты Telegram на отправку
+        :param chat_rate: Сообщений в секунду в один чат
+        :param chat_burst: Допустимый всплеск в один чат
+        :param global_rate: Сообщений в секунду на весь бот (он же всплеск)
+        """
+        self.host = host
+        self.port = port
+        self.flood_limits = flood_limits
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_rate = global_rate
+        self.flood_rejected = 0
+        self._buckets = {}  # chat_id или None для всего бота -> (токены, время)
+        self.webhook_set = threading.Event()
+        self.calls = {}  # метод -> число вызовов
+        self.sent = []  # (время, chat_id, текст) для sendMessage
+        self._message_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        """Значение для TELEGRAM_BASE_URL"""
+        return f"http://{self.host}:{self.port}/bot"
+
+    def _take_token(self, key, rate: float, burst: float, now: float) -> float:
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+        self._buckets[key] = (tokens - 1, now)
+        return 0.0
+
+    def _flood_wait(self, chat_id: int) -> int:
+        """0, если отправка в пределах лимитов, иначе retry_after в секундах"""
+        now = time.monotonic()
+        with self._lock:
+            wait = self._take_token(chat_id, self.chat_rate, self.chat_burst, now)
+            if not wait:
+                wait = self._take_token(None, self.global_rate, self.global_rate, now)
+                if wait:
+                    # Токен чата возвращается: сообщение не отправлено
+                    tokens, updated = self._buckets[chat_id]
+                    self._buckets[chat_id] = (tokens + 1, updated)
+            if wait:
+                self.flood_rejected += 1
+        return math.ceil(wait) if wait else 0
+
+    def _handle(self, method: str, params: dict) -> object:
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        if method == "getMe":
+            return BOT_USER
+        if method in ("setWebhook", "deleteWebhook"):
+            if method == "setWebhook":
+                self.webhook_set.set()
+            return True
+        if method == "getUpdates":
+            return []
+        if method in ("sendMessage", "editMessageText"):
+            chat_id = int(params.get("chat_id", 0))
+            text = params.get("text", "")
+            if method == "sendMessage":
+                with self._lock:
+                    self.sent.append((time.monotonic(), chat_id, text))
+            return {
+                "message_id": int(params.get("message_id") or next(self._message_ids)),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+                "text": text
+            }
+        return True
+
+    def start(self):
+        """Запускает сервер в фоновом потоке"""
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length).decode("utf-8")
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    params = json.loads(body or "{}")
+                else:
+                    params = dict(parse_qsl(body))
+                method = self.path.rsplit("/", 1)[-1]
+                retry_after = 0
+                if api.flood_limits and method in ("sendMessage", "editMessageText"):
+                    retry_after = api._flood_wait(int(params.get("chat_id", 0)))
+                if retry_after:
+                    payload = json.dumps({
+                        "ok": False, "error_code": 429,
+                        "description": f"Too Many Requests: retry after {retry_after}",
+                        "parameters": {"retry_after": retry_after}
+                    }).encode("utf-8")
+                    self.send_response(429)
+                else:
+                    payload = json.dumps({"ok": True, "result": api._handle(method, params)}).encode("utf-8")
+                    self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+
+def make_update(update_id: int, chat_id: int, text: str) -> dict:
+    """
+    Обновление в формате Telegram с текстовым сообщением
+
+    :param update_id: ID обновления
+    :param chat_id: ID чата (он же ID пользователя)
+    :param text: Текст сообщения; команды размечаются entity bot_command
+    :return: Словарь обновления
+    """
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+        "text": text
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+async def post_updates(webhook: str, secret: str, texts: list, concurrency: int) -> dict:
+    """
+    Отправка обновлений в webhook бота
+
+    :param webhook: URL webhook бота
+    :param secret: Секрет для заголовка X-Telegram-Bot-Api-Secret-Token
+    :param texts: Тексты сообщений, по одному обновлению на текст
+    :param concurrency: Сколько запросов отправлять одновременно
+    :return: Счетчики HTTP статусов и время отправки по chat_id
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses = {}
+    posted_at = {}
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+
+    async with httpx.AsyncClient() as client:
+        async def post(update_id: int, text: str):
+            chat_id = 100000 + update_id
+            async with semaphore:
+                posted_at[chat_id] = time.monotonic()
+                response = await client.post(webhook, json=make_update(update_id, chat_id, text), headers=headers)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        await asyncio.gather(*(post(i, text) for i, text in enumerate(texts, 1)))
+    return {"statuses": statuses, "posted_at": posted_at}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный стенд Telegram для webhook режима бота")
+    parser.add_argument("--api-port", type=int, default=8081, help="порт фиктивного Bot API")
+    parser.add_argument("--webhook", default="http://127.0.0.1:8443/telegram", help="URL webhook бота")
+    parser.add_argument("--secret", default="", help="секрет webhook (WEBHOOK_SECRET бота)")
+    parser.add_argument("--updates", type=int, default=100, help="сколько обновлений отправить")
+    parser.add_argument("--concurrency", type=int, default=10, help="одновременных POST запросов")
+    parser.add_argument("--text", default="/help", help="текст сообщений")
+    parser.add_argument("--wait", type=float, default=10, help="сколько секунд ждать ответов бота")
+    parser.add_argument("--no-wait-webhook", action="store_true",
+                        help="не ждать setWebhook (бот уже запущен с другим Bot API)")
+    args = parser.parse_args()
+
+    api = FakeBotAPI(port=args.api_port)
+    api.start()
+    if not args.no_wait_webhook:
+        print(f"Фиктивный Bot API: {api.base_url}, ждем регистрации webhook...")
+        api.webhook_set.wait()
+
+    started = time.monotonic()
+    result = asyncio.run(post_updates(args.webhook, args.secret, [args.text] * args.updates, args.concurrency))
+    elapsed = time.monotonic() - started
+
+    deadline = time.monotonic() + args.wait
+    while len(api.sent) < args.updates and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    first_reply = {}
+    for sent_at, chat_id, _ in api.sent:
+        first_reply.setdefault(chat_id, sent_at)
+    latencies = sorted(
+        first_reply[chat_id] - posted for chat_id, posted in result["posted_at"].items() if chat_id in first_reply
+    )
+
+    print(f"Отправлено обновлений: {args.updates} за {elapsed:.2f} с ({args.updates / elapsed:.1f}/с)")
+    print(f"HTTP статусы webhook: {result['statuses']}")
+    print(f"Получено ответов: {len(latencies)}")
+    if latencies:
+        print(f"Задержка до ответа: p50 {statistics.median(latencies) * 1000:.1f} мс, "
+              f"max {latencies[-1] * 1000:.1f} мс")
+    api.stop()
+
+
+if __name__ == "__main__":
+    main()
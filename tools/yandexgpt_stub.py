@@ -0,0 +1,239 @@
+"""
+Локальная заглушка foundationModels API (YandexGPT) для нагрузочных тестов
+
+Отвечает на POST /foundationModels/v1/completion в формате API: обычным JSON
+или потоком JSON строк при completionOptions.stream=true. Асинхронный режим:
+POST /foundationModels/v1/completionAsync возвращает операцию, состояние
+которой отдает GET /operations/{id}. Задержка ответа, доля медленных ответов
+(хвост задержки) и доля ошибок настраиваются.
+
+Пример:
+    python tools/yandexgpt_stub.py --port 8082 --latency 0.8 --jitter 0.3 --throttle-rate 0.05
+    YANDEX_LLM_BASE_URL=http://127.0.0.1:8082/foundationModels/v1 \
+        YANDEX_OPERATION_BASE_URL=http://127.0.0.1:8082/operations python bot.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASE_PATH = "/foundationModels/v1"
+OPERATIONS_PATH = "/operations"
+
+
+class YandexGPTStub:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8082, latency: float = 0.5, jitter: float = 0.0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, response_chars: int = 600,
+                 chunks: int = 5, seed: int = None, large_factor: float = 2.0, tail_rate: float = 0.0,
+                 tail_latency: float = 5.0):
+        """
+        Заглушка completion API
+
+        :param host: Адрес для прослушивания
+        :param port: Порт для прослушивания
+        :param latency: Среднее время генерации ответа, сек
+        :param jitter: Разброс времени генерации (равномерный, +-), сек
+        :param error_rate: Доля ответов 500
+        :param throttle_rate: Доля ответов 429 с заголовком Retry-After
+        :param response_chars: Длина ответа, символов
+        :param chunks: На сколько фрагментов делится потоковый ответ
+        :param seed: Зерно генератора для воспроизводимых прогонов
+        :param large_factor: Во сколько раз дольше отвечают модели, кроме yandexgpt-lite
+        :param tail_rate: Доля медленных ответов (как от перегруженного узла)
+        :param tail_latency: Дополнительная задержка медленного ответа, сек
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.response_chars = response_chars
+        self.chunks = max(1, chunks)
+        self.random = random.Random(seed)
+        self.large_factor = large_factor
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.calls = {}  # HTTP статус -> число ответов
+        self.models = {}  # модель из modelUri -> число запросов
+        self.operations = {}  # ID операции -> (время готовности, результат или None при ошибке)
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        """Значение для YANDEX_LLM_BASE_URL"""
+        return f"http://{self.host}:{self.port}{BASE_PATH}"
+
+    @property
+    def operation_url(self) -> str:
+        """Значение для YANDEX_OPERATION_BASE_URL"""
+        return f"http://{self.host}:{self.port}{OPERATIONS_PATH}"
+
+    def _count(self, status: int):
+        with self._lock:
+            self.calls[status] = self.calls.get(status, 0) + 1
+
+    def _roll(self, model_uri: str = ""):
+        """Исход запроса: HTTP статус, время генерации и ожидание до начала ответа"""
+        model = model_uri.split("/", 3)[-1] if model_uri.startswith("gpt://") else model_uri
+        with self._lock:
+            self.models[model] = self.models.get(model, 0) + 1
+            outcome = self.random.random()
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            # Медленный узел отвечает с задержкой до первого байта, а не генерирует медленнее
+            wait = self.tail_latency if self.random.random() < self.tail_rate else 0.0
+        if not model.startswith("yandexgpt-lite"):
+            delay *= self.large_factor
+        if outcome < self.throttle_rate:
+            return 429, 0.0, 0.0
+        if outcome < self.throttle_rate + self.error_rate:
+            return 500, delay, wait
+        return 200, delay, wait
+
+    def _result(self, prompt: str, text: str) -> dict:
+        return {
+            "alternatives": [{"message": {"role": "assistant", "text": text}, "status": "ALTERNATIVE_STATUS_FINAL"}],
+            "usage": {
+                "inputTextTokens": str(max(1, len(prompt) // 4)),
+                "completionTokens": str(max(1, len(text) // 4)),
+                "totalTokens": str(max(1, len(prompt) // 4) + max(1, len(text) // 4))
+            },
+            "modelVersion": "stub"
+        }
+
+    def _text(self, prompt: str) -> str:
+        base = f"Ответ заглушки на запрос: {prompt[:80]}. "
+        return (base * (self.response_chars // len(base) + 1))[:self.response_chars]
+
+    def start(self):
+        """Запускает сервер в фоновом потоке"""
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send_json(self, status: int, payload: dict, headers: dict = None):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+                stub._count(status)
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                operation_id = self.path[len(OPERATIONS_PATH) + 1:]
+                if not self.path.startswith(f"{OPERATIONS_PATH}/") or operation_id not in stub.operations:
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                ready_at, result = stub.operations[operation_id]
+                operation = {"id": operation_id, "done": time.monotonic() >= ready_at}
+                if operation["done"]:
+                    if result is None:
+                        operation["error"] = {"code": 13, "message": "internal error"}
+                    else:
+                        operation["response"] = result
+                self._send_json(200, operation)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path not in (f"{BASE_PATH}/completion", f"{BASE_PATH}/completionAsync"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+
+                status, delay, wait = stub._roll(request.get("modelUri", ""))
+                if status == 429:
+                    self._send_json(429, {"error": {"message": "rate limited"}}, {"Retry-After": "1"})
+                    return
+                if self.path.endswith("Async"):
+                    # Операция создается сразу; ошибка генерации видна только при опросе
+                    messages = request.get("messages") or [{"text": ""}]
+                    prompt = messages[-1].get("text", "")
+                    result = stub._result(prompt, stub._text(prompt)) if status == 200 else None
+                    operation_id = uuid.uuid4().hex
+                    with stub._lock:
+                        stub.operations[operation_id] = (time.monotonic() + wait + delay, result)
+                    self._send_json(200, {"id": operation_id, "done": False})
+                    return
+                time.sleep(wait)
+                if status != 200:
+                    time.sleep(delay)
+                    self._send_json(status, {"error": {"message": "internal error"}})
+                    return
+
+                messages = request.get("messages") or [{"text": ""}]
+                prompt = messages[-1].get("text", "")
+                text = stub._text(prompt)
+                if not request.get("completionOptions", {}).get("stream"):
+                    time.sleep(delay)
+                    self._send_json(200, {"result": stub._result(prompt, text)})
+                    return
+
+                # Поток: каждый фрагмент содержит весь текст, сгенерированный к этому моменту
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i in range(1, stub.chunks + 1):
+                    time.sleep(delay / stub.chunks)
+                    partial = text[:len(text) * i // stub.chunks]
+                    line = json.dumps({"result": stub._result(prompt, partial)}, ensure_ascii=False) + "\n"
+                    self._write_chunk(line.encode("utf-8"))
+                self._write_chunk(b"")
+                stub._count(200)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка foundationModels API для нагрузочных тестов")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency", type=float, default=0.5, help="среднее время генерации, сек")
+    parser.add_argument("--jitter", type=float, default=0.0, help="разброс времени генерации, сек")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--response-chars", type=int, default=600, help="длина ответа")
+    parser.add_argument("--chunks", type=int, default=5, help="фрагментов в потоковом ответе")
+    parser.add_argument("--large-factor", type=float, default=2.0,
+                        help="во сколько раз дольше отвечают модели, кроме yandexgpt-lite")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="доля медленных ответов")
+    parser.add_argument("--tail-latency", type=float, default=5.0, help="доп. задержка медленного ответа, сек")
+    args = parser.parse_args()
+
+    stub = YandexGPTStub(args.host, args.port, args.latency, args.jitter, args.error_rate,
+                         args.throttle_rate, args.response_chars, args.chunks, large_factor=args.large_factor,
+                         tail_rate=args.tail_rate, tail_latency=args.tail_latency)
+    stub.start()
+    print(f"Заглушка YandexGPT: {stub.base_url}, операции: {stub.operation_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
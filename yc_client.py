@@ -1,35 +1,226 @@
 import os
 import json
-import yandexcloud
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from prometheus_client import Counter, Gauge, Histogram
+from metrics import LATENCY_BUCKETS
+
+YC_API_LATENCY = Histogram("yc_api_duration_seconds", "Время вызова Yandex Cloud API", ["method"],
+                           buckets=LATENCY_BUCKETS)
+YC_API_ERRORS = Counter("yc_api_errors_total", "Ошибки вызовов Yandex Cloud API", ["method"])
+YC_API_IN_FLIGHT = Gauge("yc_api_in_flight", "Вызовы Yandex Cloud API, ожидающие ответа")
+
+# SDK и сгенерированные клиенты загружаются только при первом обращении к API:
+# их импорт занимает заметное время, а большинству запросов они не нужны
+
+def _instance_api():
+    from yandex.cloud.compute.v1.instance_service_pb2 import ListInstancesRequest
+    from yandex.cloud.compute.v1.instance_service_pb2_grpc import InstanceServiceStub
+    return InstanceServiceStub, ListInstancesRequest
+
+def _disk_api():
+    from yandex.cloud.compute.v1.disk_service_pb2 import ListDisksRequest
+    from yandex.cloud.compute.v1.disk_service_pb2_grpc import DiskServiceStub
+    return DiskServiceStub, ListDisksRequest
+
+def _database_api():
+    from yandex.cloud.ydb.v1.database_service_pb2 import ListDatabasesRequest
+    from yandex.cloud.ydb.v1.database_service_pb2_grpc import DatabaseServiceStub
+    return DatabaseServiceStub, ListDatabasesRequest
 
 class YandexCloudClient:
-    def __init__(self, sa_key_file='authorized_key.json'):
-        # Загружаем авторизованный ключ
-        with open(sa_key_file, 'r') as f:
-            self.sa_key_json = json.load(f)
-        
-        # Инициализируем SDK
-        self.sdk = yandexcloud.SDK(service_account_key=self.sa_key_json)
-    
+    def __init__(self, sa_key_file='authorized_key.json', max_workers: int = None, timeout: float = None,
+                 endpoint: str = None, insecure: bool = None):
+        """
+        Клиент Yandex Cloud API
+
+        Вызовы SDK блокирующие, поэтому для асинхронного кода есть методы *_async,
+        которые выполняют их в ограниченном пуле потоков.
+
+        :param sa_key_file: Путь к авторизованному ключу сервисного аккаунта
+        :param max_workers: Размер пула потоков для вызовов SDK
+        :param timeout: Дедлайн одного вызова API в секундах
+        :param endpoint: Адрес API (по умолчанию из YC_API_ENDPOINT или адрес SDK)
+        :param insecure: Подключаться к endpoint без TLS и авторизации - только для локальной заглушки
+        """
+        self.sa_key_file = sa_key_file
+        self._sdk = None
+        self._sdk_lock = threading.Lock()
+        self.endpoint = endpoint or os.getenv("YC_API_ENDPOINT") or None
+        if insecure is None:
+            insecure = os.getenv("YC_API_INSECURE", "false").lower() in ("1", "true", "yes")
+        self.insecure = insecure and self.endpoint is not None
+        self._channel = None
+
+        self.timeout = timeout or float(os.getenv("YC_API_TIMEOUT", "10"))
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv("YC_API_WORKERS", "4")),
+            thread_name_prefix="yc-sdk"
+        )
+        # Клиенты сервисов создаются один раз и переиспользуют свои каналы
+        self._stubs = {}
+        self._stubs_lock = threading.Lock()
+
+    @property
+    def sdk(self):
+        """SDK Yandex Cloud; ключ читается и SDK создается при первом обращении"""
+        if self._sdk is None:
+            with self._sdk_lock:
+                if self._sdk is None:
+                    import yandexcloud
+
+                    # Загружаем авторизованный ключ
+                    with open(self.sa_key_file, 'r') as f:
+                        self.sa_key_json = json.load(f)
+
+                    # Инициализируем SDK
+                    self._sdk = yandexcloud.SDK(service_account_key=self.sa_key_json, endpoint=self.endpoint)
+        return self._sdk
+
+    def _stub(self, stub_ctor):
+        """Клиент сервиса SDK, созданный при первом обращении"""
+        stub = self._stubs.get(stub_ctor)
+        if stub is None:
+            with self._stubs_lock:
+                stub = self._stubs.get(stub_ctor)
+                if stub is None:
+                    if self.insecure:
+                        import grpc
+
+                        if self._channel is None:
+                            self._channel = grpc.insecure_channel(self.endpoint)
+                        stub = self._stubs[stub_ctor] = stub_ctor(self._channel)
+                    else:
+                        stub = self._stubs[stub_ctor] = self.sdk.client(stub_ctor)
+        return stub
+
+    def _list(self, stub_ctor, request):
+        """Вызов List сервиса с дедлайном и учетом метрик"""
+        method = f"{stub_ctor.__name__[:-len('Stub')]}.List"
+        with YC_API_IN_FLIGHT.track_inprogress(), YC_API_LATENCY.labels(method).time():
+            try:
+                return self._stub(stub_ctor).List(request, timeout=self.timeout)
+            except Exception:
+                YC_API_ERRORS.labels(method).inc()
+                raise
+
+    async def _run(self, fn, *args, **kwargs):
+        """Выполняет блокирующий вызов SDK в пуле потоков"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
     def get_folder_id(self):
         """Получить ID каталога"""
         return os.getenv("YANDEX_FOLDER_ID")
-    
+
     def list_compute_instances(self):
         """Получить список виртуальных машин"""
-        compute = self.sdk.client('compute').instances()
-        return compute.list(folder_id=self.get_folder_id())
-    
+        stub_ctor, request_cls = _instance_api()
+        return self._list(stub_ctor, request_cls(folder_id=self.get_folder_id()))
+
     def list_databases(self):
         """Получить список баз данных"""
-        ydb = self.sdk.client('managed-ydb').databases()
-        return ydb.list(folder_id=self.get_folder_id())
-    
+        stub_ctor, request_cls = _database_api()
+        return self._list(stub_ctor, request_cls(folder_id=self.get_folder_id()))
+
+    def _list_page(self, api, folder_id, page_size, page_token):
+        stub_ctor, request_cls = api()
+        request = request_cls(folder_id=folder_id, page_size=page_size, page_token=page_token)
+        return self._list(stub_ctor, request)
+
+    def iter_compute_instances(self, folder_id: str = None, page_size: int = 100):
+        """
+        Постраничный обход виртуальных машин
+
+        :param folder_id: ID каталога (по умолчанию из YANDEX_FOLDER_ID)
+        :param page_size: Размер страницы
+        :return: Генератор виртуальных машин
+        """
+        page_token = ""
+        while True:
+            page = self._list_page(_instance_api, folder_id or self.get_folder_id(), page_size, page_token)
+            yield from page.instances
+            page_token = page.next_page_token
+            if not page_token:
+                return
+
+    def iter_databases(self, folder_id: str = None, page_size: int = 100):
+        """
+        Постраничный обход баз данных
+
+        :param folder_id: ID каталога (по умолчанию из YANDEX_FOLDER_ID)
+        :param page_size: Размер страницы
+        :return: Генератор баз данных
+        """
+        page_token = ""
+        while True:
+            page = self._list_page(_database_api, folder_id or self.get_folder_id(), page_size, page_token)
+            yield from page.databases
+            page_token = page.next_page_token
+            if not page_token:
+                return
+
+    async def _iter_pages_async(self, api, field, folder_id, page_size):
+        page_token = ""
+        while True:
+            page = await self._run(self._list_page, api, folder_id or self.get_folder_id(), page_size, page_token)
+            yield list(getattr(page, field))
+            page_token = page.next_page_token
+            if not page_token:
+                return
+
+    def iter_compute_instances_async(self, folder_id: str = None, page_size: int = 100):
+        """
+        Ленивый постраничный обход виртуальных машин без блокировки цикла событий
+
+        Следующая страница запрашивается только когда потребитель дочитал предыдущую.
+
+        :param folder_id: ID каталога (по умолчанию из YANDEX_FOLDER_ID)
+        :param page_size: Размер страницы
+        :return: Асинхронный генератор страниц (списков виртуальных машин)
+        """
+        return self._iter_pages_async(_instance_api, "instances", folder_id, page_size)
+
+    def iter_disks_async(self, folder_id: str = None, page_size: int = 100):
+        """
+        Ленивый постраничный обход дисков без блокировки цикла событий
+
+        :param folder_id: ID каталога (по умолчанию из YANDEX_FOLDER_ID)
+        :param page_size: Размер страницы
+        :return: Асинхронный генератор страниц (списков дисков)
+        """
+        return self._iter_pages_async(_disk_api, "disks", folder_id, page_size)
+
+    def iter_databases_async(self, folder_id: str = None, page_size: int = 100):
+        """
+        Ленивый постраничный обход баз данных без блокировки цикла событий
+
+        :param folder_id: ID каталога (по умолчанию из YANDEX_FOLDER_ID)
+        :param page_size: Размер страницы
+        :return: Асинхронный генератор страниц (списков баз данных)
+        """
+        return self._iter_pages_async(_database_api, "databases", folder_id, page_size)
+
+    async def list_compute_instances_async(self):
+        """Получить список виртуальных машин, не блокируя цикл событий"""
+        return await self._run(self.list_compute_instances)
+
+    async def list_databases_async(self):
+        """Получить список баз данных, не блокируя цикл событий"""
+        return await self._run(self.list_databases)
+
+    def close(self):
+        """Останавливает пул потоков для вызовов SDK и закрывает канал заглушки"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._channel is not None:
+            self._channel.close()
+            self._channel = None
+
     def __del__(self):
-        """Закрываем каналы при удалении объекта"""
+        """Закрываем пул потоков при удалении объекта"""
         try:
-            # self.compute_channel.close()
-            # self.ydb_channel.close()
-            pass
+            self.close()
         except:
             pass